@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+    
+    def ready(self):
+        from .search import install_search_index_handler
+        
+        # Install the pg_trgm / FTS5 patient search index after migrate
+        post_migrate.connect(install_search_index_handler, sender=self)
@@ -0,0 +1,83 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from .models import Patient
+from .serializers import PatientProfileSerializer
+from .views import has_limited_patient_access, limited_patient_data
+from authentication.async_views import AsyncAPIView
+from authentication.audit import alog_phi_access, alog_phi_list_access
+from authentication.permissions import IsPatient, IsVerifiedPersonnel, get_token_payload
+from medical_records.summary import aget_patient_summary
+
+
+def _search_patients(query):
+    # The ranked search runs raw SQL, which has no async form yet
+    return list(Patient.objects.search_patients(query)[:20])
+
+
+class PatientProfileView(AsyncAPIView):
+    """View patient's own profile"""
+    permission_classes = [IsAuthenticated, IsPatient]
+    
+    async def get(self, request):
+        patient = await Patient.objects.select_related('user').filter(user_id=request.user.pk).afirst()
+        if patient is None:
+            return JsonResponse(
+                {'error': 'Patient profile not found'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return JsonResponse(PatientProfileSerializer(patient).data, status=status.HTTP_200_OK)
+
+
+class PatientSearchView(AsyncAPIView):
+    """Search patients by various criteria (Verified Personnel only)"""
+    permission_classes = [IsAuthenticated, IsVerifiedPersonnel]
+    
+    async def get(self, request):
+        query = request.GET.get('q', '')
+        patient_id = request.GET.get('patient_id', '')
+        
+        if patient_id:
+            # Direct patient ID lookup
+            patients = [
+                patient async for patient in
+                Patient.objects.select_related('user').filter(patient_id=patient_id)
+            ]
+            if not patients:
+                return JsonResponse([], safe=False, status=status.HTTP_200_OK)
+        elif len(query) < 2:
+            return JsonResponse(
+                {'error': 'Search query must be at least 2 characters'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        else:
+            patients = await sync_to_async(_search_patients)(query)
+        
+        await alog_phi_list_access(request, 'patient_search', [patient.patient_id for patient in patients])
+        serializer = PatientProfileSerializer(patients, many=True)
+        return JsonResponse(serializer.data, safe=False, status=status.HTTP_200_OK)
+
+
+class PatientDetailView(AsyncAPIView):
+    """Get patient details by patient ID (Verified Personnel only)"""
+    permission_classes = [IsAuthenticated, IsVerifiedPersonnel]
+    
+    async def get(self, request, patient_id):
+        patient = await Patient.objects.select_related('user').filter(patient_id=patient_id).afirst()
+        if patient is None:
+            return JsonResponse(
+                {'error': 'Patient not found'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        serializer_data = PatientProfileSerializer(patient).data
+        limited = has_limited_patient_access(get_token_payload(request))
+        await alog_phi_access(request, 'patient_record_viewed', patient, limited=limited)
+        if limited:
+            return JsonResponse(limited_patient_data(serializer_data), status=status.HTTP_200_OK)
+        
+        # Full access for medical personnel
+        serializer_data['summary'] = await aget_patient_summary(patient)
+        return JsonResponse(serializer_data, status=status.HTTP_200_OK)
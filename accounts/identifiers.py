@@ -0,0 +1,190 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class IdentifierExhausted(Exception):
+    """Raised when every identifier for the current year has been issued"""
+    pass
+
+
+class IdentifierAllocator:
+    """Hands out sequential IDs like HMS2025000123 in per-process blocks
+    
+    Each process reserves ``block_size`` numbers at a time for the current
+    year, so allocating an ID is an in-memory pop and only one in every
+    ``block_size`` allocations touches the database. On PostgreSQL the
+    numbers come from a per-year sequence, which is not transactional and
+    so never holds a lock for the lifetime of the caller's transaction.
+    Other databases use a row in the IdentifierSequence counter table,
+    advanced outside the caller's transaction (see _reserve_from_counter).
+    
+    Numbers reserved by a process that exits unused are skipped, never
+    reissued; the one exception is a rolled back reservation on SQLite.
+    """
+    
+    def __init__(self, model_label, field_name, prefix_setting, default_prefix, digits, block_size_setting):
+        self.model_label = model_label
+        self.field_name = field_name
+        self.prefix_setting = prefix_setting
+        self.default_prefix = default_prefix
+        self.digits = digits
+        self.block_size_setting = block_size_setting
+        self._lock = threading.Lock()
+        self._block = deque()
+        self._year = None
+        self._sequences = set()
+    
+    @property
+    def prefix(self):
+        return settings.HOSPITAL_SETTINGS.get(self.prefix_setting, self.default_prefix)
+    
+    @property
+    def block_size(self):
+        return settings.HOSPITAL_SETTINGS.get(self.block_size_setting, 100)
+    
+    def format(self, year, number):
+        return f"{self.prefix}{year}{number:0{self.digits}d}"
+    
+    def next_id(self):
+        """Allocate the next identifier for the current year"""
+        year = timezone.now().year
+        
+        with self._lock:
+            if self._year != year:
+                self._block.clear()
+                self._year = year
+            
+            while not self._block:
+                self._block.extend(self._reserve_block(year))
+            
+            return self._block.popleft()
+    
+    def reset(self):
+        """Drop the numbers reserved by this process"""
+        with self._lock:
+            self._block.clear()
+            self._year = None
+            self._sequences.clear()
+    
+    def _reserve_block(self, year):
+        model = apps.get_model(self.model_label)
+        using = router.db_for_write(model)
+        max_number = 10 ** self.digits - 1
+        
+        if connections[using].vendor == 'postgresql':
+            numbers = self._reserve_from_sequence(using, year)
+        else:
+            numbers = self._reserve_from_counter(using, year)
+        
+        numbers = [number for number in numbers if number <= max_number]
+        if not numbers:
+            raise IdentifierExhausted(f"No {self.prefix} identifiers left for {year}")
+        
+        # IDs issued before the allocator existed were random, so drop any
+        # number in the block that is already taken (one query per block)
+        candidates = [self.format(year, number) for number in numbers]
+        taken = set(
+            model._default_manager.using(using).filter(
+                **{f'{self.field_name}__in': candidates}
+            ).values_list(self.field_name, flat=True)
+        )
+        return [candidate for candidate in candidates if candidate not in taken]
+    
+    def _ensure_sequence(self, using, sequence_name):
+        """Create a year's sequence, committed independently of the caller
+        
+        CREATE SEQUENCE is transactional: run inside a registration that
+        later rolled back, the sequence would vanish while this process kept
+        its block, and another process would issue the same numbers again.
+        So inside a transaction it runs on a separate autocommit connection.
+        """
+        if sequence_name in self._sequences:
+            return
+        
+        connection = connections[using]
+        own_connection = connection.in_atomic_block
+        if own_connection:
+            connection = connections.create_connection(using)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{sequence_name}"')
+        finally:
+            if own_connection:
+                connection.close()
+        self._sequences.add(sequence_name)
+    
+    def _reserve_from_sequence(self, using, year):
+        sequence_name = f"{self.model_label.replace('.', '_').lower()}_{self.field_name}_{year}"
+        self._ensure_sequence(using, sequence_name)
+        
+        # nextval is not transactional, so the caller's transaction holds no lock
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT nextval(\'"{sequence_name}"\') FROM generate_series(1, %s)',
+                [self.block_size]
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+    
+    def _reserve_from_counter(self, using, year):
+        """Advance the year's counter row, committed independently of the caller
+        
+        Inside the caller's transaction the row would stay locked until it
+        committed, and a rollback would undo the increment while this process
+        kept the block, so the next process would be handed it again. So
+        inside a transaction the counter is advanced from a worker thread,
+        whose connection commits on its own. SQLite is the exception: the
+        second connection would wait on the caller's write lock, so there the
+        block is reserved in the caller's transaction and a rollback can
+        reissue it.
+        """
+        connection = connections[using]
+        if connection.in_atomic_block and connection.vendor != 'sqlite':
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                return executor.submit(self._reserve_on_own_connection, using, year).result()
+        return self._advance_counter(using, year)
+    
+    def _reserve_on_own_connection(self, using, year):
+        try:
+            return self._advance_counter(using, year)
+        finally:
+            connections[using].close()
+    
+    def _advance_counter(self, using, year):
+        from .models import IdentifierSequence
+        
+        with transaction.atomic(using=using):
+            sequence, _ = IdentifierSequence.objects.using(using).get_or_create(
+                prefix=self.prefix,
+                year=year
+            )
+            IdentifierSequence.objects.using(using).filter(pk=sequence.pk).update(
+                last_value=F('last_value') + self.block_size
+            )
+            sequence.refresh_from_db(fields=['last_value'])
+        
+        end = sequence.last_value
+        return list(range(end - self.block_size + 1, end + 1))
+
+patient_id_allocator = IdentifierAllocator(
+    model_label='accounts.Patient',
+    field_name='patient_id',
+    prefix_setting='PATIENT_ID_PREFIX',
+    default_prefix='HMS',
+    digits=6,
+    block_size_setting='PATIENT_ID_BLOCK_SIZE'
+)
+
+employee_id_allocator = IdentifierAllocator(
+    model_label='accounts.Personnel',
+    field_name='employee_id',
+    prefix_setting='EMPLOYEE_ID_PREFIX',
+    default_prefix='EMP',
+    digits=4,
+    block_size_setting='EMPLOYEE_ID_BLOCK_SIZE'
+)
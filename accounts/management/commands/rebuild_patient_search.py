@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Patient
+from accounts.search import install_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recompute patient search documents and matching keys, then rebuild the search index'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Patients updated per statement')
+    
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        install_search_index()
+        
+        updated = 0
+        last_id = 0
+        while True:
+            patients = list(
+                Patient.objects.select_related('user').filter(id__gt=last_id).order_by('id')[:chunk_size]
+            )
+            if not patients:
+                break
+            
+            for patient in patients:
+                patient.refresh_derived_fields()
+            
+            with transaction.atomic():
+                Patient.objects.bulk_update(patients, Patient.DERIVED_FIELDS)
+            
+            updated += len(patients)
+            last_id = patients[-1].id
+            self.stdout.write(f'Indexed {updated} patients')
+        
+        rebuild_search_index()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt search documents for {updated} patients')
+        )
@@ -1,8 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.db.models import Q
-import random
-import string
+from krankenhaus.db_router import prefer_replica
 
 class PatientManager(models.Manager):
     def create_patient_profile(self, user, registration_type='online', registered_by=None, **extra_fields):
@@ -24,14 +23,10 @@ class PatientManager(models.Manager):
             return None
     
     def search_patients(self, query):
-        """Search patients by name, phone, or patient ID"""
-        return self.filter(
-            Q(user__first_name__icontains=query) |
-            Q(user__last_name__icontains=query) |
-            Q(patient_id__icontains=query) |
-            Q(phone_primary__icontains=query) |
-            Q(user__email__icontains=query)
-        ).select_related('user')
+        """Search patients by name, phone, email or patient ID, best match first"""
+        from .search import search_patients
+        
+        return search_patients(prefer_replica(self.get_queryset()), query).select_related('user')
     
     def complete_profiles(self):
         """Get patients with complete profiles"""
@@ -65,6 +60,19 @@ class PatientManager(models.Manager):
             )
         
         return query
+    
+    def emergency_match(self, first_name='', last_name='', date_of_birth=None, phone='', limit=10):
+        """Rank likely matches for an unidentified patient, tolerating misspelt names"""
+        from .matching import find_candidates
+        
+        return find_candidates(
+            self.get_queryset(),
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=date_of_birth,
+            phone=phone,
+            limit=limit
+        )
 
 
 class PersonnelManager(models.Manager):
@@ -79,14 +87,10 @@ class PersonnelManager(models.Manager):
         return personnel
     
     def _generate_employee_id(self):
-        """Generate a unique employee ID"""
-        while True:
-            year = timezone.now().year
-            random_part = ''.join(random.choices(string.digits, k=4))
-            employee_id = f"EMP{year}{random_part}"
-            
-            if not self.filter(employee_id=employee_id).exists():
-                return employee_id
+        """Allocate the next EMP + year + 4 digit employee ID"""
+        from .identifiers import employee_id_allocator
+        
+        return employee_id_allocator.next_id()
     
     def verified_personnel(self):
         """Get verified personnel only"""
@@ -140,12 +144,12 @@ class PersonnelManager(models.Manager):
     
     def search_personnel(self, query):
         """Search personnel by name, employee ID, or email"""
-        return self.filter(
+        return prefer_replica(self.filter(
             Q(user__first_name__icontains=query) |
             Q(user__last_name__icontains=query) |
             Q(employee_id__icontains=query) |
             Q(user__email__icontains=query)
-        ).select_related('user')
+        ).select_related('user'))
 
 
 class RoleManager(models.Manager):
@@ -173,10 +177,10 @@ class PersonnelRoleManager(models.Manager):
     
     def expired_assignments(self):
         """Get expired role assignments"""
-        return self.filter(
+        return prefer_replica(self.filter(
             expires_date__lt=timezone.now(),
             is_active=True
-        )
+        ))
     
     def by_personnel(self, personnel):
         """Get active role assignments for specific personnel"""
@@ -203,14 +207,15 @@ class EmergencyAccessManager(models.Manager):
     def today_accesses(self):
         """Get emergency accesses from today"""
         today = timezone.now().date()
-        return self.filter(accessed_at__date=today)
+        return prefer_replica(self.filter(accessed_at__date=today))
     
-    def log_emergency_access(self, personnel, patient, reason, access_type='full_override', ip_address=None):
+    def log_emergency_access(self, personnel, patient, reason, access_type='full_override', ip_address=None, search_method=''):
         """Log an emergency access event"""
         return self.create(
             accessed_by=personnel,
             patient=patient,
             reason=reason,
             access_type=access_type,
+            search_method=search_method,
             ip_address=ip_address or '127.0.0.1'
         )
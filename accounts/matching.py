@@ -0,0 +1,172 @@
+import re
+from collections import namedtuple
+from difflib import SequenceMatcher
+from django.conf import settings
+from django.db.models import Q
+
+from .search import normalise_search_text
+
+# Relative weight of each identifying attribute in a candidate's score
+MATCH_WEIGHTS = {
+    'last_name': 0.35,
+    'first_name': 0.25,
+    'date_of_birth': 0.25,
+    'phone': 0.15,
+}
+
+PHONE_KEY_DIGITS = 10
+
+# Identifiers independent of the name; one must match before a record opens unprompted
+INDEPENDENT_IDENTIFIERS = ('date_of_birth', 'phone')
+
+MatchCandidate = namedtuple('MatchCandidate', ['patient_id', 'score', 'reasons'])
+
+_SOUNDEX_CODES = {}
+for _letters, _code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _code
+
+
+def soundex(name):
+    """American Soundex code for a name, e.g. Robert -> R163"""
+    letters = re.sub(r'[^a-z]', '', normalise_search_text(name))
+    if not letters:
+        return ''
+    
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code, vowels do
+        if letter not in 'hw':
+            previous = digit
+    
+    return code.ljust(4, '0')
+
+
+def phone_key(phone):
+    """Last ten digits of a phone number, ignoring formatting and country code"""
+    return re.sub(r'\D', '', phone or '')[-PHONE_KEY_DIGITS:]
+
+
+def match_keys(first_name, last_name, phones):
+    """Compute the indexed blocking keys stored on Patient"""
+    return {
+        'first_name_key': soundex(first_name),
+        'last_name_key': soundex(last_name),
+        'phone_key': next((phone_key(phone) for phone in phones if phone_key(phone)), ''),
+    }
+
+
+def _name_similarity(query, candidate):
+    query = normalise_search_text(query)
+    candidate = normalise_search_text(candidate)
+    if not query or not candidate:
+        return 0.0
+    if query == candidate:
+        return 1.0
+    
+    ratio = SequenceMatcher(None, query, candidate).ratio()
+    # A phonetic match counts for at least 0.8 so "Jon"/"John" stay close
+    if soundex(query) == soundex(candidate):
+        ratio = max(ratio, 0.8)
+    return ratio
+
+
+def _date_similarity(query, candidate):
+    if not query or not candidate:
+        return 0.0
+    if query == candidate:
+        return 1.0
+    # Day and month swapped is a common transcription error
+    if query.year == candidate.year and query.month == candidate.day and query.day == candidate.month:
+        return 0.8
+    if query.year == candidate.year:
+        return 0.3
+    return 0.0
+
+
+def score_candidate(candidate, first_name='', last_name='', date_of_birth=None, phone=''):
+    """Score one candidate row against the search criteria
+    
+    Only the criteria supplied count towards the total, so the score is
+    always in [0, 1]. Returns (score, reasons).
+    """
+    parts = {}
+    if last_name:
+        parts['last_name'] = _name_similarity(last_name, candidate['user__last_name'])
+    if first_name:
+        parts['first_name'] = _name_similarity(first_name, candidate['user__first_name'])
+    if date_of_birth:
+        parts['date_of_birth'] = _date_similarity(date_of_birth, candidate['date_of_birth'])
+    if phone:
+        digits = phone_key(phone)
+        phones = (phone_key(candidate['phone_primary']), phone_key(candidate['phone_secondary']))
+        parts['phone'] = 1.0 if digits and digits in phones else 0.0
+    
+    total_weight = sum(MATCH_WEIGHTS[name] for name in parts)
+    if not total_weight:
+        return 0.0, []
+    
+    score = sum(MATCH_WEIGHTS[name] * value for name, value in parts.items()) / total_weight
+    reasons = [name for name, value in parts.items() if value >= 0.8]
+    return round(score, 3), reasons
+
+
+def can_auto_select(candidate):
+    """Whether a match is corroborated enough to open without the clinician choosing
+    
+    Scores only weigh the criteria supplied, so a lone DOB or phone number
+    can score 1.0; require a matched last name plus a matched independent
+    identifier.
+    """
+    reasons = set(candidate.reasons)
+    return 'last_name' in reasons and any(name in reasons for name in INDEPENDENT_IDENTIFIERS)
+
+
+def candidate_filter(first_name='', last_name='', date_of_birth=None, phone=''):
+    """Build the blocking predicate; every branch is served by an index"""
+    first_key = soundex(first_name)
+    last_key = soundex(last_name)
+    digits = phone_key(phone)
+    
+    blocks = Q(pk__in=[])
+    if last_key and first_key:
+        blocks |= Q(last_name_key=last_key, first_name_key=first_key)
+    if date_of_birth:
+        blocks |= Q(date_of_birth=date_of_birth)
+        if last_key:
+            blocks |= Q(last_name_key=last_key, date_of_birth__year=date_of_birth.year)
+    if digits:
+        blocks |= Q(phone_key=digits)
+    elif last_key and not first_key:
+        blocks |= Q(last_name_key=last_key)
+    return blocks
+
+
+def find_candidates(queryset, first_name='', last_name='', date_of_birth=None, phone='', limit=10):
+    """Rank likely matches for an unidentified patient
+    
+    Candidates are pulled with indexed phonetic, DOB and phone blocking keys
+    in a single query and scored in memory, so misspelt names still match.
+    """
+    max_candidates = settings.HOSPITAL_SETTINGS.get('EMERGENCY_MATCH_MAX_CANDIDATES', 500)
+    rows = queryset.filter(
+        candidate_filter(first_name, last_name, date_of_birth, phone)
+    ).values(
+        'id', 'user__first_name', 'user__last_name', 'date_of_birth',
+        'phone_primary', 'phone_secondary'
+    )[:max_candidates]
+    
+    candidates = []
+    for row in rows:
+        score, reasons = score_candidate(row, first_name, last_name, date_of_birth, phone)
+        if score > 0:
+            candidates.append(MatchCandidate(row['id'], score, reasons))
+    
+    candidates.sort(key=lambda candidate: (-candidate.score, candidate.patient_id))
+    return candidates[:limit]
@@ -1,15 +1,14 @@
 from django.db import models
 from django.conf import settings
-from django.utils import timezone
-import random
-import string
 
 from .managers import PatientManager, PersonnelManager, RoleManager, PersonnelRoleManager, EmergencyAccessManager  # Import managers
+from .identifiers import patient_id_allocator
+from .search import build_search_document
+from .matching import match_keys
 
 def generate_patient_id():
-    year = timezone.now().year
-    random_part = ''.join(random.choices(string.digits, k=6))
-    return f"HMS{year}{random_part}"
+    """Allocate the next HMS + year + 6 digit patient ID"""
+    return patient_id_allocator.next_id()
 
 class Patient(models.Model):
     objects = PatientManager()  # Assign the custom manager
@@ -58,11 +57,51 @@ class Patient(models.Model):
     registered_by = models.ForeignKey('Personnel', on_delete=models.SET_NULL, null=True, blank=True, related_name='registered_patients')
     is_profile_complete = models.BooleanField(default=False)
     
+    # Normalised name/email/ID/phone text for search (see accounts.search)
+    search_document = models.TextField(blank=True, editable=False)
+    
+    # Blocking keys for emergency matching (see accounts.matching)
+    first_name_key = models.CharField(max_length=4, blank=True, editable=False)
+    last_name_key = models.CharField(max_length=4, blank=True, editable=False)
+    phone_key = models.CharField(max_length=10, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Fields computed from the patient and user on every save
+    DERIVED_FIELDS = ['search_document', 'first_name_key', 'last_name_key', 'phone_key']
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name_key', 'first_name_key'], name='patient_name_keys_idx'),
+            models.Index(fields=['last_name_key', 'date_of_birth'], name='patient_last_name_dob_idx'),
+            models.Index(fields=['date_of_birth'], name='patient_dob_idx'),
+            models.Index(fields=['phone_key'], name='patient_phone_key_idx'),
+            models.Index(fields=['created_at', 'id'], name='patient_created_keyset_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} ({self.patient_id})"
+    
+    def refresh_derived_fields(self):
+        """Recompute the search document and matching keys"""
+        self.search_document = build_search_document(self)
+        keys = match_keys(
+            self.user.first_name,
+            self.user.last_name,
+            [self.phone_primary, self.phone_secondary]
+        )
+        for field_name, value in keys.items():
+            setattr(self, field_name, value)
+    
+    def save(self, *args, **kwargs):
+        self.refresh_derived_fields()
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.DERIVED_FIELDS)
+        
+        super().save(*args, **kwargs)
 
 class Personnel(models.Model):
     objects = PersonnelManager()  # Assign the custom manager
@@ -95,10 +134,18 @@ class Personnel(models.Model):
     verified_by = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_personnel')
     verified_at = models.DateTimeField(null=True, blank=True)
     
+    # On-call staff are notified of critical lab results alongside the ordering doctor
+    is_on_call = models.BooleanField(default=False, db_index=True)
+    
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='personnel_created_keyset_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} ({self.employee_id})"
 
@@ -154,9 +201,27 @@ class EmergencyAccess(models.Model):
         ('full_override', 'Full Override'),
         ('critical_info', 'Critical Information Only'),
     ])
+    search_method = models.CharField(max_length=30, blank=True)
     accessed_at = models.DateTimeField(auto_now_add=True)
     session_ended_at = models.DateTimeField(null=True, blank=True)
     ip_address = models.GenericIPAddressField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['accessed_at', 'id'], name='emergency_access_keyset_idx'),
+        ]
+    
     def __str__(self):
         return f"Emergency access by {self.accessed_by} for {self.patient.patient_id}"
+
+class IdentifierSequence(models.Model):
+    """Per-year counter behind patient and employee ID allocation"""
+    prefix = models.CharField(max_length=10)
+    year = models.PositiveIntegerField()
+    last_value = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['prefix', 'year']
+    
+    def __str__(self):
+        return f"{self.prefix}{self.year}: {self.last_value}"
@@ -0,0 +1,173 @@
+import logging
+import re
+import unicodedata
+from django.db import connections
+from django.db.models import Case, When, IntegerField, Value
+
+logger = logging.getLogger(__name__)
+
+PATIENT_TABLE = 'accounts_patient'
+TRIGRAM_INDEX_NAME = 'accounts_patient_search_trgm'
+FTS_TABLE = 'accounts_patient_search_fts'
+
+_SEPARATORS = re.compile(r'[^a-z0-9@._]+')
+
+# Database aliases known to have the FTS5 table, so searches skip introspection
+_fts_installed = set()
+
+
+def normalise_search_text(value):
+    """Lowercase, strip accents and collapse punctuation into single spaces"""
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _SEPARATORS.sub(' ', value.lower()).strip()
+
+
+def build_search_document(patient):
+    """Build the denormalised text that patient search matches against"""
+    user = patient.user
+    parts = [
+        user.first_name,
+        user.last_name,
+        user.email,
+        patient.patient_id,
+        patient.phone_primary,
+        patient.phone_secondary,
+    ]
+    
+    # Store phone numbers as bare digits too so "5551234567" finds "(555) 123-4567"
+    for phone in (patient.phone_primary, patient.phone_secondary):
+        digits = re.sub(r'\D', '', phone or '')
+        if digits:
+            parts.append(digits)
+    
+    return ' '.join(normalise_search_text(part) for part in parts if part)
+
+
+def search_patients(queryset, query):
+    """Filter and rank a patient queryset against the search document
+    
+    PostgreSQL matches every query term as a substring, which the pg_trgm
+    GIN index serves, and ranks by trigram word similarity. SQLite uses the
+    FTS5 table kept in sync by triggers and ranks by bm25. Other databases
+    fall back to unindexed substring matching.
+    """
+    terms = normalise_search_text(query).split()
+    if not terms:
+        return queryset.none()
+    
+    vendor = connections[queryset.db].vendor
+    
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        
+        for term in terms:
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset.annotate(
+            rank=TrigramWordSimilarity(' '.join(terms), 'search_document')
+        ).order_by('-rank', 'patient_id')
+    
+    if vendor == 'sqlite' and fts_table_exists(queryset.db):
+        ranked_ids = _fts_ranked_ids(queryset.db, terms)
+        if not ranked_ids:
+            return queryset.none()
+        return queryset.filter(id__in=ranked_ids).annotate(
+            rank=Case(
+                *[When(id=patient_id, then=Value(position)) for position, patient_id in enumerate(ranked_ids)],
+                output_field=IntegerField()
+            )
+        ).order_by('rank')
+    
+    for term in terms:
+        queryset = queryset.filter(search_document__contains=term)
+    return queryset.order_by('patient_id')
+
+
+def _fts_ranked_ids(using, terms, limit=500):
+    # Quote each term as a prefix phrase so FTS5 operators in input are inert
+    match = ' '.join(f'"{term}"*' for term in terms)
+    
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}) LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def fts_table_exists(using):
+    """Check whether the SQLite FTS5 search table has been installed"""
+    if using in _fts_installed:
+        return True
+    
+    if FTS_TABLE in connections[using].introspection.table_names():
+        _fts_installed.add(using)
+        return True
+    return False
+
+
+def install_search_index(using='default'):
+    """Create the vendor specific search index if it is missing
+    
+    Safe to run repeatedly; it is called after every migrate.
+    """
+    connection = connections[using]
+    
+    if PATIENT_TABLE not in connection.introspection.table_names():
+        return False
+    
+    if connection.vendor == 'postgresql':
+        # CONCURRENTLY avoids blocking registrations on a large table, but
+        # is not allowed inside a transaction block
+        concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY '
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX {concurrently}IF NOT EXISTS {TRIGRAM_INDEX_NAME} '
+                f'ON {PATIENT_TABLE} USING gin (search_document gin_trgm_ops)'
+            )
+        return True
+    
+    if connection.vendor == 'sqlite':
+        if fts_table_exists(using):
+            return True
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"search_document, content='{PATIENT_TABLE}', content_rowid='id')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {PATIENT_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {PATIENT_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+                f"VALUES ('delete', old.id, old.search_document); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF search_document ON {PATIENT_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+                f"VALUES ('delete', old.id, old.search_document); "
+                f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        return True
+    
+    logger.info(f"No patient search index available for {connection.vendor}")
+    return False
+
+
+def rebuild_search_index(using='default'):
+    """Rebuild the SQLite FTS5 table from the patient table"""
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and fts_table_exists(using):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def install_search_index_handler(sender, using='default', **kwargs):
+    """post_migrate hook that installs the patient search index"""
+    install_search_index(using=using)
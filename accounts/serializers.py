@@ -16,7 +16,7 @@ class RoleSerializer(serializers.ModelSerializer):
     """Role serializer"""
     class Meta:
         model = Role
-        fields = ['id', 'name', 'description', 'can_emergency_override']
+        fields = ['id', 'name', 'description', 'access_level', 'can_trigger_emergency']
 
 
 class PatientProfileSerializer(serializers.ModelSerializer):
@@ -28,13 +28,12 @@ class PatientProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
         fields = [
-            'patient_id', 'user', 'full_name', 'phone_number', 
-            'date_of_birth', 'age', 'gender', 'address', 
+            'patient_id', 'user', 'full_name', 'phone_primary', 
+            'phone_secondary', 'date_of_birth', 'age', 'gender', 'address', 
             'emergency_contact_name', 'emergency_contact_phone',
-            'emergency_contact_relationship', 'blood_group',
-            'allergies', 'medical_conditions', 'current_medications',
+            'emergency_contact_relationship', 'blood_type',
             'insurance_provider', 'insurance_policy_number',
-            'profile_completed', 'created_at', 'updated_at'
+            'is_profile_complete', 'created_at', 'updated_at'
         ]
     
     def get_full_name(self, obj):
@@ -98,20 +97,28 @@ class PatientUpdateSerializer(serializers.ModelSerializer):
 class PersonnelProfileSerializer(serializers.ModelSerializer):
     """Full personnel profile for viewing"""
     user = UserBasicSerializer(read_only=True)
-    role = RoleSerializer(read_only=True)
+    roles = serializers.SerializerMethodField()
     full_name = serializers.SerializerMethodField()
     
     class Meta:
         model = Personnel
         fields = [
-            'employee_id', 'user', 'full_name', 'role', 'department',
-            'phone_number', 'date_of_birth', 'address', 'hire_date',
-            'medical_license_number', 'specialization', 'is_verified',
-            'created_at', 'updated_at'
+            'employee_id', 'user', 'full_name', 'roles', 'department',
+            'phone_work', 'date_of_birth', 'address', 'hire_date',
+            'license_number', 'license_expiry', 'is_verified',
+            'verification_status', 'created_at', 'updated_at'
         ]
     
     def get_full_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip()
+    
+    def get_roles(self, obj):
+        # Filter in Python so a prefetch of role_assignments__role is reused
+        return [
+            RoleSerializer(assignment.role).data
+            for assignment in obj.role_assignments.all()
+            if assignment.is_active
+        ]
 
 
 class PersonnelUpdateSerializer(serializers.ModelSerializer):
@@ -176,7 +183,7 @@ class EmergencyAccessSerializer(serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField()
     personnel_name = serializers.SerializerMethodField()
     patient_id = serializers.CharField(source='patient.patient_id', read_only=True)
-    employee_id = serializers.CharField(source='personnel.employee_id', read_only=True)
+    employee_id = serializers.CharField(source='accessed_by.employee_id', read_only=True)
     
     class Meta:
         model = EmergencyAccess
@@ -190,7 +197,7 @@ class EmergencyAccessSerializer(serializers.ModelSerializer):
         return f"{obj.patient.user.first_name} {obj.patient.user.last_name}".strip()
     
     def get_personnel_name(self, obj):
-        return f"{obj.personnel.user.first_name} {obj.personnel.user.last_name}".strip()
+        return f"{obj.accessed_by.user.first_name} {obj.accessed_by.user.last_name}".strip()
 
 
 class PatientSearchSerializer(serializers.Serializer):
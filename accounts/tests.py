@@ -1,3 +1,250 @@
-from django.test import TestCase
+import datetime
+import json
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from . import async_views
+from .identifiers import IdentifierAllocator, patient_id_allocator
+from .matching import can_auto_select, MatchCandidate
+from .models import EmergencyAccess, Patient, Personnel, PersonnelRole, Role
+from authentication.jwt_handler import CustomJWTHandler
+from authentication.models import AuditLog, User
+
+
+def make_patient_allocator():
+    """A second allocator for patient IDs, standing in for another process"""
+    return IdentifierAllocator(
+        model_label='accounts.Patient',
+        field_name='patient_id',
+        prefix_setting='PATIENT_ID_PREFIX',
+        default_prefix='HMS',
+        digits=6,
+        block_size_setting='PATIENT_ID_BLOCK_SIZE'
+    )
+
+
+class CanAutoSelectTests(TestCase):
+    """A match opens a record only when a last name and an identifier agree"""
+    
+    def test_last_name_with_date_of_birth(self):
+        self.assertTrue(can_auto_select(MatchCandidate(1, 0.95, ['last_name', 'date_of_birth'])))
+    
+    def test_last_name_with_phone(self):
+        self.assertTrue(can_auto_select(MatchCandidate(1, 0.95, ['first_name', 'last_name', 'phone'])))
+    
+    def test_lone_identifier_is_not_enough(self):
+        self.assertFalse(can_auto_select(MatchCandidate(1, 1.0, ['phone'])))
+        self.assertFalse(can_auto_select(MatchCandidate(1, 1.0, ['date_of_birth'])))
+    
+    def test_names_alone_are_not_enough(self):
+        self.assertFalse(can_auto_select(MatchCandidate(1, 1.0, ['first_name', 'last_name'])))
+
+
+@override_settings(AUDIT_LOG={**settings.AUDIT_LOG, 'BUFFERED': False})
+class EmergencyPatientAccessTests(TestCase):
+    """POST /api/accounts/emergency/patient-access/ without a patient ID"""
+    
+    url = '/api/accounts/emergency/patient-access/'
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command('create_roles', stdout=StringIO())
+        patient_user = User.objects.create_user('katherine@example.com', 'Katherine', 'Schmidt', 'Passw0rd!')
+        cls.patient = Patient.objects.create_patient_profile(
+            user=patient_user,
+            date_of_birth=datetime.date(1980, 4, 5),
+            phone_primary='+49 151 2345678'
+        )
+        
+        doctor_user = User.objects.create_user('er@example.com', 'Emma', 'Gency', 'Passw0rd!', is_active=True, is_verified=True)
+        doctor = Personnel.objects.create_personnel_profile(user=doctor_user, is_verified=True)
+        PersonnelRole.objects.create(personnel=doctor, role=Role.objects.filter(can_trigger_emergency=True).first())
+        cls.doctor_user_id = doctor_user.pk
+    
+    def setUp(self):
+        token = CustomJWTHandler.generate_tokens(User.objects.get(pk=self.doctor_user_id))['access_token']
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    
+    def request_access(self, patient_search):
+        return self.client.post(
+            self.url,
+            json.dumps({'reason': 'Unconscious on arrival', 'patient_search': patient_search}),
+            content_type='application/json'
+        )
+    
+    def test_name_and_date_of_birth_open_the_record(self):
+        response = self.request_access({'name': 'Katherine Schmidt', 'dob': '1980-04-05'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['patient_data']['patient_id'], self.patient.patient_id)
+        self.assertEqual(EmergencyAccess.objects.count(), 1)
+    
+    def test_phone_alone_only_lists_candidates(self):
+        response = self.request_access({'phone': '0151-2345678'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('patient_data', response.json())
+        self.assertEqual([c['patient_id'] for c in response.json()['candidates']], [self.patient.patient_id])
+        self.assertFalse(EmergencyAccess.objects.exists())
+        
+        # No record was opened, but the names and birth dates shown are audited
+        audit = AuditLog.objects.get(action='emergency_candidates')
+        self.assertEqual(audit.details['patient_ids'], [self.patient.patient_id])
+        self.assertEqual(audit.details['reason'], 'Unconscious on arrival')
+    
+    def test_date_of_birth_alone_only_lists_candidates(self):
+        response = self.request_access({'dob': '1980-04-05'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('patient_data', response.json())
+        self.assertFalse(EmergencyAccess.objects.exists())
+    
+    def test_no_match(self):
+        response = self.request_access({'name': 'Zed Zulu'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(AUDIT_LOG={**settings.AUDIT_LOG, 'BUFFERED': False})
+class PatientLookupTests(TestCase):
+    """Patient search and detail by patient ID, and what they audit"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command('create_roles', stdout=StringIO())
+        patient_user = User.objects.create_user('katherine@example.com', 'Katherine', 'Schmidt', 'Passw0rd!')
+        cls.patient = Patient.objects.create_patient_profile(user=patient_user)
+        
+        doctor_user = User.objects.create_user('doctor@example.com', 'Doc', 'Tor', 'Passw0rd!', is_active=True, is_verified=True)
+        doctor = Personnel.objects.create_personnel_profile(user=doctor_user, is_verified=True)
+        PersonnelRole.objects.create(personnel=doctor, role=Role.objects.get(name='Doctor'))
+        cls.doctor_user_id = doctor_user.pk
+    
+    def setUp(self):
+        token = CustomJWTHandler.generate_tokens(User.objects.get(pk=self.doctor_user_id))['access_token']
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    
+    def test_search_by_patient_id(self):
+        response = self.client.get('/api/accounts/patient/search/', {'patient_id': self.patient.patient_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([patient['patient_id'] for patient in response.json()], [self.patient.patient_id])
+        self.assertEqual(AuditLog.objects.get().details['patient_ids'], [self.patient.patient_id])
+    
+    def test_search_by_unknown_patient_id(self):
+        response = self.client.get('/api/accounts/patient/search/', {'patient_id': 'HMS2026999999'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertFalse(AuditLog.objects.exists())
+    
+    def test_detail_is_audited(self):
+        response = self.client.get(f'/api/accounts/patient/{self.patient.patient_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AuditLog.objects.get().resource_id, self.patient.patient_id)
+    
+    def test_unknown_patient_detail(self):
+        response = self.client.get('/api/accounts/patient/HMS2026999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(AuditLog.objects.exists())
+    
+    def test_detail_includes_the_summary(self):
+        response = self.client.get(f'/api/accounts/patient/{self.patient.patient_id}/')
+        self.assertEqual(response.json()['summary']['demographics']['patient_id'], self.patient.patient_id)
+    
+    def test_unknown_patient_builds_no_summary(self):
+        with mock.patch('accounts.views.get_patient_summary') as get_patient_summary:
+            response = self.client.get('/api/accounts/patient/HMS2026999999/')
+        self.assertEqual(response.status_code, 404)
+        get_patient_summary.assert_not_called()
+    
+    async def async_get(self, view, path, **kwargs):
+        token = self.client.defaults['HTTP_AUTHORIZATION']
+        request = AsyncRequestFactory().get(path, headers={'Authorization': token})
+        return await view.as_view()(request, **kwargs)
+    
+    async def test_async_search_is_audited(self):
+        response = await self.async_get(
+            async_views.PatientSearchView, f'/api/accounts/patient/search/?patient_id={self.patient.patient_id}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await AuditLog.objects.filter(action='patient_search').acount(), 1)
+    
+    async def test_async_search_by_unknown_patient_id(self):
+        response = await self.async_get(async_views.PatientSearchView, '/api/accounts/patient/search/?patient_id=HMS2026999999')
+        self.assertEqual(json.loads(response.content), [])
+        self.assertFalse(await AuditLog.objects.aexists())
+    
+    async def test_async_detail_is_audited(self):
+        response = await self.async_get(
+            async_views.PatientDetailView, f'/api/accounts/patient/{self.patient.patient_id}/',
+            patient_id=self.patient.patient_id
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await AuditLog.objects.filter(resource_id=self.patient.patient_id).acount(), 1)
+
+
+class IdentifierAllocatorTests(TestCase):
+    """Patient IDs are unique across processes and never collide with existing ones"""
+    
+    def setUp(self):
+        patient_id_allocator.reset()
+        self.addCleanup(patient_id_allocator.reset)
+        self.prefix = f"HMS{timezone.now().year}"
+    
+    def test_ids_are_sequential_within_a_block(self):
+        ids = [patient_id_allocator.next_id() for _ in range(5)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 5)
+        self.assertTrue(all(patient_id.startswith(self.prefix) for patient_id in ids))
+    
+    @override_settings(HOSPITAL_SETTINGS={**settings.HOSPITAL_SETTINGS, 'PATIENT_ID_BLOCK_SIZE': 3})
+    def test_allocators_in_different_processes_never_overlap(self):
+        other_allocator = make_patient_allocator()
+        ids = []
+        for _ in range(7):
+            ids.append(patient_id_allocator.next_id())
+            ids.append(other_allocator.next_id())
+        self.assertEqual(len(set(ids)), len(ids))
+    
+    @override_settings(HOSPITAL_SETTINGS={**settings.HOSPITAL_SETTINGS, 'PATIENT_ID_BLOCK_SIZE': 3})
+    def test_existing_ids_are_skipped(self):
+        year = timezone.now().year
+        user = User.objects.create_user('legacy@example.com', 'Leg', 'Acy', 'Passw0rd!')
+        legacy = Patient.objects.create_patient_profile(user=user)
+        last_reserved = int(legacy.patient_id[len(self.prefix):]) + 2
+        
+        # A legacy random ID sitting at the start of the next block
+        taken_id = patient_id_allocator.format(year, last_reserved + 1)
+        Patient.objects.filter(pk=legacy.pk).update(patient_id=taken_id)
+        
+        patient_id_allocator.reset()
+        self.assertEqual(patient_id_allocator.next_id(), patient_id_allocator.format(year, last_reserved + 2))
+    
+    def test_registrations_get_distinct_ids(self):
+        patients = [
+            Patient.objects.create_patient_profile(
+                user=User.objects.create_user(f'patient{i}@example.com', 'Pat', f'Ient{i}', 'Passw0rd!')
+            )
+            for i in range(5)
+        ]
+        patient_ids = [patient.patient_id for patient in patients]
+        self.assertEqual(len(set(patient_ids)), 5)
+
+
+@skipUnless(connection.vendor != 'sqlite', "SQLite reserves blocks in the caller's transaction")
+class IdentifierSequenceTests(TransactionTestCase):
+    """A reserved block outlives the transaction that reserved it"""
+    
+    def setUp(self):
+        patient_id_allocator.reset()
+        self.addCleanup(patient_id_allocator.reset)
+    
+    def test_rolled_back_registration_keeps_its_block(self):
+        with transaction.atomic():
+            issued = patient_id_allocator.next_id()
+            transaction.set_rollback(True)
+        
+        # Another process starting afterwards must not be handed the same block
+        other_allocator = make_patient_allocator()
+        self.assertNotEqual(other_allocator.next_id(), issued)
+        self.assertNotEqual(patient_id_allocator.next_id(), other_allocator.next_id())
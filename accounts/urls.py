@@ -1,12 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     # Patient Profile Views
+    PatientListView,
     PatientProfileView,
     PatientProfileUpdateView,
     PatientSearchView,
     PatientDetailView,
     
     # Personnel Profile Views
+    PersonnelListView,
     PersonnelProfileView,
     PersonnelProfileUpdateView,
     PersonnelSearchView,
@@ -18,16 +21,22 @@ from .views import (
     EmergencyAccessLogView,
 )
 
+if settings.ASYNC_READ_VIEWS:
+    # ASGI deployments serve the hot read endpoints without a thread per request
+    from .async_views import PatientDetailView, PatientProfileView, PatientSearchView
+
 app_name = 'accounts'
 
 urlpatterns = [
     # Patient Profile Management
+    path('patient/', PatientListView.as_view(), name='patient-list'),
     path('patient/profile/', PatientProfileView.as_view(), name='patient-profile'),
     path('patient/profile/update/', PatientProfileUpdateView.as_view(), name='patient-profile-update'),
     path('patient/search/', PatientSearchView.as_view(), name='patient-search'),
     path('patient/<str:patient_id>/', PatientDetailView.as_view(), name='patient-detail'),
     
     # Personnel Profile Management
+    path('personnel/', PersonnelListView.as_view(), name='personnel-list'),
     path('personnel/profile/', PersonnelProfileView.as_view(), name='personnel-profile'),
     path('personnel/profile/update/', PersonnelProfileUpdateView.as_view(), name='personnel-profile-update'),
     path('personnel/search/', PersonnelSearchView.as_view(), name='personnel-search'),
@@ -5,7 +5,10 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.conf import settings
 
+from .matching import can_auto_select
 from .models import Patient, Personnel, Role, EmergencyAccess
 from .serializers import (
     PatientProfileSerializer,
@@ -19,7 +22,12 @@ from authentication.permissions import (
     IsPatient, IsPersonnel, IsVerifiedPersonnel, 
     CanTriggerEmergency, require_role, require_permission
 )
+from authentication.audit import PHIListAuditMixin, log_phi_access, log_phi_list_access
 from authentication.jwt_handler import CustomJWTHandler
+from authentication.utils import get_client_ip
+from krankenhaus.db_router import ReplicaReadMixin
+from krankenhaus.pagination import KeysetPagination
+from medical_records.summary import get_patient_summary
 
 
 class PatientProfileView(APIView):
@@ -28,7 +36,8 @@ class PatientProfileView(APIView):
     
     def get(self, request):
         try:
-            patient = Patient.objects.select_related('user').get(user=request.user)
+            # Filter on the key so a token-backed principal never loads auth_user
+            patient = Patient.objects.select_related('user').get(user_id=request.user.pk)
             serializer = PatientProfileSerializer(patient)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Patient.DoesNotExist:
@@ -75,12 +84,13 @@ class PatientSearchView(APIView):
         
         if patient_id:
             # Direct patient ID lookup
-            try:
-                patient = Patient.objects.get_by_patient_id(patient_id)
-                serializer = PatientProfileSerializer(patient)
-                return Response([serializer.data], status=status.HTTP_200_OK)
-            except Patient.DoesNotExist:
+            patient = Patient.objects.get_by_patient_id(patient_id)
+            if patient is None:
                 return Response([], status=status.HTTP_200_OK)
+            
+            serializer = PatientProfileSerializer(patient)
+            log_phi_list_access(request, 'patient_search', [patient.patient_id])
+            return Response([serializer.data], status=status.HTTP_200_OK)
         
         if len(query) < 2:
             return Response(
@@ -89,47 +99,99 @@ class PatientSearchView(APIView):
             )
         
         # Search by name, phone, email
-        patients = Patient.objects.search_patients(query)[:20]  # Limit results
+        patients = list(Patient.objects.search_patients(query)[:20])  # Limit results
+        log_phi_list_access(request, 'patient_search', [patient.patient_id for patient in patients])
         serializer = PatientProfileSerializer(patients, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class PatientListView(PHIListAuditMixin, generics.ListAPIView):
+    """List patients, newest registrations first (Verified Personnel only)"""
+    permission_classes = [IsAuthenticated, IsVerifiedPersonnel]
+    serializer_class = PatientProfileSerializer
+    pagination_class = KeysetPagination
+    
+    def get_queryset(self):
+        patients = Patient.objects.select_related('user')
+        
+        registration_type = self.request.GET.get('registration_type')
+        if registration_type:
+            patients = patients.filter(registration_type=registration_type)
+        
+        return patients
+
+
+def has_limited_patient_access(token_payload):
+    """Front-desk roles only see basic patient details"""
+    return any(role in token_payload.get('roles', []) for role in ['Receptionist', 'Security'])
+
+
+def limited_patient_data(serializer_data):
+    """Basic info only, for roles without medical access"""
+    return {
+        'patient_id': serializer_data['patient_id'],
+        'user': {
+            'first_name': serializer_data['user']['first_name'],
+            'last_name': serializer_data['user']['last_name'],
+            'email': serializer_data['user']['email'],
+        },
+        'phone_number': serializer_data.get('phone_number'),
+        'date_of_birth': serializer_data.get('date_of_birth'),
+    }
+
+
 class PatientDetailView(APIView):
     """Get patient details by patient ID (Verified Personnel only)"""
     permission_classes = [IsAuthenticated, IsVerifiedPersonnel]
     
     def get(self, request, patient_id):
-        try:
-            patient = Patient.objects.get_by_patient_id(patient_id)
-            
-            # Check access level based on personnel role from token
-            token_payload = getattr(request.user, 'token_payload', {})
-            user_roles = token_payload.get('roles', [])
-            serializer_data = PatientProfileSerializer(patient).data
-            
-            # Filter data based on role permissions
-            if any(role in user_roles for role in ['Receptionist', 'Security']):
-                # Limited access - only basic info
-                limited_data = {
-                    'patient_id': serializer_data['patient_id'],
-                    'user': {
-                        'first_name': serializer_data['user']['first_name'],
-                        'last_name': serializer_data['user']['last_name'],
-                        'email': serializer_data['user']['email'],
-                    },
-                    'phone_number': serializer_data.get('phone_number'),
-                    'date_of_birth': serializer_data.get('date_of_birth'),
-                }
-                return Response(limited_data, status=status.HTTP_200_OK)
-            
-            # Full access for medical personnel
-            return Response(serializer_data, status=status.HTTP_200_OK)
-            
-        except Patient.DoesNotExist:
+        patient = Patient.objects.get_by_patient_id(patient_id)
+        if patient is None:
             return Response(
                 {'error': 'Patient not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Check access level based on personnel role from token
+        token_payload = getattr(request.user, 'token_payload', {})
+        serializer_data = PatientProfileSerializer(patient).data
+        limited = has_limited_patient_access(token_payload)
+        log_phi_access(request, 'patient_record_viewed', patient, limited=limited)
+        
+        # Filter data based on role permissions
+        if limited:
+            return Response(limited_patient_data(serializer_data), status=status.HTTP_200_OK)
+        
+        # Full access for medical personnel
+        serializer_data['summary'] = get_patient_summary(patient)
+        return Response(serializer_data, status=status.HTTP_200_OK)
+
+
+class PersonnelListView(generics.ListAPIView):
+    """List personnel, newest first (Admin only)"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = PersonnelProfileSerializer
+    pagination_class = KeysetPagination
+    
+    def list(self, request, *args, **kwargs):
+        token_payload = getattr(request.user, 'token_payload', {})
+        if 'Admin' not in token_payload.get('roles', []):
+            return Response(
+                {'error': 'Permission denied'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        personnel = Personnel.objects.filter(is_active=True).select_related('user').prefetch_related(
+            'role_assignments__role'
+        )
+        
+        verification_status = self.request.GET.get('verification_status')
+        if verification_status:
+            personnel = personnel.filter(verification_status=verification_status)
+        
+        return personnel
 
 
 class PersonnelProfileView(APIView):
@@ -138,7 +200,9 @@ class PersonnelProfileView(APIView):
     
     def get(self, request):
         try:
-            personnel = Personnel.objects.select_related('user', 'role').get(user=request.user)
+            personnel = Personnel.objects.select_related('user').prefetch_related(
+                'role_assignments__role'
+            ).get(user_id=request.user.pk)
             serializer = PersonnelProfileSerializer(personnel)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Personnel.DoesNotExist:
@@ -309,20 +373,65 @@ class EmergencyPatientAccessView(APIView):
         search_method = None
         
         if patient_search.get('patient_id'):
-            try:
-                patient = Patient.objects.get_by_patient_id(patient_search['patient_id'])
-                search_method = 'patient_id'
-            except Patient.DoesNotExist:
-                pass
+            patient = Patient.objects.get_by_patient_id(patient_search['patient_id'])
+            search_method = 'patient_id'
         
-        if not patient and patient_search.get('name') and patient_search.get('dob'):
-            patients = Patient.objects.emergency_search(
-                patient_search['name'], 
-                patient_search['dob']
+        if not patient:
+            first_name = patient_search.get('first_name', '')
+            last_name = patient_search.get('last_name', '')
+            if not (first_name or last_name) and patient_search.get('name'):
+                # "First Middle Last" -> first and last name
+                names = patient_search['name'].split()
+                first_name, last_name = names[0], names[-1] if len(names) > 1 else ''
+            
+            try:
+                date_of_birth = parse_date(patient_search.get('dob') or '')
+            except ValueError:
+                date_of_birth = None
+            phone = patient_search.get('phone', '')
+            
+            if not any([first_name, last_name, date_of_birth, phone]):
+                return Response(
+                    {'error': 'Provide a patient ID, name, date of birth or phone number'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            candidates = Patient.objects.emergency_match(
+                first_name=first_name,
+                last_name=last_name,
+                date_of_birth=date_of_birth,
+                phone=phone
             )
-            if patients.exists():
-                patient = patients.first()
-                search_method = 'name_dob'
+            
+            if not candidates:
+                return Response(
+                    {'error': 'Patient not found with provided information'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            
+            hospital_settings = settings.HOSPITAL_SETTINGS
+            best = candidates[0]
+            runner_up_score = candidates[1].score if len(candidates) > 1 else 0
+            
+            if (not can_auto_select(best) or
+                    best.score < hospital_settings.get('EMERGENCY_MATCH_AUTO_SELECT_SCORE', 0.9) or
+                    best.score - runner_up_score < hospital_settings.get('EMERGENCY_MATCH_MIN_MARGIN', 0.1)):
+                # Not confident enough to open a record; let the clinician pick
+                summaries = self._candidate_summaries(candidates)
+                log_phi_list_access(
+                    request, 'emergency_candidates', [summary['patient_id'] for summary in summaries],
+                    reason=reason
+                )
+                return Response(
+                    {
+                        'message': 'Multiple possible matches, resubmit with the chosen patient_id',
+                        'candidates': summaries
+                    },
+                    status=status.HTTP_200_OK
+                )
+            
+            patient = Patient.objects.select_related('user').get(pk=best.patient_id)
+            search_method = 'emergency_match'
         
         if not patient:
             return Response(
@@ -331,13 +440,14 @@ class EmergencyPatientAccessView(APIView):
             )
         
         # Log emergency access
-        EmergencyAccess.objects.create(
+        EmergencyAccess.objects.log_emergency_access(
+            personnel=get_object_or_404(Personnel, user_id=request.user.pk),
             patient=patient,
-            personnel=request.user.personnel,
             reason=reason,
-            search_method=search_method,
-            ip_address=request.META.get('REMOTE_ADDR'),
+            ip_address=get_client_ip(request),
+            search_method=search_method
         )
+        log_phi_access(request, 'emergency_access', patient, reason=reason, search_method=search_method)
         
         # Return patient data
         serializer = PatientProfileSerializer(patient)
@@ -345,15 +455,34 @@ class EmergencyPatientAccessView(APIView):
             {
                 'message': 'Emergency access granted',
                 'patient_data': serializer.data,
+                'summary': get_patient_summary(patient),
                 'warning': 'This emergency access has been logged for audit purposes'
             },
             status=status.HTTP_200_OK
         )
+    
+    def _candidate_summaries(self, candidates):
+        """Minimal identifying details for each candidate match"""
+        patients = Patient.objects.select_related('user').in_bulk(
+            [candidate.patient_id for candidate in candidates]
+        )
+        summaries = []
+        for candidate in candidates:
+            patient = patients[candidate.patient_id]
+            summaries.append({
+                'patient_id': patient.patient_id,
+                'name': f"{patient.user.first_name} {patient.user.last_name}".strip(),
+                'date_of_birth': patient.date_of_birth,
+                'score': candidate.score,
+                'matched_on': candidate.reasons,
+            })
+        return summaries
 
 
-class EmergencyAccessLogView(APIView):
+class EmergencyAccessLogView(ReplicaReadMixin, APIView):
     """View emergency access logs (Admin only)"""
     permission_classes = [IsAuthenticated]
+    keyset_ordering_field = 'accessed_at'
     
     def get(self, request):
         # Only admins can view emergency access logs - using token payload
@@ -367,8 +496,11 @@ class EmergencyAccessLogView(APIView):
             )
         
         logs = EmergencyAccess.objects.select_related(
-            'patient__user', 'personnel__user'
-        ).order_by('-accessed_at')[:100]  # Last 100 emergency accesses
+            'patient__user', 'accessed_by__user'
+        )
         
-        serializer = EmergencyAccessSerializer(logs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Newest first, keyset paginated so deep audit pages stay cheap
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        serializer = EmergencyAccessSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointments'
+    
+    def ready(self):
+        from . import signals  # Register signal handlers
+        from .scheduling import install_overlap_constraint_handler
+        
+        # Add the PostgreSQL no-double-booking constraint after migrate
+        post_migrate.connect(install_overlap_constraint_handler, sender=self)
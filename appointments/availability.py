@@ -0,0 +1,143 @@
+import hashlib
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Appointment, DoctorSchedule
+from .scheduling import _free_slots_for_day, _minutes, booking_window
+from accounts.models import Personnel
+
+
+def _cache_timeout():
+    return settings.HOSPITAL_SETTINGS.get('AVAILABILITY_CACHE_TIMEOUT', 300)
+
+
+def _version_key(department_id, day):
+    return f"availability_version_{department_id}_{day.isoformat()}"
+
+
+def _data_key(department_id, day, version, doctors_key, duration_minutes):
+    return f"availability_{department_id}_{day.isoformat()}_{version}_{doctors_key}_{duration_minutes or 0}"
+
+
+def _days(start_date, end_date):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def invalidate_department_day(department_id, day):
+    """Drop a department's cached free slots for one day"""
+    cache.set(_version_key(department_id, day), uuid.uuid4().hex, timeout=_cache_timeout())
+
+
+def invalidate_department(department_id):
+    """Drop a department's cached free slots for the whole booking window"""
+    first_day, last_day = booking_window()
+    cache.set_many(
+        {_version_key(department_id, day): uuid.uuid4().hex for day in _days(first_day, last_day)},
+        timeout=_cache_timeout()
+    )
+
+
+def _current_versions(department_id, days):
+    keys = {day: _version_key(department_id, day) for day in days}
+    found = cache.get_many(keys.values())
+    
+    versions = {}
+    missing = {}
+    for day, key in keys.items():
+        if key in found:
+            versions[day] = found[key]
+        else:
+            versions[day] = missing[key] = uuid.uuid4().hex
+    if missing:
+        cache.set_many(missing, timeout=_cache_timeout())
+    return versions
+
+
+def compute_free_slots(doctor_ids, days, duration_minutes=None):
+    """Free slots for many doctors over many days in two queries
+    
+    Working hours and bookings for every doctor and day are read at once and
+    grouped in memory by (doctor, weekday) and (doctor, date), so the cost
+    does not grow with the number of doctors. Returns
+    {date: {doctor_id: [Slot, ...]}}.
+    """
+    if not doctor_ids or not days:
+        return {day: {} for day in days}
+    
+    start_date, end_date = min(days), max(days)
+    
+    schedules = defaultdict(list)
+    for schedule in DoctorSchedule.objects.for_doctors(doctor_ids, start_date, end_date):
+        schedules[schedule.doctor_id, schedule.weekday].append(schedule)
+    
+    booked = defaultdict(list)
+    rows = Appointment.objects.booked_for_doctors(doctor_ids, start_date, end_date).values_list(
+        'doctor_id', 'scheduled_date', 'scheduled_time', 'end_time'
+    )
+    for doctor_id, scheduled_date, start, end in rows:
+        booked[doctor_id, scheduled_date].append((_minutes(start), _minutes(end)))
+    
+    free = {}
+    for day in days:
+        free[day] = {}
+        for doctor_id in doctor_ids:
+            day_schedules = schedules.get((doctor_id, day.weekday()))
+            if not day_schedules:
+                continue
+            slots = _free_slots_for_day(day_schedules, booked.get((doctor_id, day), []), day, duration_minutes)
+            if slots:
+                free[day][doctor_id] = slots
+    return free
+
+
+def department_availability(department, start_date, end_date, duration_minutes=None):
+    """Free slots for every doctor in a department between two dates
+    
+    Days are cached per department and invalidated when an appointment or
+    schedule changes; only the days missing from the cache are computed,
+    together, so a lookup costs at most three queries whatever the range.
+    Slots that have already started today are dropped on the way out.
+    Returns (doctors, {date: {doctor_id: [Slot, ...]}}).
+    """
+    doctors = list(
+        Personnel.objects.doctors().filter(department=department).select_related('user').order_by('employee_id')
+    )
+    doctor_ids = [doctor.pk for doctor in doctors]
+    # Changing the department's doctors changes the cache key as well
+    doctors_key = hashlib.md5(','.join(map(str, doctor_ids)).encode()).hexdigest()[:12]
+    
+    days = _days(start_date, end_date)
+    versions = _current_versions(department.pk, days)
+    keys = {day: _data_key(department.pk, day, versions[day], doctors_key, duration_minutes) for day in days}
+    cached = cache.get_many(keys.values())
+    
+    availability = {day: cached[keys[day]] for day in days if keys[day] in cached}
+    missing = [day for day in days if day not in availability]
+    if missing:
+        computed = compute_free_slots(doctor_ids, missing, duration_minutes)
+        cache.set_many({keys[day]: computed[day] for day in missing}, timeout=_cache_timeout())
+        availability.update(computed)
+    
+    now = timezone.localtime()
+    today = now.date()
+    if today in availability:
+        availability[today] = {
+            doctor_id: [slot for slot in slots if _minutes(slot.start) > _minutes(now)]
+            for doctor_id, slots in availability[today].items()
+        }
+    
+    return doctors, {day: availability[day] for day in days}
+
+
+def next_available(availability):
+    """Earliest (date, doctor_id, Slot) in a department_availability result, or None"""
+    for day in sorted(availability):
+        earliest = [(slots[0].start, doctor_id, slots[0]) for doctor_id, slots in availability[day].items() if slots]
+        if earliest:
+            _, doctor_id, slot = min(earliest)
+            return day, doctor_id, slot
+    return None
@@ -2,6 +2,10 @@ from django.db import models
 from django.utils import timezone
 from django.db.models import Q  # Added for potential future query expansions
 
+# Statuses that hold a doctor's time; cancelled and no-show slots are free again
+ACTIVE_STATUSES = ['scheduled', 'confirmed', 'in_progress']
+
+
 class AppointmentManager(models.Manager):
     def upcoming_appointments(self):
         """Get upcoming appointments"""
@@ -38,3 +42,45 @@ class AppointmentManager(models.Manager):
     def no_show_appointments(self):
         """Get no-show appointments"""
         return self.filter(status='no_show')
+    
+    def booked_for_doctor(self, doctor_id, start_date, end_date):
+        """Get a doctor's slot-holding appointments between two dates (inclusive)"""
+        return self.booked_for_doctors([doctor_id], start_date, end_date)
+    
+    def booked_for_doctors(self, doctor_ids, start_date, end_date):
+        """Get slot-holding appointments of several doctors between two dates (inclusive)"""
+        return self.filter(
+            doctor_id__in=doctor_ids,
+            scheduled_date__gte=start_date,
+            scheduled_date__lte=end_date,
+            status__in=ACTIVE_STATUSES
+        ).order_by('scheduled_date', 'scheduled_time')
+    
+    def overlapping(self, doctor_id, scheduled_date, start_time, end_time, exclude_id=None):
+        """Get a doctor's slot-holding appointments overlapping [start_time, end_time)"""
+        appointments = self.filter(
+            doctor_id=doctor_id,
+            scheduled_date=scheduled_date,
+            scheduled_time__lt=end_time,
+            end_time__gt=start_time,
+            status__in=ACTIVE_STATUSES
+        )
+        if exclude_id is not None:
+            appointments = appointments.exclude(pk=exclude_id)
+        return appointments
+
+
+class DoctorScheduleManager(models.Manager):
+    def for_doctor(self, doctor_id, start_date, end_date):
+        """Get working hours for a doctor that apply anywhere between two dates"""
+        return self.for_doctors([doctor_id], start_date, end_date)
+    
+    def for_doctors(self, doctor_ids, start_date, end_date):
+        """Get working hours for several doctors that apply anywhere between two dates"""
+        return self.filter(
+            doctor_id__in=doctor_ids,
+            is_active=True
+        ).filter(
+            Q(valid_from__isnull=True) | Q(valid_from__lte=end_date),
+            Q(valid_until__isnull=True) | Q(valid_until__gte=start_date)
+        ).order_by('weekday', 'start_time')
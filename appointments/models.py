@@ -1,6 +1,7 @@
+from datetime import datetime, time, timedelta
 from django.db import models
 
-from .managers import AppointmentManager  # Import the manager
+from .managers import AppointmentManager, DoctorScheduleManager  # Import the managers
 
 class Appointment(models.Model):
     objects = AppointmentManager()  # Assign the custom manager
@@ -19,6 +20,8 @@ class Appointment(models.Model):
     scheduled_date = models.DateField()
     scheduled_time = models.TimeField()
     duration_minutes = models.IntegerField(default=30)
+    # Derived from the start and duration so overlap checks are a plain range query
+    end_time = models.TimeField(editable=False)
     
     status = models.CharField(max_length=20, choices=[
         ('scheduled', 'Scheduled'),
@@ -36,5 +39,73 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='appointment_created_keyset_idx'),
+            models.Index(fields=['doctor', 'scheduled_date', 'scheduled_time'], name='appointment_doctor_day_idx'),
+            models.Index(fields=['patient', 'scheduled_date', 'scheduled_time'], name='appointment_patient_day_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.patient.patient_id} with Dr. {self.doctor.user.last_name} on {self.scheduled_date}"
+    
+    def save(self, *args, **kwargs):
+        self.refresh_end_time()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'end_time' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['end_time']
+        super().save(*args, **kwargs)
+    
+    def refresh_end_time(self):
+        """Recompute end_time; call before bulk_create, which skips save()"""
+        start = datetime.combine(self.scheduled_date, self.scheduled_time)
+        end = start + timedelta(minutes=self.duration_minutes)
+        # Appointments never run past midnight; clamp rather than wrap
+        self.end_time = end.time() if end.date() == start.date() else time.max
+
+
+class DoctorSchedule(models.Model):
+    """Recurring weekly working hours a doctor can be booked in"""
+    objects = DoctorScheduleManager()
+    
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    doctor = models.ForeignKey('accounts.Personnel', on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    
+    valid_from = models.DateField(null=True, blank=True)
+    valid_until = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['doctor', 'weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['doctor', 'weekday'], name='doctor_schedule_day_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_time__gt=models.F('start_time')),
+                name='doctor_schedule_end_after_start'
+            ),
+            models.CheckConstraint(
+                condition=models.Q(slot_minutes__gt=0),
+                name='doctor_schedule_slot_minutes_positive'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.doctor.employee_id} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
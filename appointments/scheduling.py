@@ -0,0 +1,212 @@
+import logging
+from collections import namedtuple
+from datetime import time, timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .managers import ACTIVE_STATUSES
+from .models import Appointment, DoctorSchedule
+from accounts.models import Personnel
+
+logger = logging.getLogger(__name__)
+
+APPOINTMENT_TABLE = 'appointments_appointment'
+OVERLAP_CONSTRAINT_NAME = 'appointment_no_doctor_overlap'
+
+Slot = namedtuple('Slot', ['start', 'end'])
+
+
+class SchedulingError(Exception):
+    """Raised when an appointment request falls outside bookable time"""
+    pass
+
+
+class SlotUnavailable(SchedulingError):
+    """Raised when the requested time overlaps an existing booking"""
+    pass
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _time(minutes):
+    return time.max if minutes >= 24 * 60 else time(minutes // 60, minutes % 60)
+
+
+def booking_window(today=None):
+    """First and last dates open for booking"""
+    today = today or timezone.localdate()
+    days_advance = settings.HOSPITAL_SETTINGS.get('APPOINTMENT_BOOKING_DAYS_ADVANCE', 30)
+    return today, today + timedelta(days=days_advance)
+
+
+def _applies_on(schedule, day):
+    return (
+        schedule.weekday == day.weekday()
+        and (schedule.valid_from is None or schedule.valid_from <= day)
+        and (schedule.valid_until is None or schedule.valid_until >= day)
+    )
+
+
+def _free_slots_for_day(schedules, booked, day, duration_minutes=None, not_before=None):
+    """Carve a day's working hours into free slots around the booked intervals
+    
+    ``booked`` is a sorted list of (start, end) minutes. Slots step by the
+    schedule's slot length; a longer ``duration_minutes`` only offers starts
+    that leave room for the whole appointment.
+    """
+    slots = []
+    for schedule in schedules:
+        if not _applies_on(schedule, day):
+            continue
+        
+        step = schedule.slot_minutes
+        if step <= 0:
+            continue  # Rows predating the constraint; stepping by 0 never ends
+        length = duration_minutes or step
+        window_end = _minutes(schedule.end_time)
+        start = _minutes(schedule.start_time)
+        while start + length <= window_end:
+            end = start + length
+            if not_before is not None and start < not_before:
+                start += step
+                continue
+            if not any(booked_start < end and booked_end > start for booked_start, booked_end in booked):
+                slots.append(Slot(_time(start), _time(end)))
+            start += step
+    return slots
+
+
+def get_free_slots_range(doctor, start_date, end_date, duration_minutes=None):
+    """Free slots for a doctor on every day between two dates (inclusive)
+    
+    Uses two queries however many days are asked for: one for the working
+    hours and one indexed (doctor, scheduled_date) range read of bookings.
+    Returns an ordered {date: [Slot, ...]} dict.
+    """
+    schedules = list(DoctorSchedule.objects.for_doctor(doctor.pk, start_date, end_date))
+    
+    booked = {}
+    rows = Appointment.objects.booked_for_doctor(doctor.pk, start_date, end_date).values_list(
+        'scheduled_date', 'scheduled_time', 'end_time'
+    )
+    for scheduled_date, start, end in rows:
+        booked.setdefault(scheduled_date, []).append((_minutes(start), _minutes(end)))
+    
+    now = timezone.localtime()
+    free = {}
+    day = start_date
+    while day <= end_date:
+        # Slots already started today are not offered
+        not_before = _minutes(now) + 1 if day == now.date() else None
+        free[day] = _free_slots_for_day(schedules, booked.get(day, []), day, duration_minutes, not_before)
+        day += timedelta(days=1)
+    return free
+
+
+def get_free_slots(doctor, day, duration_minutes=None):
+    """Free slots for a doctor on one day"""
+    return get_free_slots_range(doctor, day, day, duration_minutes)[day]
+
+
+def _check_bookable(doctor, scheduled_date, start, end):
+    first_day, last_day = booking_window()
+    if scheduled_date < first_day or scheduled_date > last_day:
+        raise SchedulingError(f"Appointments can only be booked between {first_day} and {last_day}")
+    
+    now = timezone.localtime()
+    if scheduled_date == now.date() and start <= _minutes(now):
+        raise SchedulingError("Appointment time has already passed")
+    
+    schedules = DoctorSchedule.objects.for_doctor(doctor.pk, scheduled_date, scheduled_date).filter(
+        weekday=scheduled_date.weekday()
+    )
+    within_hours = any(
+        _minutes(schedule.start_time) <= start and end <= _minutes(schedule.end_time)
+        for schedule in schedules
+    )
+    if not within_hours:
+        raise SchedulingError("Requested time is outside the doctor's working hours")
+
+
+def book_appointment(patient, doctor, scheduled_date, scheduled_time, appointment_type,
+                     duration_minutes=None, reason='', created_by=None):
+    """Book an appointment if the doctor is free, without double booking
+    
+    The doctor's row is locked for the transaction so concurrent bookings
+    for the same doctor run one after another, and the overlap check is an
+    indexed range query. On PostgreSQL the exclusion constraint installed by
+    install_overlap_constraint backs this up. Raises SlotUnavailable if the
+    time is taken and SchedulingError if it is not bookable at all.
+    """
+    if duration_minutes is None:
+        schedule = DoctorSchedule.objects.for_doctor(doctor.pk, scheduled_date, scheduled_date).filter(
+            weekday=scheduled_date.weekday(),
+            start_time__lte=scheduled_time,
+            end_time__gt=scheduled_time
+        ).first()
+        duration_minutes = schedule.slot_minutes if schedule else 30
+    
+    start = _minutes(scheduled_time)
+    end = start + duration_minutes
+    _check_bookable(doctor, scheduled_date, start, end)
+    
+    try:
+        with transaction.atomic():
+            Personnel.objects.select_for_update().only('id').get(pk=doctor.pk)
+            
+            if Appointment.objects.overlapping(doctor.pk, scheduled_date, scheduled_time, _time(end)).exists():
+                raise SlotUnavailable("The doctor is already booked at that time")
+            
+            return Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                appointment_type=appointment_type,
+                scheduled_date=scheduled_date,
+                scheduled_time=scheduled_time,
+                duration_minutes=duration_minutes,
+                reason=reason,
+                created_by=created_by
+            )
+    except IntegrityError:
+        # The exclusion constraint caught a booking that raced past the lock
+        raise SlotUnavailable("The doctor is already booked at that time")
+
+
+def install_overlap_constraint(using='default'):
+    """Add the PostgreSQL exclusion constraint against overlapping bookings
+    
+    Safe to run repeatedly; it is called after every migrate. Other
+    databases rely on the row lock in book_appointment alone.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    if APPOINTMENT_TABLE not in connection.introspection.table_names():
+        return False
+    
+    statuses = ', '.join(f"'{status}'" for status in ACTIVE_STATUSES)
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_constraint WHERE conname = %s', [OVERLAP_CONSTRAINT_NAME])
+            if cursor.fetchone():
+                return True
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+            cursor.execute(
+                f"ALTER TABLE {APPOINTMENT_TABLE} ADD CONSTRAINT {OVERLAP_CONSTRAINT_NAME} "
+                f"EXCLUDE USING gist (doctor_id WITH =, "
+                f"tsrange(scheduled_date + scheduled_time, scheduled_date + end_time, '[)') WITH &&) "
+                f"WHERE (status IN ({statuses}))"
+            )
+    except DatabaseError as e:
+        # Usually existing overlapping bookings; those must be resolved first
+        logger.warning(f"Could not add appointment overlap constraint: {e}")
+        return False
+    return True
+
+
+def install_overlap_constraint_handler(sender, using='default', **kwargs):
+    """post_migrate hook that installs the appointment overlap constraint"""
+    install_overlap_constraint(using=using)
@@ -0,0 +1,40 @@
+from rest_framework import serializers
+from .models import Appointment
+
+# Bounds on an appointment's length, for booking and for slot searches
+MIN_DURATION_MINUTES = 5
+MAX_DURATION_MINUTES = 480
+
+
+class AppointmentSerializer(serializers.ModelSerializer):
+    """Appointment summary for listings"""
+    patient_id = serializers.CharField(source='patient.patient_id', read_only=True)
+    patient_name = serializers.SerializerMethodField()
+    doctor_employee_id = serializers.CharField(source='doctor.employee_id', read_only=True)
+    doctor_name = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient_id', 'patient_name', 'doctor_employee_id', 'doctor_name',
+            'appointment_type', 'scheduled_date', 'scheduled_time', 'duration_minutes', 'end_time',
+            'status', 'reason', 'created_at', 'updated_at'
+        ]
+    
+    def get_patient_name(self, obj):
+        return f"{obj.patient.user.first_name} {obj.patient.user.last_name}".strip()
+    
+    def get_doctor_name(self, obj):
+        return f"{obj.doctor.user.first_name} {obj.doctor.user.last_name}".strip()
+
+
+class AppointmentBookingSerializer(serializers.Serializer):
+    """Request to book a doctor's free slot"""
+    doctor = serializers.CharField(max_length=20, help_text='Doctor employee ID')
+    patient_id = serializers.CharField(max_length=20, required=False,
+                                       help_text='Required when personnel book for a patient')
+    appointment_type = serializers.ChoiceField(choices=Appointment._meta.get_field('appointment_type').choices)
+    scheduled_date = serializers.DateField()
+    scheduled_time = serializers.TimeField()
+    duration_minutes = serializers.IntegerField(min_value=MIN_DURATION_MINUTES, max_value=MAX_DURATION_MINUTES, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .availability import invalidate_department, invalidate_department_day
+from .models import Appointment, DoctorSchedule
+
+
+def _invalidate_after_commit(department_days):
+    # Bumped before commit, a concurrent reader could recompute from the
+    # old rows and cache them under the new version
+    department_days = {(department_id, day) for department_id, day in department_days if department_id is not None}
+    
+    def invalidate():
+        for department_id, day in department_days:
+            invalidate_department_day(department_id, day)
+    
+    if department_days:
+        transaction.on_commit(invalidate)
+
+
+@receiver(pre_save, sender=Appointment)
+def appointment_previous_slot_handler(sender, instance, **kwargs):
+    """Remember the department and day an existing appointment is moving from"""
+    instance._previous_slot = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._previous_slot = Appointment.objects.filter(pk=instance.pk).values_list(
+            'doctor__department_id', 'scheduled_date'
+        ).first()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed_handler(sender, instance, **kwargs):
+    """Drop the cached free slots of the doctor's department for that day, and the day it moved from"""
+    department_days = [(instance.doctor.department_id, instance.scheduled_date)]
+    previous_slot = getattr(instance, '_previous_slot', None)
+    if previous_slot is not None:
+        department_days.append(previous_slot)
+    _invalidate_after_commit(department_days)
+
+
+@receiver(post_save, sender=DoctorSchedule)
+@receiver(post_delete, sender=DoctorSchedule)
+def doctor_schedule_changed_handler(sender, instance, **kwargs):
+    """Working hours changed; drop the department's cached free slots"""
+    department_id = instance.doctor.department_id
+    if department_id is not None:
+        transaction.on_commit(lambda: invalidate_department(department_id))
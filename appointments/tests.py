@@ -1,3 +1,211 @@
-from django.test import TestCase
+import datetime
+import json
+import threading
+from io import StringIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
 
-# Create your tests here.
+from .availability import department_availability
+from .models import Appointment, DoctorSchedule
+from .scheduling import book_appointment, SchedulingError, SlotUnavailable
+from accounts.models import Department, Patient, Personnel, PersonnelRole, Role
+from authentication.jwt_handler import CustomJWTHandler
+from authentication.models import AuditLog, User
+
+
+class SchedulingFixtureMixin:
+    """A doctor working 09:00-12:00 in 30 minute slots, and two patients"""
+    
+    def create_fixtures(self):
+        call_command('create_roles', stdout=StringIO())
+        self.department = Department.objects.create(name='Cardiology')
+        doctor_user = User.objects.create_user('doctor@example.com', 'Doc', 'Tor', 'Passw0rd!', is_active=True, is_verified=True)
+        self.doctor = Personnel.objects.create_personnel_profile(user=doctor_user, is_verified=True, department=self.department)
+        PersonnelRole.objects.create(personnel=self.doctor, role=Role.objects.get(name='Doctor'))
+        
+        self.patients = [
+            Patient.objects.create_patient_profile(
+                user=User.objects.create_user(f'patient{i}@example.com', 'Pat', f'Ient{i}', 'Passw0rd!', is_active=True)
+            )
+            for i in range(2)
+        ]
+        
+        self.day = datetime.date.today() + datetime.timedelta(days=3)
+        DoctorSchedule.objects.create(
+            doctor=self.doctor,
+            weekday=self.day.weekday(),
+            start_time=datetime.time(9),
+            end_time=datetime.time(12),
+            slot_minutes=30
+        )
+    
+    def book(self, patient, time, **kwargs):
+        return book_appointment(patient, self.doctor, self.day, time, 'consultation', **kwargs)
+
+
+class BookAppointmentTests(SchedulingFixtureMixin, TestCase):
+    """book_appointment never puts two appointments in one doctor's time"""
+    
+    def setUp(self):
+        self.create_fixtures()
+    
+    def test_same_slot_is_refused(self):
+        self.book(self.patients[0], datetime.time(9, 30))
+        with self.assertRaises(SlotUnavailable):
+            self.book(self.patients[1], datetime.time(9, 30))
+        self.assertEqual(Appointment.objects.count(), 1)
+    
+    def test_overlapping_slot_is_refused(self):
+        self.book(self.patients[0], datetime.time(9, 30))
+        with self.assertRaises(SlotUnavailable):
+            self.book(self.patients[1], datetime.time(9, 15), duration_minutes=30)
+        with self.assertRaises(SlotUnavailable):
+            self.book(self.patients[1], datetime.time(9, 45), duration_minutes=30)
+    
+    def test_back_to_back_slots_are_allowed(self):
+        self.book(self.patients[0], datetime.time(9, 30))
+        self.book(self.patients[1], datetime.time(10))
+        self.book(self.patients[1], datetime.time(9))
+        self.assertEqual(Appointment.objects.count(), 3)
+    
+    def test_cancelled_appointment_frees_the_slot(self):
+        appointment = self.book(self.patients[0], datetime.time(9, 30))
+        appointment.status = 'cancelled'
+        appointment.save(update_fields=['status'])
+        self.book(self.patients[1], datetime.time(9, 30))
+    
+    def test_outside_working_hours_is_refused(self):
+        with self.assertRaises(SchedulingError):
+            self.book(self.patients[0], datetime.time(11, 45))
+    
+    def test_booking_endpoint_returns_conflict(self):
+        token = CustomJWTHandler.generate_tokens(User.objects.get(pk=self.patients[0].user_id))['access_token']
+        body = json.dumps({
+            'doctor': self.doctor.employee_id,
+            'appointment_type': 'consultation',
+            'scheduled_date': str(self.day),
+            'scheduled_time': '10:00'
+        })
+        
+        first = self.client.post('/api/appointments/book/', body, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        second = self.client.post('/api/appointments/book/', body, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 409)
+    
+    def test_slot_minutes_must_be_positive(self):
+        with self.assertRaises(IntegrityError):
+            DoctorSchedule.objects.create(
+                doctor=self.doctor,
+                weekday=(self.day.weekday() + 1) % 7,
+                start_time=datetime.time(9),
+                end_time=datetime.time(12),
+                slot_minutes=0
+            )
+
+
+@override_settings(AUDIT_LOG={**settings.AUDIT_LOG, 'BUFFERED': False})
+class AppointmentListTests(SchedulingFixtureMixin, TestCase):
+    """GET /api/appointments/"""
+    
+    def setUp(self):
+        self.create_fixtures()
+        token = CustomJWTHandler.generate_tokens(User.objects.get(pk=self.patients[0].user_id))['access_token']
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    
+    def test_page_is_audited(self):
+        self.book(self.patients[0], datetime.time(9))
+        self.book(self.patients[0], datetime.time(10))
+        response = self.client.get('/api/appointments/')
+        self.assertEqual(response.status_code, 200)
+        audit = AuditLog.objects.get(action='appointments_viewed')
+        self.assertEqual(audit.details['patient_ids'], [self.patients[0].patient_id])
+
+
+class AvailabilityCacheTests(SchedulingFixtureMixin, TestCase):
+    """Cached department slots are dropped once a booking commits"""
+    
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+    
+    def free_starts(self, day):
+        _, availability = department_availability(self.department, day, day)
+        return [slot.start for slot in availability[day][self.doctor.pk]]
+    
+    def test_booking_invalidates_the_day(self):
+        self.assertIn(datetime.time(10), self.free_starts(self.day))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(self.patients[0], datetime.time(10))
+        self.assertNotIn(datetime.time(10), self.free_starts(self.day))
+    
+    def test_rescheduling_invalidates_the_old_day(self):
+        next_week = self.day + datetime.timedelta(days=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(self.patients[0], datetime.time(10))
+        self.assertNotIn(datetime.time(10), self.free_starts(self.day))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.scheduled_date = next_week
+            appointment.save()
+        self.assertIn(datetime.time(10), self.free_starts(self.day))
+        self.assertNotIn(datetime.time(10), self.free_starts(next_week))
+
+
+class DepartmentAvailabilityViewTests(SchedulingFixtureMixin, TestCase):
+    """GET /api/appointments/availability/"""
+    
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+        token = CustomJWTHandler.generate_tokens(User.objects.get(pk=self.patients[0].user_id))['access_token']
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    
+    def availability(self, **params):
+        return self.client.get('/api/appointments/availability/', {'department': self.department.pk, 'date': str(self.day), 'days': 1, **params})
+    
+    def test_duration_sets_the_slot_length(self):
+        response = self.availability(duration=60)
+        self.assertEqual(response.status_code, 200)
+        slots = response.json()['days'][0]['doctors'][0]['slots']
+        self.assertEqual(slots[0], {'start': '09:00', 'end': '10:00'})
+    
+    def test_duration_out_of_bounds_is_refused(self):
+        for duration in (-30, 0, 4, 481):
+            response = self.availability(duration=duration)
+            self.assertEqual(response.status_code, 400, duration)
+            self.assertIn('duration', response.json()['error'])
+    
+    def test_duration_must_be_a_number(self):
+        self.assertEqual(self.availability(duration='half').status_code, 400)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(SchedulingFixtureMixin, TransactionTestCase):
+    """Simultaneous requests for one slot produce exactly one appointment"""
+    
+    def test_only_one_concurrent_booking_wins(self):
+        self.create_fixtures()
+        barrier = threading.Barrier(5)
+        outcomes = []
+        
+        def book():
+            try:
+                barrier.wait()
+                self.book(self.patients[0], datetime.time(10, 30))
+                outcomes.append('booked')
+            except SlotUnavailable:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=book) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(outcomes.count('booked'), 1)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor, scheduled_date=self.day).count(), 1)
@@ -0,0 +1,11 @@
+from django.urls import path
+from .views import AppointmentListView, BookAppointmentView, DepartmentAvailabilityView, DoctorAvailabilityView
+
+app_name = 'appointments'
+
+urlpatterns = [
+    path('', AppointmentListView.as_view(), name='appointment-list'),
+    path('availability/', DepartmentAvailabilityView.as_view(), name='department-availability'),
+    path('book/', BookAppointmentView.as_view(), name='appointment-book'),
+    path('doctors/<str:employee_id>/slots/', DoctorAvailabilityView.as_view(), name='doctor-availability'),
+]
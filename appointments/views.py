@@ -0,0 +1,254 @@
+from datetime import timedelta
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .availability import department_availability, next_available
+from .models import Appointment
+from .scheduling import SchedulingError, SlotUnavailable, book_appointment, booking_window, get_free_slots_range
+from .serializers import AppointmentBookingSerializer, AppointmentSerializer, MAX_DURATION_MINUTES, MIN_DURATION_MINUTES
+from accounts.models import Department, Patient, Personnel
+from authentication.audit import PHIListAuditMixin
+from authentication.permissions import get_token_payload
+from krankenhaus.pagination import KeysetPagination
+
+
+def _date_param(value):
+    """A YYYY-MM-DD query parameter as a date, or None if it is not a valid date"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None  # Well formed but impossible, e.g. 2025-02-30
+
+
+class AppointmentListView(PHIListAuditMixin, generics.ListAPIView):
+    """List appointments, newest first
+    
+    Patients see their own appointments; verified personnel can filter by
+    doctor, patient, status and date.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    audit_action = 'appointments_viewed'
+    
+    def audit_patient_ids(self, appointments):
+        return [appointment.patient.patient_id for appointment in appointments]
+    
+    def list(self, request, *args, **kwargs):
+        if request.GET.get('date') and _date_param(request.GET['date']) is None:
+            return Response(
+                {'error': 'date must be YYYY-MM-DD'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        appointments = Appointment.objects.select_related('patient__user', 'doctor__user')
+        token_payload = get_token_payload(self.request)
+        
+        if token_payload.get('user_type') == 'patient':
+            return appointments.filter(patient__user_id=self.request.user.pk)
+        
+        if token_payload.get('user_type') != 'personnel' or not token_payload.get('is_verified', False):
+            raise PermissionDenied('Access restricted to patients and verified personnel')
+        
+        params = self.request.GET
+        if params.get('doctor'):
+            appointments = appointments.filter(doctor__employee_id=params['doctor'])
+        if params.get('patient'):
+            appointments = appointments.filter(patient__patient_id=params['patient'])
+        if params.get('status'):
+            appointments = appointments.filter(status=params['status'])
+        if params.get('date'):
+            appointments = appointments.filter(scheduled_date=_date_param(params['date']))
+        
+        return appointments
+
+
+class DoctorAvailabilityView(APIView):
+    """Free slots for a doctor over one or more days
+    
+    ?date=YYYY-MM-DD (default today) and ?days=N (default 1, at most 14);
+    days outside the booking window are left out.
+    """
+    permission_classes = [IsAuthenticated]
+    max_days = 14
+    
+    def get(self, request, employee_id):
+        doctor = get_object_or_404(Personnel.objects.doctors(), employee_id=employee_id)
+        
+        first_day, last_day = booking_window()
+        start_date = _date_param(request.GET['date']) if request.GET.get('date') else first_day
+        if start_date is None:
+            return Response(
+                {'error': 'date must be YYYY-MM-DD'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            days = max(1, min(int(request.GET.get('days', 1)), self.max_days))
+        except ValueError:
+            days = 1
+        
+        start_date = max(start_date, first_day)
+        end_date = min(start_date + timedelta(days=days - 1), last_day)
+        free = get_free_slots_range(doctor, start_date, end_date) if start_date <= end_date else {}
+        
+        return Response({
+            'doctor': doctor.employee_id,
+            'days': [
+                {
+                    'date': day,
+                    'slots': [{'start': slot.start.strftime('%H:%M'), 'end': slot.end.strftime('%H:%M')} for slot in slots]
+                }
+                for day, slots in free.items()
+            ]
+        })
+
+
+class DepartmentAvailabilityView(APIView):
+    """Free slots for every doctor in a department, plus the earliest one
+    
+    ?department=<id or name> is required; ?date=YYYY-MM-DD (default today),
+    ?days=N (default 7) and ?duration=<minutes> are optional; duration has
+    the same bounds as a booking. The range is clipped to the booking window.
+    """
+    permission_classes = [IsAuthenticated]
+    default_days = 7
+    
+    def get(self, request):
+        department_param = request.GET.get('department', '').strip()
+        if not department_param:
+            return Response(
+                {'error': 'department is required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if department_param.isdigit():
+            department = get_object_or_404(Department, pk=department_param, is_active=True)
+        else:
+            department = get_object_or_404(Department, name__iexact=department_param, is_active=True)
+        
+        first_day, last_day = booking_window()
+        start_date = _date_param(request.GET['date']) if request.GET.get('date') else first_day
+        if start_date is None:
+            return Response(
+                {'error': 'date must be YYYY-MM-DD'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            days = max(1, int(request.GET.get('days', self.default_days)))
+            duration = int(request.GET['duration']) if request.GET.get('duration') else None
+        except ValueError:
+            return Response(
+                {'error': 'days and duration must be whole numbers'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if duration is not None and not MIN_DURATION_MINUTES <= duration <= MAX_DURATION_MINUTES:
+            return Response(
+                {'error': f'duration must be between {MIN_DURATION_MINUTES} and {MAX_DURATION_MINUTES} minutes'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start_date = max(start_date, first_day)
+        end_date = min(start_date + timedelta(days=days - 1), last_day)
+        if start_date > end_date:
+            doctors, availability = [], {}
+        else:
+            doctors, availability = department_availability(department, start_date, end_date, duration)
+        
+        doctors_by_id = {doctor.pk: doctor for doctor in doctors}
+        
+        def doctor_summary(doctor_id):
+            doctor = doctors_by_id[doctor_id]
+            return {
+                'employee_id': doctor.employee_id,
+                'name': f"{doctor.user.first_name} {doctor.user.last_name}".strip(),
+            }
+        
+        earliest = next_available(availability)
+        return Response({
+            'department': department.name,
+            'next_available': {
+                'date': earliest[0],
+                'doctor': doctor_summary(earliest[1]),
+                'start': earliest[2].start.strftime('%H:%M'),
+                'end': earliest[2].end.strftime('%H:%M'),
+            } if earliest else None,
+            'days': [
+                {
+                    'date': day,
+                    'doctors': [
+                        dict(
+                            doctor_summary(doctor_id),
+                            slots=[{'start': slot.start.strftime('%H:%M'), 'end': slot.end.strftime('%H:%M')} for slot in slots]
+                        )
+                        for doctor_id, slots in sorted(free.items(), key=lambda entry: doctors_by_id[entry[0]].employee_id)
+                    ]
+                }
+                for day, free in availability.items()
+            ]
+        })
+
+
+class BookAppointmentView(APIView):
+    """Book a free slot; patients book for themselves, verified personnel for any patient"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        token_payload = get_token_payload(request)
+        serializer = AppointmentBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        created_by = None
+        if token_payload.get('user_type') == 'patient':
+            patient = get_object_or_404(Patient, user_id=request.user.pk)
+        elif token_payload.get('user_type') == 'personnel' and token_payload.get('is_verified', False):
+            if not data.get('patient_id'):
+                return Response(
+                    {'error': 'patient_id is required'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            patient = get_object_or_404(Patient, patient_id=data['patient_id'])
+            created_by = get_object_or_404(Personnel, user_id=request.user.pk)
+        else:
+            return Response(
+                {'error': 'Access restricted to patients and verified personnel'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        doctor = get_object_or_404(Personnel.objects.doctors(), employee_id=data['doctor'])
+        
+        try:
+            appointment = book_appointment(
+                patient,
+                doctor,
+                data['scheduled_date'],
+                data['scheduled_time'],
+                data['appointment_type'],
+                duration_minutes=data.get('duration_minutes'),
+                reason=data['reason'],
+                created_by=created_by
+            )
+        except SlotUnavailable as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        except SchedulingError as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(
+            {
+                'message': 'Appointment booked',
+                'appointment': AppointmentSerializer(appointment).data
+            },
+            status=status.HTTP_201_CREATED
+        )
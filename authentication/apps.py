@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from . import signals  # Register signal handlers
+        from . import db_stats  # Count database connects per worker
+        from .audit import install_audit_partitioning_handler
+        
+        # Partition the audit log table by month on PostgreSQL after migrate
+        post_migrate.connect(install_audit_partitioning_handler, sender=self)
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import permissions, status
+from rest_framework.exceptions import AuthenticationFailed
+
+from .jwt_handler import AsyncJWTAuthentication
+from .permissions import get_token_payload
+from .views import token_user_data
+
+
+def error_response(status_code, message, detail):
+    """Error body in the same shape as custom_exception_handler produces"""
+    response = JsonResponse({
+        'error': True,
+        'message': message,
+        'details': {'detail': detail},
+        'status_code': status_code
+    }, status=status_code)
+    if status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+class AsyncAPIView(View):
+    """Base for read endpoints served natively under ASGI
+    
+    DRF's APIView is synchronous, so these are plain async Django views:
+    the token is authenticated with the async ORM and cache, then the same
+    DRF permission classes as the sync views are checked (they only read the
+    token payload). Handlers must be ``async def`` and return JsonResponse.
+    Only bearer tokens are accepted; session authentication would need a
+    synchronous user lookup.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication = AsyncJWTAuthentication()
+    
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user_auth = await self.authentication.authenticate(request)
+        except AuthenticationFailed as e:
+            return error_response(status.HTTP_401_UNAUTHORIZED, 'Authentication required', str(e.detail))
+        
+        # Replaces the lazy session user, which would query synchronously
+        request.user, request.auth = user_auth or (AnonymousUser(), None)
+        
+        for permission_class in self.permission_classes:
+            if not permission_class().has_permission(request, self):
+                if not request.user.is_authenticated:
+                    return error_response(
+                        status.HTTP_401_UNAUTHORIZED, 'Authentication required',
+                        'Authentication credentials were not provided.'
+                    )
+                return error_response(
+                    status.HTTP_403_FORBIDDEN, 'Permission denied',
+                    'You do not have permission to perform this action.'
+                )
+        
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ValidateTokenView(AsyncAPIView):
+
+    async def get(self, request):
+        return JsonResponse({
+            'valid': True,
+            'user': token_user_data(get_token_payload(request))
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,447 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from asgiref.sync import sync_to_async
+from datetime import date
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, Error, close_old_connections, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog
+from .utils import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+AUDIT_TABLE = AuditLog._meta.db_table
+
+# audit-<pid>.jsonl is being appended to by that process; replay-<pid>-<n>.jsonl
+# has been claimed for replay by that process
+_SPILL_FILE = re.compile(r'^(?:audit|replay)-(\d+)(?:-\d+)?\.jsonl$')
+
+_spill_lock = threading.Lock()
+
+
+def _options():
+    return getattr(settings, 'AUDIT_LOG', {})
+
+
+def _spill_dir():
+    return str(_options().get('SPILL_DIR') or os.path.join(settings.BASE_DIR, 'audit_spill'))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def spill(events):
+    """Append events to this process's spill file and fsync it
+    
+    Used when the database cannot take them, so an outage loses nothing
+    that was already handed to the writer.
+    """
+    directory = _spill_dir()
+    path = os.path.join(directory, f'audit-{os.getpid()}.jsonl')
+    
+    try:
+        with _spill_lock:
+            os.makedirs(directory, exist_ok=True)
+            created = not os.path.exists(path)
+            with open(path, 'a', encoding='utf-8') as spill_file:
+                for event in events:
+                    spill_file.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+                spill_file.flush()
+                os.fsync(spill_file.fileno())
+            if created:
+                # A new file is only durable once its directory entry is
+                directory_fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(directory_fd)
+                finally:
+                    os.close(directory_fd)
+    except OSError as e:
+        # Last resort: the log file is the only copy left
+        for event in events:
+            logger.critical(f"Audit event lost from spill ({str(e)}): {json.dumps(event, cls=DjangoJSONEncoder)}")
+
+
+def _audit_rows(events):
+    rows = []
+    for event in events:
+        occurred_at = event['occurred_at']
+        if isinstance(occurred_at, str):
+            occurred_at = parse_datetime(occurred_at)
+        rows.append(AuditLog(
+            event_id=event['event_id'],
+            user_id=event.get('user_id'),
+            action=event['action'],
+            resource_type=event.get('resource_type', ''),
+            resource_id=event.get('resource_id', ''),
+            details=event.get('details') or {},
+            ip_address=event.get('ip_address'),
+            occurred_at=occurred_at
+        ))
+    return rows
+
+
+def write_events(events):
+    """bulk_create events, spilling them to disk if the database fails; True when written"""
+    try:
+        # A replayed event already in the table is skipped by auditlog_event_unique
+        AuditLog.objects.bulk_create(
+            _audit_rows(events),
+            batch_size=_options().get('BATCH_SIZE', 200),
+            ignore_conflicts=True
+        )
+        return True
+    except Error as e:
+        logger.error(f"Audit log write failed, spilling {len(events)} events to disk: {str(e)}")
+        spill(events)
+        return False
+
+
+def _read_spill_file(path):
+    events = []
+    with open(path, encoding='utf-8') as spill_file:
+        for line_number, line in enumerate(spill_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A torn final line from a crash mid-write
+                logger.error(f"Skipping unreadable audit spill line {path}:{line_number}")
+    return events
+
+
+def replay_spill_files():
+    """Write events spilled by this process or by workers that have exited
+    
+    Each file is first renamed to claim it, so two processes never replay
+    the same one; a file that fails is put back for the next attempt.
+    Returns the number of events written.
+    """
+    directory = _spill_dir()
+    if not os.path.isdir(directory):
+        return 0
+    
+    replayed = 0
+    for name in sorted(os.listdir(directory)):
+        match = _SPILL_FILE.match(name)
+        if not match:
+            continue
+        pid = int(match.group(1))
+        if pid != os.getpid() and _process_alive(pid):
+            continue  # Still spilling, or replaying it already
+        
+        path = os.path.join(directory, name)
+        claimed = os.path.join(directory, f'replay-{os.getpid()}-{time.time_ns()}.jsonl')
+        try:
+            # Under the lock so this process never appends to a claimed file
+            with _spill_lock:
+                os.rename(path, claimed)
+        except FileNotFoundError:
+            continue  # Claimed by another process first
+        
+        events = _read_spill_file(claimed)
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create(
+                    _audit_rows(events),
+                    batch_size=_options().get('BATCH_SIZE', 200),
+                    ignore_conflicts=True
+                )
+        except Error as e:
+            logger.error(f"Audit spill replay of {name} failed: {str(e)}")
+            os.rename(claimed, path)
+            break
+        
+        os.remove(claimed)
+        replayed += len(events)
+        logger.info(f"Replayed {len(events)} audit events from {name}")
+    return replayed
+
+
+class AuditWriter:
+    """Buffers audit events in memory and writes them from a background thread
+    
+    record() only appends to a list, so request threads never wait on the
+    database. The writer thread flushes with one bulk_create once BATCH_SIZE
+    events are waiting or FLUSH_INTERVAL_SECONDS have passed. While the
+    database is down, batches go to an fsync'd spill file and are replayed
+    after the next successful write. Events still in memory when the
+    process is killed outright are lost; at most one interval's worth.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._pid = None
+        self._wakeup = None
+        self._thread = None
+    
+    def _start(self):
+        # Also runs in forked workers: the parent's thread and buffer do not carry over
+        self._pid = os.getpid()
+        self._events = []
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+    
+    def record(self, event):
+        options = _options()
+        if not options.get('BUFFERED', True):
+            write_events([event])
+            return
+        
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            # Bounded: when the writer cannot keep up, go to disk instead of growing
+            overflow = len(self._events) >= options.get('MAX_BUFFERED', 10000)
+            if not overflow:
+                self._events.append(event)
+                if len(self._events) >= options.get('BATCH_SIZE', 200):
+                    self._wakeup.set()
+        
+        if overflow:
+            spill([event])
+    
+    async def arecord(self, event):
+        """Async record(); the unbuffered write runs off the event loop"""
+        if not _options().get('BUFFERED', True):
+            await sync_to_async(write_events)([event])
+            return
+        self.record(event)
+    
+    def flush(self):
+        """Write everything buffered so far, then any spill files"""
+        with self._lock:
+            events, self._events = self._events, []
+        
+        if events and not write_events(events):
+            return
+        
+        directory = _spill_dir()
+        if os.path.isdir(directory) and os.listdir(directory):
+            try:
+                replay_spill_files()
+            except OSError as e:
+                logger.error(f"Could not replay audit spill files: {str(e)}")
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(_options().get('FLUSH_INTERVAL_SECONDS', 2.0))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log writer failed to flush")
+            finally:
+                # This thread's connection obeys CONN_MAX_AGE like a request's
+                close_old_connections()
+    
+    def _flush_at_exit(self):
+        if self._pid == os.getpid():
+            self.flush()
+
+
+writer = AuditWriter()
+atexit.register(writer._flush_at_exit)
+
+
+def _event(action, user_id=None, resource_type='', resource_id='', details=None, ip_address=None):
+    return {
+        'event_id': str(uuid.uuid4()),
+        'user_id': str(user_id) if user_id else None,
+        'action': action,
+        'resource_type': resource_type,
+        'resource_id': str(resource_id),
+        'details': details or {},
+        'ip_address': ip_address or None,
+        'occurred_at': timezone.now(),
+    }
+
+
+def record_event(action, user_id=None, resource_type='', resource_id='', details=None, ip_address=None):
+    """Queue an audit event, or write it straight away when AUDIT_LOG BUFFERED is off"""
+    writer.record(_event(action, user_id, resource_type, resource_id, details, ip_address))
+
+
+def _phi_access_event(request, action, patient, **details):
+    return _event(
+        action,
+        user_id=request.user.pk,
+        resource_type='patient',
+        resource_id=patient.patient_id,
+        details={'path': request.path, **details},
+        ip_address=get_client_ip(request)
+    )
+
+
+def _phi_list_access_event(request, action, patient_ids, **details):
+    patient_ids = list(dict.fromkeys(patient_ids))
+    return _event(
+        action,
+        user_id=request.user.pk,
+        resource_type='patient',
+        # A single patient stays findable through AuditLog.objects.for_resource
+        resource_id=patient_ids[0] if len(patient_ids) == 1 else '',
+        details={'path': request.path, 'patient_ids': patient_ids, **details},
+        ip_address=get_client_ip(request)
+    )
+
+
+def log_phi_access(request, action, patient, **details):
+    """Audit a read of a patient's health information"""
+    writer.record(_phi_access_event(request, action, patient, **details))
+
+
+async def alog_phi_access(request, action, patient, **details):
+    """log_phi_access for async views; never touches the database on the event loop"""
+    await writer.arecord(_phi_access_event(request, action, patient, **details))
+
+
+def log_phi_list_access(request, action, patient_ids, **details):
+    """Audit a search or list response: one event naming every patient returned"""
+    writer.record(_phi_list_access_event(request, action, patient_ids, **details))
+
+
+async def alog_phi_list_access(request, action, patient_ids, **details):
+    """log_phi_list_access for async views"""
+    await writer.arecord(_phi_list_access_event(request, action, patient_ids, **details))
+
+
+class PHIListAuditMixin:
+    """ListAPIView mixin that audits each page served with log_phi_list_access"""
+    audit_action = 'patient_list_viewed'
+    
+    def audit_patient_ids(self, objects):
+        return [obj.patient_id for obj in objects]
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        objects = page if page is not None else queryset
+        log_phi_list_access(self.request, self.audit_action, self.audit_patient_ids(objects))
+        return page
+
+
+def _add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month):
+    return f'{AUDIT_TABLE}_{month:%Y%m}'
+
+
+def create_audit_partitions(months_ahead=None, using='default', start=None):
+    """Create monthly partitions from ``start``'s month through ``months_ahead`` more
+    
+    Rows for months without a partition land in the default partition, so
+    run this ahead of time (the create_audit_partitions command). Returns
+    the names of the partitions created.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+    
+    if months_ahead is None:
+        months_ahead = _options().get('PARTITION_MONTHS_AHEAD', 3)
+    first = (start or timezone.now().date()).replace(day=1)
+    
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(first, offset)
+        name = partition_name(month)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    cursor.execute(
+                        f"CREATE TABLE {name} PARTITION OF {AUDIT_TABLE} "
+                        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                        f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+                    )
+            except DatabaseError as e:
+                # e.g. the default partition already holds rows for this month
+                logger.error(f"Could not create audit partition {name}: {str(e)}")
+                continue
+        created.append(name)
+    return created
+
+
+def install_audit_partitioning(using='default'):
+    """Turn the audit table into one partitioned by month on PostgreSQL
+    
+    The table migrate creates is renamed, recreated as a partitioned table
+    with the same columns and a (id, occurred_at) primary key, and its rows
+    copied across. Safe to run repeatedly; it is called after every migrate.
+    Migrations that later alter the model apply to the partitioned table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or AUDIT_TABLE not in connection.introspection.table_names():
+        return False
+    
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [AUDIT_TABLE])
+        partitioned = cursor.fetchone()[0] == 'p'
+    
+    if not partitioned:
+        unpartitioned = f'{AUDIT_TABLE}_unpartitioned'
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {AUDIT_TABLE} RENAME TO {unpartitioned}')
+                cursor.execute(
+                    f'CREATE TABLE {AUDIT_TABLE} (LIKE {unpartitioned} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                    f'PARTITION BY RANGE (occurred_at)'
+                )
+                cursor.execute(f'CREATE TABLE {AUDIT_TABLE}_default PARTITION OF {AUDIT_TABLE} DEFAULT')
+                
+                cursor.execute(f"SELECT DISTINCT date_trunc('month', occurred_at AT TIME ZONE 'UTC') FROM {unpartitioned}")
+                months = [row[0].date() for row in cursor.fetchall()]
+            for month in months:
+                create_audit_partitions(0, using=using, start=month)
+            create_audit_partitions(using=using)
+            
+            with connection.cursor() as cursor:
+                cursor.execute(f'INSERT INTO {AUDIT_TABLE} SELECT * FROM {unpartitioned}')
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+                    f"FROM {AUDIT_TABLE}",
+                    [AUDIT_TABLE]
+                )
+                cursor.execute(f'DROP TABLE {unpartitioned}')
+                # Only now is the old table's key name free. Primary keys of
+                # partitioned tables must include the partition key.
+                cursor.execute(f'ALTER TABLE {AUDIT_TABLE} ADD PRIMARY KEY (id, occurred_at)')
+            
+            # Recreated on the parent, and from it on every partition
+            with connection.schema_editor() as editor:
+                for constraint in AuditLog._meta.constraints:
+                    editor.add_constraint(AuditLog, constraint)
+                for index in AuditLog._meta.indexes:
+                    editor.add_index(AuditLog, index)
+        logger.info(f"Partitioned {AUDIT_TABLE} by month")
+    
+    create_audit_partitions(using=using)
+    return True
+
+
+def install_audit_partitioning_handler(sender, using='default', **kwargs):
+    """post_migrate hook that partitions the audit table"""
+    install_audit_partitioning(using=using)
@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Per worker process; each worker reports only its own connections
+_started_at = time.time()
+_connects = {}
+_lock = threading.Lock()
+
+
+@receiver(connection_created)
+def count_connection_handler(sender, connection, **kwargs):
+    """Count connects per alias (with a pool, a connect is a checkout, not a handshake)"""
+    with _lock:
+        _connects[connection.alias] = _connects.get(connection.alias, 0) + 1
+
+
+def connect_count(alias='default'):
+    with _lock:
+        return _connects.get(alias, 0)
+
+
+def database_stats():
+    """Connection settings and usage for this worker process
+    
+    With a psycopg 3 pool configured, the pool's own counters are included
+    (pool_size, pool_available, requests_waiting, connections_num, ...).
+    """
+    databases = {}
+    for alias in connections:
+        connection = connections[alias]
+        # The backend only has a pool attribute when pooling is supported
+        pool = getattr(connection, 'pool', None)
+        databases[alias] = {
+            'vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+            'conn_health_checks': connection.settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connects': connect_count(alias),
+            'pool': pool.get_stats() if pool is not None else None,
+        }
+    
+    return {
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - _started_at, 1),
+        'databases': databases,
+    }
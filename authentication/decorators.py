@@ -2,6 +2,7 @@ from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from .permissions import get_token_payload
 
 User = get_user_model()
 
@@ -17,7 +18,7 @@ def require_permissions(*permissions):
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
             # Get user permissions from token
-            token_payload = getattr(request.user, 'token_payload', {})
+            token_payload = get_token_payload(request)
             user_permissions = set(token_payload.get('permissions', []))
             required_permissions = set(permissions)
             
@@ -46,7 +47,7 @@ def require_user_type(user_type):
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
             # Get user type from token
-            token_payload = getattr(request.user, 'token_payload', {})
+            token_payload = get_token_payload(request)
             current_user_type = token_payload.get('user_type')
             
             if current_user_type != user_type:
@@ -70,7 +71,7 @@ def require_verified_personnel(view_func):
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         # Get verification status from token
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         
         if token_payload.get('user_type') != 'personnel':
             return Response({
@@ -97,7 +98,7 @@ def emergency_access_required(view_func):
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         # Get permissions from token
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         user_permissions = token_payload.get('permissions', [])
         
         if 'emergency_override' not in user_permissions:
@@ -125,7 +126,7 @@ def log_emergency_access(view_func):
         logger = logging.getLogger(__name__)
         
         # Get user info from token
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         
         # Log the emergency access attempt
         logger.warning(f"Emergency access attempted by {token_payload.get('email')} "
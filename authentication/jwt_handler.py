@@ -1,13 +1,30 @@
 import jwt
+import uuid
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
 User = get_user_model()
 
+
+def get_bearer_token(request):
+    """Extract the raw token from a "Bearer <token>" Authorization header"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION')
+    
+    if not auth_header:
+        return None
+    
+    auth_parts = auth_header.split(' ')
+    if len(auth_parts) != 2 or auth_parts[0].lower() != 'bearer':
+        return None
+    
+    return auth_parts[1]
+
+
 class CustomJWTHandler:
     @staticmethod
     def generate_tokens(user):
@@ -90,10 +107,15 @@ class CustomJWTHandler:
             raise AuthenticationFailed('Invalid token')
     
     @staticmethod
-    def refresh_access_token(refresh_token):
-        """Generate new access token from refresh token"""
+    def refresh_access_token(refresh_token, payload=None):
+        """Generate new access token from refresh token
+        
+        Callers that already decoded the refresh token can pass its payload
+        to avoid verifying the signature a second time.
+        """
         try:
-            payload = CustomJWTHandler.decode_token(refresh_token)
+            if payload is None:
+                payload = CustomJWTHandler.decode_token(refresh_token)
             
             if payload.get('type') != 'refresh':
                 raise AuthenticationFailed('Invalid token type')
@@ -152,123 +174,70 @@ class CustomJWTHandler:
     @staticmethod
     def _get_user_data(user):
         """Extract user data for JWT payload"""
+        from .roles import PATIENT_PERMISSIONS, get_personnel_claims
+        
         if hasattr(user, 'patient_profile'):
             return {
                 'user_type': 'patient',
                 'patient_id': user.patient_profile.patient_id,
                 'is_profile_complete': user.patient_profile.is_profile_complete,
-                'permissions': ['view_own_records', 'book_appointments', 'view_own_prescriptions']
+                'permissions': list(PATIENT_PERMISSIONS)
             }
         elif hasattr(user, 'personnel_profile'):
-            # Get roles
-            roles = list(user.personnel_profile.role_assignments.filter(
-                is_active=True
-            ).values_list('role__name', flat=True))
-            
-            # Get permissions based on roles
-            permissions = CustomJWTHandler._get_personnel_permissions(user.personnel_profile)
+            # Roles and permissions come from the cached role registry
+            claims = get_personnel_claims(user.personnel_profile)
             
             return {
                 'user_type': 'personnel',
                 'employee_id': user.personnel_profile.employee_id,
                 'is_verified': user.personnel_profile.is_verified,
                 'verification_status': user.personnel_profile.verification_status,
-                'roles': roles,
-                'permissions': permissions,
-                'can_trigger_emergency': any(
-                    user.personnel_profile.role_assignments.filter(
-                        role__can_trigger_emergency=True,
-                        is_active=True
-                    )
-                )
+                'roles': claims['roles'],
+                'permissions': claims['permissions'],
+                'can_trigger_emergency': claims['can_trigger_emergency']
             }
         else:
             return {
                 'user_type': 'unknown',
                 'permissions': []
             }
-    
-    @staticmethod
-    def _get_personnel_permissions(personnel):
-        """Get personnel permissions based on roles"""
-        roles = personnel.role_assignments.filter(is_active=True).select_related('role')
-        permissions = set()
-        
-        for role_assignment in roles:
-            role = role_assignment.role
-            if role.access_level == 'basic':
-                permissions.update(['view_patient_basic_info'])
-            elif role.access_level == 'medical':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'view_prescriptions',
-                    'view_lab_results'
-                ])
-            elif role.access_level == 'senior_medical':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'edit_medical_records',
-                    'view_prescriptions',
-                    'create_prescriptions',
-                    'view_lab_results',
-                    'order_lab_tests',
-                    'emergency_override'
-                ])
-            elif role.access_level == 'administrative':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'manage_appointments',
-                    'manage_inventory',
-                    'view_reports',
-                    'manage_personnel'
-                ])
-            elif role.access_level == 'emergency':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'emergency_override',
-                    'critical_access'
-                ])
-        
-        return list(permissions)
 
 
 class CustomJWTAuthentication(BaseAuthentication):
     """Custom JWT authentication class for DRF"""
     
     def authenticate(self, request):
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        # Reuse the token decoded by JWTAuthenticationMiddleware when present
+        verified_token = VerifiedToken.from_request(request)
         
-        if not auth_header:
+        if verified_token is None:
             return None
         
         try:
-            # Extract token from "Bearer <token>" format
-            auth_parts = auth_header.split(' ')
-            if len(auth_parts) != 2 or auth_parts[0].lower() != 'bearer':
-                return None
-            
-            token = auth_parts[1]
+            if not verified_token.is_valid:
+                raise verified_token.error
             
-            # Decode token
-            payload = CustomJWTHandler.decode_token(token)
+            payload = verified_token.payload
             
             if payload.get('type') != 'access':
                 raise AuthenticationFailed('Invalid token type')
             
-            # Get user
             user_id = payload.get('user_id')
+            
+            # Stateless mode: build the principal from the token and only
+            # confirm (via a short-lived cache) that the account is active
+            if settings.JWT_SETTINGS.get('STATELESS_PRINCIPAL', False):
+                if not UserStateCache.is_active(user_id):
+                    raise AuthenticationFailed('User not found')
+                return (TokenUser(payload), verified_token.token)
+            
+            # Get user
             user = User.objects.get(id=user_id, is_active=True)
             
             # Add token payload to user object for easy access in views
             user.token_payload = payload
             
-            return (user, token)
+            return (user, verified_token.token)
             
         except User.DoesNotExist:
             raise AuthenticationFailed('User not found')
@@ -281,36 +250,246 @@ class CustomJWTAuthentication(BaseAuthentication):
         return 'Bearer'
 
 
+class TokenUser(SimpleLazyObject):
+    """User principal built from an access token payload
+    
+    Claims carried by the token are served straight from the payload. Any
+    other attribute loads the real User row on first access.
+    """
+    
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    
+    def __init__(self, payload):
+        user_id = payload.get('user_id')
+        super().__init__(lambda: User.objects.get(id=user_id, is_active=True))
+        self.__dict__['token_payload'] = payload
+    
+    def __bool__(self):
+        return True
+    
+    @property
+    def id(self):
+        return uuid.UUID(self.token_payload['user_id'])
+    
+    @property
+    def pk(self):
+        return self.id
+    
+    @property
+    def email(self):
+        return self.token_payload.get('email')
+    
+    @property
+    def first_name(self):
+        return self.token_payload.get('first_name')
+    
+    @property
+    def last_name(self):
+        return self.token_payload.get('last_name')
+
+
+class UserStateCache:
+    """Short-lived cache of whether a user account is still active
+    
+    Used by the stateless principal mode so deactivation takes effect
+    without querying auth_user on every request. Entries are dropped by the
+    User post_save/post_delete signals and otherwise expire after
+    JWT_SETTINGS['USER_STATE_CACHE_TIMEOUT'] seconds.
+    """
+    
+    @staticmethod
+    def _cache_key(user_id):
+        return f"user_state_{user_id}"
+    
+    @staticmethod
+    def is_active(user_id):
+        """Check if a user may still authenticate"""
+        from django.core.cache import cache
+        
+        cache_key = UserStateCache._cache_key(user_id)
+        is_active = cache.get(cache_key)
+        
+        if is_active is None:
+            is_active = User.objects.filter(id=user_id, is_active=True).exists()
+            cache.set(
+                cache_key,
+                is_active,
+                timeout=settings.JWT_SETTINGS.get('USER_STATE_CACHE_TIMEOUT', 30)
+            )
+        
+        return is_active
+    
+    @staticmethod
+    async def ais_active(user_id):
+        """Async version of is_active for ASGI views"""
+        from django.core.cache import cache
+        
+        cache_key = UserStateCache._cache_key(user_id)
+        is_active = await cache.aget(cache_key)
+        
+        if is_active is None:
+            is_active = await User.objects.filter(id=user_id, is_active=True).aexists()
+            await cache.aset(
+                cache_key,
+                is_active,
+                timeout=settings.JWT_SETTINGS.get('USER_STATE_CACHE_TIMEOUT', 30)
+            )
+        
+        return is_active
+    
+    @staticmethod
+    def invalidate(user_id):
+        """Forget the cached state of a user"""
+        from django.core.cache import cache
+        
+        cache.delete(UserStateCache._cache_key(user_id))
+
+
 class JWTTokenBlacklist:
     """Simple token blacklist using cache or database"""
     
+    @staticmethod
+    def _cache_key(payload):
+        return f"blacklisted_token_{payload.get('user_id')}_{payload.get('iat')}"
+    
     @staticmethod
     def blacklist_token(token):
         """Add token to blacklist"""
-        from django.core.cache import cache
-        
         try:
             payload = CustomJWTHandler.decode_token(token)
-            token_id = f"blacklisted_token_{payload.get('user_id')}_{payload.get('iat')}"
-            
-            # Cache until token would naturally expire
-            exp_time = payload.get('exp')
-            if exp_time:
-                exp_datetime = datetime.fromtimestamp(exp_time)
-                cache_timeout = max(0, int((exp_datetime - datetime.utcnow()).total_seconds()))
-                cache.set(token_id, True, timeout=cache_timeout)
-                
+            JWTTokenBlacklist.blacklist_payload(payload)
         except Exception:
             pass  # If token is invalid, no need to blacklist
     
+    @staticmethod
+    def blacklist_payload(payload):
+        """Add an already decoded token to blacklist"""
+        from django.core.cache import cache
+        
+        # Cache until token would naturally expire
+        exp_time = payload.get('exp')
+        if exp_time:
+            exp_datetime = datetime.fromtimestamp(exp_time)
+            cache_timeout = max(0, int((exp_datetime - datetime.utcnow()).total_seconds()))
+            cache.set(JWTTokenBlacklist._cache_key(payload), True, timeout=cache_timeout)
+    
     @staticmethod
     def is_token_blacklisted(token):
         """Check if token is blacklisted"""
+        return VerifiedToken.from_token(token).is_blacklisted
+    
+    @staticmethod
+    def is_payload_blacklisted(payload):
+        """Check if an already decoded token is blacklisted"""
         from django.core.cache import cache
         
+        return cache.get(JWTTokenBlacklist._cache_key(payload), False)
+    
+    @staticmethod
+    async def ais_payload_blacklisted(payload):
+        """Async version of is_payload_blacklisted for ASGI views"""
+        from django.core.cache import cache
+        
+        return await cache.aget(JWTTokenBlacklist._cache_key(payload), False)
+
+
+class VerifiedToken:
+    """A JWT decoded and blacklist-checked at most once per request
+    
+    JWTAuthenticationMiddleware attaches an instance to the request as
+    ``request.verified_token``; CustomJWTAuthentication and the permission
+    classes read it back instead of decoding the token again.
+    """
+    
+    def __init__(self, token, payload=None, error=None):
+        self.token = token
+        self.payload = payload
+        self.error = error
+        self._is_blacklisted = None
+    
+    @classmethod
+    def from_token(cls, token):
+        """Decode a raw token, keeping the failure instead of raising it"""
         try:
-            payload = CustomJWTHandler.decode_token(token)
-            token_id = f"blacklisted_token_{payload.get('user_id')}_{payload.get('iat')}"
-            return cache.get(token_id, False)
-        except Exception:
-            return True  # If token is invalid, consider it blacklisted
+            return cls(token, payload=CustomJWTHandler.decode_token(token))
+        except AuthenticationFailed as e:
+            return cls(token, error=e)
+    
+    @classmethod
+    def from_request(cls, request):
+        """Get the verified bearer token for a request, decoding it on first use"""
+        # DRF's Request proxies attribute reads to the underlying HttpRequest
+        http_request = getattr(request, '_request', request)
+        token = get_bearer_token(http_request)
+        
+        if token is None:
+            return None
+        
+        verified_token = getattr(http_request, 'verified_token', None)
+        if verified_token is None or verified_token.token != token:
+            verified_token = cls.from_token(token)
+            http_request.verified_token = verified_token
+        
+        return verified_token
+    
+    @property
+    def is_valid(self):
+        return self.payload is not None
+    
+    @property
+    def is_blacklisted(self):
+        """Invalid tokens are treated as blacklisted"""
+        if self._is_blacklisted is None:
+            self._is_blacklisted = (
+                not self.is_valid or
+                bool(JWTTokenBlacklist.is_payload_blacklisted(self.payload))
+            )
+        return self._is_blacklisted
+    
+    async def ais_blacklisted(self):
+        """Async version of is_blacklisted, sharing its per-request result"""
+        if self._is_blacklisted is None:
+            self._is_blacklisted = (
+                not self.is_valid or
+                bool(await JWTTokenBlacklist.ais_payload_blacklisted(self.payload))
+            )
+        return self._is_blacklisted
+
+
+class AsyncJWTAuthentication:
+    """CustomJWTAuthentication for async views, using the async ORM and cache
+    
+    DRF authentication classes are synchronous, so this is called directly
+    by AsyncAPIView rather than listed in DEFAULT_AUTHENTICATION_CLASSES.
+    """
+    
+    async def authenticate(self, request):
+        verified_token = VerifiedToken.from_request(request)
+        
+        if verified_token is None:
+            return None
+        
+        if not verified_token.is_valid:
+            raise verified_token.error
+        
+        payload = verified_token.payload
+        
+        if payload.get('type') != 'access':
+            raise AuthenticationFailed('Invalid token type')
+        
+        user_id = payload.get('user_id')
+        
+        if settings.JWT_SETTINGS.get('STATELESS_PRINCIPAL', False):
+            if not await UserStateCache.ais_active(user_id):
+                raise AuthenticationFailed('User not found')
+            return (TokenUser(payload), verified_token.token)
+        
+        try:
+            user = await User.objects.aget(id=user_id, is_active=True)
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found')
+        
+        user.token_payload = payload
+        return (user, verified_token.token)
@@ -0,0 +1,142 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+OTP_EMAIL_SUBJECTS = {
+    'verification': 'Hospital Management System - Email Verification',
+    'password_reset': 'Hospital Management System - Password Reset',
+    'login_verification': 'Hospital Management System - Login Verification',
+}
+
+OTP_EMAIL_MESSAGES = {
+    'verification': """
+        Your verification code is: {otp_code}
+        
+        This code will expire in {expiry_minutes} minutes.
+        
+        If you didn't request this code, please ignore this email.
+        """,
+    'password_reset': """
+        Your password reset code is: {otp_code}
+        
+        This code will expire in {expiry_minutes} minutes.
+        
+        If you didn't request this code, please ignore this email.
+        """,
+}
+
+
+def queue_email(subject, message, recipient_list, from_email=None, html_message=''):
+    """Queue an email in the outbox instead of sending it inline
+    
+    The row is written in the caller's transaction, so a rolled back
+    registration never sends its email and a committed one always will.
+    """
+    return OutboundEmail.objects.queue(
+        subject=subject,
+        message=message,
+        recipient_list=recipient_list,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        html_message=html_message
+    )
+
+
+def queue_otp_email(email, otp_code, purpose='verification'):
+    """Queue an OTP email for the given purpose"""
+    from .otp import get_expiry_minutes
+    
+    expiry_minutes = get_expiry_minutes(purpose)
+    message = OTP_EMAIL_MESSAGES.get(purpose, OTP_EMAIL_MESSAGES['verification'])
+    
+    return queue_email(
+        subject=OTP_EMAIL_SUBJECTS.get(purpose, 'Hospital Management System - Verification'),
+        message=message.format(otp_code=otp_code, expiry_minutes=expiry_minutes),
+        recipient_list=[email]
+    )
+
+
+def _retry_delay(attempts):
+    """Exponential backoff between delivery attempts"""
+    base_seconds = settings.HOSPITAL_SETTINGS.get('EMAIL_OUTBOX_RETRY_BASE_SECONDS', 30)
+    max_seconds = settings.HOSPITAL_SETTINGS.get('EMAIL_OUTBOX_RETRY_MAX_SECONDS', 60 * 60)
+    return timedelta(seconds=min(max_seconds, base_seconds * (2 ** (attempts - 1))))
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.recipients,
+        connection=connection
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def send_queued_emails(batch_size=50):
+    """Deliver one batch of due outbox emails over a single connection
+    
+    Rows are locked with SKIP LOCKED so several workers can drain the
+    outbox concurrently. Once an email is sent or given up on its body is
+    blanked, since it may hold an OTP or reset code. Returns a (sent,
+    failed) tuple.
+    """
+    max_attempts = settings.HOSPITAL_SETTINGS.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+    
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.due().select_for_update(skip_locked=True)[:batch_size]
+        )
+        
+        if not emails:
+            return sent, failed
+        
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            connection_error = None
+        except Exception as e:
+            connection_error = e
+        
+        now = timezone.now()
+        for email in emails:
+            email.attempts += 1
+            try:
+                if connection_error is not None:
+                    raise connection_error
+                connection.send_messages([_build_message(email, connection)])
+            except Exception as e:
+                failed += 1
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = 'failed'
+                    email.body = email.html_body = ''
+                    logger.error(f"Giving up on email {email.id} after {email.attempts} attempts: {e}")
+                else:
+                    email.next_attempt_at = now + _retry_delay(email.attempts)
+            else:
+                sent += 1
+                email.status = 'sent'
+                email.sent_at = now
+                email.last_error = ''
+                email.body = email.html_body = ''
+        
+        if connection_error is None:
+            connection.close()
+        
+        OutboundEmail.objects.bulk_update(
+            emails,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body', 'html_body']
+        )
+    
+    return sent, failed
@@ -0,0 +1,154 @@
+import json
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from authentication.db_stats import connect_count
+from authentication.jwt_handler import CustomJWTHandler
+from .replay_requests import percentile
+
+# CONN_MAX_AGE used for the persistent run when the settings disable it
+DEFAULT_PERSISTENT_AGE = 600
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare auth endpoint latency with a new database connection per '
+        'request against persistent connections. Requests run in-process '
+        'through the test client; connections are released after each one '
+        'exactly as the request_finished handler does.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True,
+                            help='Existing user the requests authenticate as')
+        parser.add_argument('--password',
+                            help="The user's password; also benchmarks the login endpoint")
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Timed requests per endpoint and mode')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Untimed requests sent first per endpoint and mode')
+        parser.add_argument('--database', default='default',
+                            help='Database alias to benchmark')
+    
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        
+        self.connection = connections[options['database']]
+        self.alias = options['database']
+        endpoints = self._endpoints(user, options['password'])
+        
+        configured_age = self.connection.settings_dict.get('CONN_MAX_AGE', 0)
+        if getattr(self.connection, 'pool', None) is not None:
+            # A closed pooled connection goes back to the pool, so there is
+            # no per-request handshake to compare against in this process
+            self.stdout.write(self.style.WARNING(
+                'A connection pool is configured; benchmarking it alone. '
+                'Run again with DB_POOL unset for the per-request baseline.'
+            ))
+            modes = [('pooled', configured_age)]
+        else:
+            modes = [
+                ('per-request', 0),
+                ('persistent', configured_age or DEFAULT_PERSISTENT_AGE),
+            ]
+        
+        owns_test_environment = False
+        try:
+            # Lets the test client through ALLOWED_HOSTS
+            setup_test_environment()
+            owns_test_environment = True
+        except RuntimeError:
+            pass  # Already set up, e.g. when called from a test
+        
+        try:
+            results = {}
+            for mode, conn_max_age in modes:
+                for name, send in endpoints:
+                    results[(mode, name)] = self._run(send, conn_max_age, options['warmup'], options['requests'])
+        finally:
+            self.connection.settings_dict['CONN_MAX_AGE'] = configured_age
+            self.connection.close()
+            if owns_test_environment:
+                teardown_test_environment()
+        
+        self._print_report(modes, endpoints, results)
+    
+    def _endpoints(self, user, password):
+        client = Client()
+        token = CustomJWTHandler.generate_tokens(user)['access_token']
+        validate_url = reverse('authentication:validate-token')
+        endpoints = [
+            ('GET token/validate', lambda: client.get(
+                validate_url, headers={'Authorization': f'Bearer {token}'}, secure=True
+            )),
+        ]
+        
+        if password:
+            login = 'personnel-login' if hasattr(user, 'personnel_profile') else 'patient-login'
+            login_url = reverse(f'authentication:{login}')
+            body = json.dumps({'email': user.email, 'password': password})
+            endpoints.append((f'POST {login}', lambda: client.post(
+                login_url, body, content_type='application/json', secure=True
+            )))
+        return endpoints
+    
+    def _run(self, send, conn_max_age, warmup, requests):
+        # Settings take effect on the next connect
+        self.connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        self.connection.close()
+        
+        for _ in range(warmup):
+            send()
+            close_old_connections()
+        
+        connects_before = connect_count(self.alias)
+        latencies = []
+        errors = 0
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = send()
+            # The test client skips close_old_connections; run it as the
+            # request_finished signal would, inside the timed window
+            close_old_connections()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+        
+        latencies.sort()
+        return {
+            'requests': requests,
+            'errors': errors,
+            'connects': connect_count(self.alias) - connects_before,
+            'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+        }
+    
+    def _print_report(self, modes, endpoints, results):
+        self.stdout.write(
+            f"{'endpoint':<28} {'mode':<12} {'reqs':>6} {'errs':>5} {'connects':>9} "
+            f"{'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}"
+        )
+        for name, _ in endpoints:
+            for mode, _ in modes:
+                result = results[(mode, name)]
+                self.stdout.write(
+                    f"{name[:28]:<28} {mode:<12} {result['requests']:>6} {result['errors']:>5} "
+                    f"{result['connects']:>9} {result['mean_ms']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8}"
+                )
+            
+            if len(modes) == 2:
+                baseline, persistent = results[(modes[0][0], name)], results[(modes[1][0], name)]
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name}: persistent connections save {baseline['mean_ms'] - persistent['mean_ms']:.2f} ms "
+                    f"mean, {baseline['p95_ms'] - persistent['p95_ms']:.2f} ms p95 per request"
+                ))
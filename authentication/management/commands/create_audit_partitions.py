@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from authentication.audit import create_audit_partitions, install_audit_partitioning, replay_spill_files
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the coming monthly audit log partitions on PostgreSQL. '
+        'Run at least monthly; events for a month without a partition land '
+        'in the default partition.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int,
+                            default=settings.AUDIT_LOG.get('PARTITION_MONTHS_AHEAD', 3),
+                            help='Months after the current one to create partitions for')
+        parser.add_argument('--database', default='default',
+                            help='Database alias holding the audit log')
+        parser.add_argument('--replay-spill', action='store_true',
+                            help='Also write events spilled to disk by workers that have exited')
+    
+    def handle(self, *args, **options):
+        if connections[options['database']].vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Audit log partitioning needs PostgreSQL; nothing to do'))
+        else:
+            # Converts the table first if migrate ran without the post_migrate hook
+            install_audit_partitioning(using=options['database'])
+            created = create_audit_partitions(options['months_ahead'], using=options['database'])
+            self.stdout.write(
+                self.style.SUCCESS(f"Created {len(created)} audit log partitions: {', '.join(created) or 'none needed'}")
+            )
+        
+        if options['replay_spill']:
+            replayed = replay_spill_files()
+            self.stdout.write(
+                self.style.SUCCESS(f'Replayed {replayed} spilled audit events')
+            )
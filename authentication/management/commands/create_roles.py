@@ -54,3 +54,28 @@ class Command(BaseCommand):
                 'access_level': 'administrative',
                 'can_trigger_emergency': False
             },
+        ]
+        
+        created_count = 0
+        for role_data in roles_data:
+            role, created = Role.objects.get_or_create(
+                name=role_data['name'],
+                defaults={
+                    'description': role_data['description'],
+                    'access_level': role_data['access_level'],
+                    'can_trigger_emergency': role_data['can_trigger_emergency']
+                }
+            )
+            if created:
+                created_count += 1
+                self.stdout.write(
+                    self.style.SUCCESS(f'Created role: {role.name}')
+                )
+            else:
+                self.stdout.write(
+                    self.style.WARNING(f'Role already exists: {role.name}')
+                )
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully created {created_count} roles')
+        )
@@ -0,0 +1,262 @@
+import json
+import random
+from datetime import date, time, timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.identifiers import employee_id_allocator
+from accounts.models import Patient, Personnel, Role, PersonnelRole
+from appointments.managers import ACTIVE_STATUSES
+from appointments.models import Appointment, DoctorSchedule
+
+User = get_user_model()
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda',
+    'William', 'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+    'Thomas', 'Sarah', 'Charles', 'Karen', 'Ahmed', 'Fatima', 'Wei', 'Mei', 'Jose',
+    'Maria', 'Olumide', 'Ngozi', 'Hans', 'Greta', 'Katherine', 'Catherine',
+]
+
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+    'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson',
+    'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Schmidt', 'Schmitt',
+    'Okafor', 'Adeyemi', 'Chen', 'Wang', 'Khan', 'Ali', 'Muller', 'Meyer',
+]
+
+# Share of generated personnel given each role
+ROLE_MIX = [
+    ('Doctor', 0.35),
+    ('Nurse', 0.3),
+    ('Receptionist', 0.1),
+    ('Lab Technician', 0.1),
+    ('Pharmacist', 0.1),
+    ('Senior Doctor', 0.05),
+]
+
+DOCTOR_ROLES = ['Doctor', 'Senior Doctor']
+
+
+class Command(BaseCommand):
+    help = 'Populate the database with synthetic patients, personnel, roles and appointments for load testing'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--personnel', type=int, default=200)
+        parser.add_argument('--appointments-per-patient', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per bulk insert')
+        parser.add_argument('--password', default='LoadTest123!',
+                            help='Password given to every generated user')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed so runs are reproducible')
+        parser.add_argument('--requests-out',
+                            help='Also write a replay_requests log exercising the generated data')
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Number of entries written to --requests-out')
+    
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Hash once; PBKDF2 per user would dominate generation time
+        self.password_hash = make_password(options['password'])
+        self.run_id = timezone.now().strftime('%Y%m%d%H%M%S')
+        
+        call_command('create_roles', verbosity=0)
+        
+        personnel = self._create_personnel(options['personnel'])
+        self.stdout.write(f'Created {len(personnel)} personnel')
+        
+        patients = self._create_patients(options['patients'])
+        self.stdout.write(f'Created {len(patients)} patients')
+        
+        doctors = list(
+            Personnel.objects.filter(
+                id__in=[member.id for member in personnel],
+                role_assignments__role__name__in=DOCTOR_ROLES
+            ).distinct()
+        )
+        DoctorSchedule.objects.bulk_create([
+            DoctorSchedule(doctor=doctor, weekday=weekday, start_time=time(8, 0), end_time=time(17, 0))
+            for doctor in doctors
+            for weekday in range(5)
+        ], batch_size=self.batch_size)
+        appointment_count = self._create_appointments(patients, doctors, options['appointments_per_patient'])
+        self.stdout.write(f'Created {appointment_count} appointments')
+        
+        if options['requests_out']:
+            self._write_request_log(options['requests_out'], options['requests'], patients, personnel)
+            self.stdout.write(f"Wrote {options['requests']} requests to {options['requests_out']}")
+        
+        self.stdout.write(self.style.SUCCESS('Load test fixtures generated'))
+    
+    def _random_name(self):
+        return self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+    
+    def _random_phone(self):
+        return f'+1 {self.random.randint(200, 999)}-{self.random.randint(200, 999)}-{self.random.randint(0, 9999):04d}'
+    
+    def _random_birth_date(self):
+        return date(1940, 1, 1) + timedelta(days=self.random.randint(0, 30000))
+    
+    def _build_users(self, start, count, kind):
+        users = []
+        for index in range(start, start + count):
+            first_name, last_name = self._random_name()
+            users.append(User(
+                email=f'{kind}.{self.run_id}.{index}@loadtest.example.com',
+                first_name=first_name,
+                last_name=last_name,
+                password=self.password_hash,
+                is_active=True,
+                is_verified=True,
+            ))
+        return users
+    
+    def _create_personnel(self, count):
+        roles = {role.name: role for role in Role.objects.filter(name__in=[name for name, _ in ROLE_MIX])}
+        role_names = [name for name, _ in ROLE_MIX if name in roles]
+        role_weights = [weight for name, weight in ROLE_MIX if name in roles]
+        
+        created = []
+        for start in range(0, count, self.batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    self._build_users(start, min(self.batch_size, count - start), 'staff'),
+                    batch_size=self.batch_size
+                )
+                members = Personnel.objects.bulk_create([
+                    Personnel(
+                        user=user,
+                        employee_id=employee_id_allocator.next_id(),
+                        phone_work=self._random_phone(),
+                        hire_date=timezone.now().date() - timedelta(days=self.random.randint(30, 5000)),
+                        is_verified=True,
+                        verification_status='verified',
+                    )
+                    for user in users
+                ], batch_size=self.batch_size)
+                if role_names:
+                    PersonnelRole.objects.bulk_create([
+                        PersonnelRole(
+                            personnel=member,
+                            role=roles[self.random.choices(role_names, role_weights)[0]]
+                        )
+                        for member in members
+                    ], batch_size=self.batch_size)
+            created.extend(members)
+        return created
+    
+    def _create_patients(self, count):
+        created = []
+        for start in range(0, count, self.batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    self._build_users(start, min(self.batch_size, count - start), 'patient'),
+                    batch_size=self.batch_size
+                )
+                patients = []
+                for user in users:
+                    patient = Patient(
+                        user=user,
+                        date_of_birth=self._random_birth_date(),
+                        gender=self.random.choice(['male', 'female', 'other']),
+                        phone_primary=self._random_phone(),
+                        city=self.random.choice(['Springfield', 'Riverside', 'Fairview', 'Madison']),
+                        registration_type=self.random.choice(['online', 'walk_in']),
+                        is_profile_complete=True,
+                    )
+                    # bulk_create skips save(), so fill search and matching keys here
+                    patient.refresh_derived_fields()
+                    patients.append(patient)
+                created.extend(Patient.objects.bulk_create(patients, batch_size=self.batch_size))
+        return created
+    
+    def _create_appointments(self, patients, doctors, per_patient):
+        if not doctors or not per_patient:
+            return 0
+        
+        today = timezone.now().date()
+        statuses = ['scheduled', 'confirmed', 'completed', 'cancelled', 'no_show']
+        types = ['consultation', 'follow_up', 'routine_checkup', 'urgent_care', 'procedure']
+        
+        total = 0
+        batch = []
+        # Slots already held, so the data passes the no-double-booking constraint
+        held = set()
+        for patient in patients:
+            for _ in range(self.random.randint(0, per_patient * 2)):
+                scheduled_date = today + timedelta(days=self.random.randint(-365, 60))
+                appointment = Appointment(
+                    patient=patient,
+                    doctor=self.random.choice(doctors),
+                    appointment_type=self.random.choice(types),
+                    scheduled_date=scheduled_date,
+                    scheduled_time=time(self.random.randint(8, 16), self.random.choice([0, 30])),
+                    status='completed' if scheduled_date < today and self.random.random() < 0.8 else self.random.choice(statuses),
+                    reason='Synthetic load test appointment',
+                )
+                if appointment.status in ACTIVE_STATUSES:
+                    slot = (appointment.doctor.pk, scheduled_date, appointment.scheduled_time)
+                    if slot in held:
+                        continue
+                    held.add(slot)
+                # bulk_create skips save(), so fill end_time here
+                appointment.refresh_end_time()
+                batch.append(appointment)
+            if len(batch) >= self.batch_size:
+                Appointment.objects.bulk_create(batch, batch_size=self.batch_size)
+                total += len(batch)
+                batch = []
+        
+        if batch:
+            Appointment.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        return total
+    
+    def _write_request_log(self, path, count, patients, personnel):
+        """Write a front-desk style mix of reads for replay_requests"""
+        staff_emails = [member.user.email for member in personnel]
+        patient_emails = [patient.user.email for patient in patients]
+        if not staff_emails or not patient_emails:
+            return
+        
+        with open(path, 'w') as log:
+            for _ in range(count):
+                pick = self.random.random()
+                patient = self.random.choice(patients)
+                if pick < 0.4:
+                    last_name = patient.user.last_name
+                    entry = {
+                        'method': 'GET',
+                        'path': f'/api/accounts/patient/search/?q={last_name[:self.random.randint(2, len(last_name))]}',
+                        'auth': self.random.choice(staff_emails),
+                        'name': 'patient search',
+                    }
+                elif pick < 0.6:
+                    entry = {
+                        'method': 'GET',
+                        'path': f'/api/accounts/patient/{patient.patient_id}/',
+                        'auth': self.random.choice(staff_emails),
+                        'name': 'patient detail',
+                    }
+                elif pick < 0.8:
+                    entry = {
+                        'method': 'GET',
+                        'path': '/api/accounts/patient/profile/',
+                        'auth': patient.user.email,
+                        'name': 'patient profile',
+                    }
+                else:
+                    entry = {
+                        'method': 'GET',
+                        'path': '/api/auth/token/validate/',
+                        'auth': self.random.choice(staff_emails + patient_emails),
+                        'name': 'token validate',
+                    }
+                log.write(json.dumps(entry) + '\n')
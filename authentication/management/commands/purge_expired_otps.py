@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+
+from authentication.otp import purge_expired_otps
+
+
+class Command(BaseCommand):
+    help = 'Delete used and expired OTP codes in chunks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-hours', type=int, default=24,
+                            help='Keep used/expired codes for this many hours before deleting them')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows deleted per statement')
+    
+    def handle(self, *args, **options):
+        deleted = purge_expired_otps(
+            retention=timedelta(hours=options['retention_hours']),
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired OTP codes')
+        )
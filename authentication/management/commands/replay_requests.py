@@ -0,0 +1,255 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import Resolver404, resolve
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(percent / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a JSONL request log against the API and report per-endpoint '
+        'latency percentiles, query counts and throughput. Without --base-url '
+        'requests run in-process through the Django test client against the '
+        'configured database.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('log_file',
+                            help='JSONL file, one {"method", "path", "body", "headers", "auth", "name"} object per line')
+        parser.add_argument('--base-url',
+                            help='Replay against a running server (e.g. http://localhost:8000) instead of the test client')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of worker threads issuing requests')
+        parser.add_argument('--repeat', type=int, default=1,
+                            help='Times to replay the whole log')
+        parser.add_argument('--warmup', type=int, default=0,
+                            help='Requests sent first and left out of the report')
+        parser.add_argument('--timeout', type=float, default=30.0,
+                            help='Per-request timeout in seconds for --base-url')
+        parser.add_argument('--json-output',
+                            help='Also write the report to this file as JSON')
+    
+    def handle(self, *args, **options):
+        entries = self._load_entries(options['log_file'])
+        if not entries:
+            raise CommandError('Request log is empty')
+        
+        self.base_url = (options['base_url'] or '').rstrip('/')
+        self.timeout = options['timeout']
+        self._tokens = {}
+        self._tokens_lock = threading.Lock()
+        self._local = threading.local()
+        
+        owns_test_environment = False
+        if not self.base_url:
+            # Lets the test client through ALLOWED_HOSTS and keeps mail in memory
+            try:
+                setup_test_environment()
+                owns_test_environment = True
+            except RuntimeError:
+                pass  # Already set up, e.g. when called from a test
+        
+        try:
+            for entry in entries[:options['warmup']]:
+                self._send(entry)
+            
+            workload = entries * options['repeat']
+            started = time.perf_counter()
+            if options['concurrency'] > 1:
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                    results = list(executor.map(self._send_in_worker, workload))
+            else:
+                results = [self._send(entry) for entry in workload]
+            elapsed = time.perf_counter() - started
+        finally:
+            if owns_test_environment:
+                teardown_test_environment()
+        
+        report = self._build_report(results, elapsed)
+        self._print_report(report)
+        
+        if options['json_output']:
+            with open(options['json_output'], 'w') as output:
+                json.dump(report, output, indent=2)
+    
+    def _load_entries(self, log_file):
+        entries = []
+        with open(log_file) as log:
+            for line_number, line in enumerate(log, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    raise CommandError(f'Line {line_number} is not valid JSON: {e}')
+                if 'path' not in entry:
+                    raise CommandError(f'Line {line_number} has no "path"')
+                entries.append(entry)
+        return entries
+    
+    def _endpoint_name(self, entry):
+        if entry.get('name'):
+            return entry['name']
+        
+        method = entry.get('method', 'GET').upper()
+        path = entry['path'].split('?')[0]
+        try:
+            route = '/' + resolve(path).route
+        except Resolver404:
+            route = path
+        return f'{method} {route}'
+    
+    def _token_for(self, email):
+        """Mint (once) an access token for the user named in an entry's "auth" key"""
+        with self._tokens_lock:
+            if email not in self._tokens:
+                from django.contrib.auth import get_user_model
+                from authentication.jwt_handler import CustomJWTHandler
+                
+                user = get_user_model().objects.get(email=email)
+                self._tokens[email] = CustomJWTHandler.generate_tokens(user)['access_token']
+            return self._tokens[email]
+    
+    def _headers_for(self, entry):
+        headers = dict(entry.get('headers') or {})
+        if entry.get('auth'):
+            headers['Authorization'] = f"Bearer {self._token_for(entry['auth'])}"
+        return headers
+    
+    def _send_in_worker(self, entry):
+        try:
+            return self._send(entry)
+        finally:
+            # Worker threads own their DB connections; close them when done
+            if not self.base_url:
+                connections.close_all()
+    
+    def _send(self, entry):
+        method = entry.get('method', 'GET').upper()
+        body = entry.get('body')
+        headers = self._headers_for(entry)
+        
+        if self.base_url:
+            status_code, queries, duration = self._send_live(method, entry['path'], body, headers)
+        else:
+            status_code, queries, duration = self._send_in_process(method, entry['path'], body, headers)
+        
+        expected = entry.get('expect_status')
+        if expected is not None:
+            failed = status_code != expected
+        else:
+            # Redirects and client errors are not served responses either;
+            # timing them would measure the wrong thing
+            failed = not 200 <= status_code < 300
+        return self._endpoint_name(entry), status_code, failed, duration, queries
+    
+    def _send_in_process(self, method, path, body, headers):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.generic(
+                method,
+                path,
+                data=json.dumps(body) if body is not None else '',
+                content_type='application/json',
+                headers=headers
+            )
+            duration = time.perf_counter() - started
+        return response.status_code, len(context.captured_queries), duration
+    
+    def _send_live(self, method, path, body, headers):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        for name, value in headers.items():
+            request.add_header(name, value)
+        
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status_code = response.status
+                query_count = response.headers.get('X-Query-Count')
+        except urllib.error.HTTPError as e:
+            status_code = e.code
+            query_count = e.headers.get('X-Query-Count')
+        except (urllib.error.URLError, TimeoutError):
+            status_code = 599
+            query_count = None
+        duration = time.perf_counter() - started
+        
+        # Query counts come from QueryInstrumentationMiddleware when it sends headers
+        return status_code, int(query_count) if query_count is not None else None, duration
+    
+    def _build_report(self, results, elapsed):
+        grouped = defaultdict(list)
+        for name, status_code, failed, duration, queries in results:
+            grouped[name].append((status_code, failed, duration, queries))
+        
+        endpoints = []
+        for name, samples in sorted(grouped.items()):
+            latencies = sorted(duration * 1000 for _, _, duration, _ in samples)
+            query_counts = [queries for _, _, _, queries in samples if queries is not None]
+            endpoints.append({
+                'endpoint': name,
+                'requests': len(samples),
+                'errors': sum(1 for _, failed, _, _ in samples if failed),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'avg_queries': round(sum(query_counts) / len(query_counts), 1) if query_counts else None,
+                'max_queries': max(query_counts) if query_counts else None,
+            })
+        
+        return {
+            'requests': len(results),
+            'errors': sum(endpoint['errors'] for endpoint in endpoints),
+            'redirects': sum(1 for _, status_code, _, _, _ in results if 300 <= status_code < 400),
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+            'endpoints': endpoints,
+        }
+    
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<50} {'reqs':>6} {'errs':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        )
+        for endpoint in report['endpoints']:
+            queries = endpoint['avg_queries'] if endpoint['avg_queries'] is not None else '-'
+            self.stdout.write(
+                f"{endpoint['endpoint'][:50]:<50} {endpoint['requests']:>6} {endpoint['errors']:>5} "
+                f"{endpoint['p50_ms']:>8} {endpoint['p95_ms']:>8} {endpoint['p99_ms']:>8} {queries:>8}"
+            )
+        
+        summary = (
+            f"{report['requests']} requests in {report['elapsed_seconds']}s "
+            f"({report['throughput_rps']} req/s), {report['errors']} errors"
+        )
+        if report['redirects'] * 2 > report['requests']:
+            self.stdout.write(self.style.WARNING(
+                f"{report['redirects']} of {report['requests']} responses were redirects; "
+                f"check SECURE_SSL_REDIRECT and the --base-url scheme"
+            ))
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+
+from authentication.mail import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails (OTP, password reset) from the outbox'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Emails sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep between polls when the outbox is empty')
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = total_failed = 0
+        
+        while True:
+            sent, failed = send_queued_emails(batch_size=batch_size)
+            total_sent += sent
+            total_failed += failed
+            
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed')
+                continue
+            
+            if not options['loop']:
+                break
+            
+            time.sleep(options['interval'])
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Outbox drained: {total_sent} sent, {total_failed} failed')
+        )
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import BaseUserManager
 from django.db import models  # Added for model queries
 from django.utils import timezone
+from krankenhaus.db_router import prefer_replica
 
 class UserManager(BaseUserManager):
     def create_user(self, email, first_name, last_name, password=None, **extra_fields):
@@ -40,3 +41,38 @@ class UserManager(BaseUserManager):
     
     def unverified_users(self):
         return self.filter(is_verified=False, is_active=True)
+
+
+class OTPVerificationManager(models.Manager):
+    def active_for(self, user, purpose):
+        """Get unused OTPs of a purpose for a user"""
+        return self.filter(user=user, purpose=purpose, is_used=False)
+
+
+class OutboundEmailManager(models.Manager):
+    def queue(self, subject, message, recipient_list, from_email, html_message=''):
+        """Store an email for delivery by the outbox worker"""
+        return self.create(
+            subject=subject,
+            body=message,
+            html_body=html_message or '',
+            from_email=from_email,
+            recipients=list(recipient_list)
+        )
+    
+    def due(self):
+        """Get pending emails whose next attempt is due, oldest first"""
+        return self.filter(
+            status='pending',
+            next_attempt_at__lte=timezone.now()
+        ).order_by('next_attempt_at', 'id')
+
+
+class AuditLogManager(models.Manager):
+    def for_user(self, user_id):
+        """Audit events by one user; reads tolerate replication lag"""
+        return prefer_replica(self.filter(user_id=user_id))
+    
+    def for_resource(self, resource_type, resource_id):
+        """Audit events about one record, e.g. every access to a patient"""
+        return prefer_replica(self.filter(resource_type=resource_type, resource_id=resource_id))
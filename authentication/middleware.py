@@ -1,35 +1,258 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.core.cache import cache
 from django.http import JsonResponse
-from django.utils.deprecation import MiddlewareMixin
-from .jwt_handler import JWTTokenBlacklist
+from krankenhaus.db_router import replica_aliases, replica_request_state
+from .jwt_handler import VerifiedToken
 import json
+import logging
+import re
+import time
 
-class JWTAuthenticationMiddleware(MiddlewareMixin):
-    """Middleware to handle JWT token blacklist checking"""
-    
-    def process_request(self, request):
-        # Skip for certain paths
-        skip_paths = [
-            '/admin/',
-            '/static/',
-            '/media/',
-            '/api/auth/register/',
-            '/api/auth/login/',
-            '/api/auth/verify-email/',
-            '/api/auth/password/reset/',
-        ]
-        
-        if any(request.path.startswith(path) for path in skip_paths):
+logger = logging.getLogger(__name__)
+
+class JWTAuthenticationMiddleware:
+    """Middleware to handle JWT token blacklist checking
+    
+    Sync and async capable: under ASGI the blacklist is read with the async
+    cache API instead of pushing every request through a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    skip_paths = [
+        '/admin/',
+        '/static/',
+        '/media/',
+        '/api/auth/register/',
+        '/api/auth/login/',
+        '/api/auth/verify-email/',
+        '/api/auth/password/reset/',
+    ]
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        verified_token = self._verified_token(request)
+        if verified_token is not None and verified_token.is_blacklisted:
+            return self._revoked_response()
+        
+        return self.get_response(request)
+    
+    async def __acall__(self, request):
+        verified_token = self._verified_token(request)
+        if verified_token is not None and await verified_token.ais_blacklisted():
+            return self._revoked_response()
+        
+        return await self.get_response(request)
+    
+    def _verified_token(self, request):
+        if any(request.path.startswith(path) for path in self.skip_paths):
             return None
         
-        # Check for blacklisted tokens
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            
-            if JWTTokenBlacklist.is_token_blacklisted(token):
-                return JsonResponse({
-                    'error': 'Token has been revoked',
-                    'code': 'TOKEN_REVOKED'
-                }, status=401)
-        
-        return None
+        # Decode once; the result stays on the request as
+        # request.verified_token for DRF authentication
+        return VerifiedToken.from_request(request)
+    
+    def _revoked_response(self):
+        return JsonResponse({
+            'error': 'Token has been revoked',
+            'code': 'TOKEN_REVOKED'
+        }, status=401)
+
+
+class ReplicaStickinessMiddleware:
+    """Keep a user's reads on the primary for a while after they write
+    
+    Replica reads lag the primary, so after a request that wrote, the same
+    user is pinned to the primary for READ_REPLICAS['STICKY_SECONDS'] (never
+    less than the worst lag a replica read may have) and sees their own
+    changes. Within a request, reads after a write go to the
+    primary too. Users are identified by the verified token, so this runs
+    after JWTAuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        if not replica_aliases():
+            return self.get_response(request)
+        
+        pin_key = self._pin_key(request)
+        pinned = bool(cache.get(pin_key)) if pin_key else False
+        with replica_request_state(pinned) as state:
+            response = self.get_response(request)
+            if state.wrote and pin_key:
+                cache.set(pin_key, True, timeout=self._sticky_seconds())
+        return response
+    
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        
+        pin_key = self._pin_key(request)
+        pinned = bool(await cache.aget(pin_key)) if pin_key else False
+        with replica_request_state(pinned) as state:
+            response = await self.get_response(request)
+            if state.wrote and pin_key:
+                await cache.aset(pin_key, True, timeout=self._sticky_seconds())
+        return response
+    
+    def _pin_key(self, request):
+        """Cache key pinning the requesting user; anonymous requests are only consistent within themselves"""
+        verified_token = getattr(request, 'verified_token', None)
+        if verified_token is None or not verified_token.is_valid:
+            return None
+        return f"replica_pin_{verified_token.payload.get('user_id')}"
+    
+    def _sticky_seconds(self):
+        options = getattr(settings, 'READ_REPLICAS', {})
+        # A replica admitted at MAX_LAG_SECONDS, with a lag reading up to
+        # LAG_CHECK_SECONDS old, may still miss a write made that long ago
+        return max(
+            options.get('STICKY_SECONDS', 0),
+            options.get('MAX_LAG_SECONDS', 10) + options.get('LAG_CHECK_SECONDS', 5)
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a view runs more queries than its budget allows"""
+    pass
+
+
+class QueryRecorder:
+    """execute_wrapper that records SQL fingerprints and time per request"""
+    
+    # Collapse IN (%s, %s, ...) lists so batches of any size share a fingerprint
+    _IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+    
+    def __init__(self):
+        self.fingerprints = Counter()
+        self.count = 0
+        self.duration = 0.0
+    
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[self._IN_LIST.sub('IN (...)', sql)] += 1
+    
+    def duplicates(self, threshold):
+        """Statements run at least ``threshold`` times, most repeated first"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+
+class QueryInstrumentationMiddleware:
+    """Record query count, DB time and repeated SQL for every request
+    
+    Results go to X-Query-* response headers and a structured log line.
+    Views running over their QUERY_INSTRUMENTATION budget are logged, and
+    with RAISE_ON_BUDGET_EXCEEDED (meant for tests/CI) the request fails.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = getattr(settings, 'QUERY_INSTRUMENTATION', {})
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        if not self.options.get('ENABLED', False):
+            return self.get_response(request)
+        
+        recorder = QueryRecorder()
+        with self._recording(recorder):
+            response = self.get_response(request)
+        
+        return self._report(request, response, recorder)
+    
+    async def __acall__(self, request):
+        if not self.options.get('ENABLED', False):
+            return await self.get_response(request)
+        
+        # Connections are per thread and async ORM calls run on the request's
+        # sync thread, so the wrappers are installed (and removed) there
+        recorder = QueryRecorder()
+        recording = await sync_to_async(self._recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        
+        return self._report(request, response, recorder)
+    
+    def _recording(self, recorder):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        return stack
+    
+    def _report(self, request, response, recorder):
+        view_name = self._view_name(request)
+        duplicate_threshold = self.options.get('DUPLICATE_THRESHOLD', 3)
+        duplicates = recorder.duplicates(duplicate_threshold)
+        budget = self.options.get('BUDGETS', {}).get(view_name, self.options.get('DEFAULT_BUDGET'))
+        
+        if self.options.get('HEADERS', True):
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f"{recorder.duration * 1000:.1f}"
+            response['X-Query-Duplicates'] = str(sum(count - 1 for _, count in duplicates))
+        
+        log_data = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'query_count': recorder.count,
+            'query_time_ms': round(recorder.duration * 1000, 1),
+            'duplicate_queries': [{'sql': sql[:200], 'count': count} for sql, count in duplicates],
+            'query_budget': budget,
+        }
+        
+        if duplicates:
+            logger.warning(
+                f"Possible N+1 in {view_name}: {duplicates[0][1]}x {duplicates[0][0][:200]}",
+                extra={'query_stats': log_data}
+            )
+        
+        if budget is not None and recorder.count > budget:
+            message = f"{view_name} ran {recorder.count} queries, budget is {budget}"
+            logger.warning(message, extra={'query_stats': log_data})
+            if self.options.get('RAISE_ON_BUDGET_EXCEEDED', False):
+                raise QueryBudgetExceeded(message)
+        else:
+            logger.debug(f"Query stats: {json.dumps(log_data)}", extra={'query_stats': log_data})
+        
+        return response
+    
+    def _view_name(self, request):
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is None:
+            return request.path
+        return resolver_match.view_name
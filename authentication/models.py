@@ -3,7 +3,7 @@ from django.db import models
 from django.utils import timezone
 import uuid
 
-from .managers import UserManager  # Import the UserManager
+from .managers import UserManager, OTPVerificationManager, OutboundEmailManager, AuditLogManager  # Import the managers
 
 class User(AbstractBaseUser, PermissionsMixin):
     objects = UserManager()  # Assign the custom manager
@@ -29,6 +29,8 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
 class OTPVerification(models.Model):
+    objects = OTPVerificationManager()
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='otp_verifications')
     otp_code = models.CharField(max_length=6)
     purpose = models.CharField(max_length=50, choices=[
@@ -37,8 +39,85 @@ class OTPVerification(models.Model):
         ('login_verification', 'Login Verification'),
     ])
     is_used = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
     expires_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Lookup of the outstanding OTP during verification
+            models.Index(fields=['user', 'purpose', 'is_used'], name='otp_user_purpose_used_idx'),
+            # Expiry sweeper
+            models.Index(fields=['expires_at'], name='otp_expires_at_idx'),
+        ]
+    
     def is_expired(self):
         return timezone.now() > self.expires_at
+
+class OutboundEmail(models.Model):
+    """Email waiting to be delivered by the send_queued_emails worker"""
+    objects = OutboundEmailManager()
+    
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ], default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+class AuditLog(models.Model):
+    """One audited action; written in batches by authentication.audit
+    
+    On PostgreSQL the table is partitioned by month of occurred_at (see
+    audit.install_audit_partitioning), so old months can be detached and
+    archived whole.
+    """
+    objects = AuditLogManager()
+    
+    # Identifies the event across spill file replays
+    event_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    # No database constraint: the audit trail outlives deleted users.
+    # Indexed with occurred_at below.
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, blank=True, related_name='audit_logs'
+    )
+    action = models.CharField(max_length=100)
+    resource_type = models.CharField(max_length=50, blank=True)
+    resource_id = models.CharField(max_length=64, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    occurred_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            # Includes the partition key, as PostgreSQL requires of unique constraints
+            models.UniqueConstraint(fields=['event_id', 'occurred_at'], name='auditlog_event_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['occurred_at', 'id'], name='auditlog_keyset_idx'),
+            models.Index(fields=['user', 'occurred_at'], name='auditlog_user_idx'),
+            models.Index(fields=['resource_type', 'resource_id', 'occurred_at'], name='auditlog_resource_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.action} by {self.user_id} at {self.occurred_at}"
@@ -0,0 +1,111 @@
+import hmac
+import secrets
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OTPVerification
+
+# HOSPITAL_SETTINGS entry holding the lifetime of each OTP purpose
+OTP_EXPIRY_SETTINGS = {
+    'verification': 'OTP_EXPIRY_MINUTES',
+    'email_verification': 'OTP_EXPIRY_MINUTES',
+    'login_verification': 'OTP_EXPIRY_MINUTES',
+    'password_reset': 'PASSWORD_RESET_OTP_EXPIRY_MINUTES',
+}
+
+
+class OTPError(Exception):
+    """Raised when an OTP code cannot be verified"""
+    pass
+
+
+def generate_otp(length=6):
+    """Generate a random numeric OTP code"""
+    return ''.join(secrets.choice('0123456789') for _ in range(length))
+
+
+def get_expiry_minutes(purpose):
+    """Get the configured lifetime of an OTP for a purpose"""
+    setting_name = OTP_EXPIRY_SETTINGS.get(purpose, 'OTP_EXPIRY_MINUTES')
+    return settings.HOSPITAL_SETTINGS.get(setting_name, 10)
+
+
+def issue_otp(user, purpose):
+    """Invalidate outstanding OTPs for the purpose and create a new one
+    
+    Returns the plain OTP code so the caller can email it.
+    """
+    OTPVerification.objects.active_for(user, purpose).update(is_used=True)
+    
+    otp_code = generate_otp()
+    OTPVerification.objects.create(
+        user=user,
+        otp_code=otp_code,
+        purpose=purpose,
+        expires_at=timezone.now() + timedelta(minutes=get_expiry_minutes(purpose))
+    )
+    return otp_code
+
+
+def verify_otp(user, otp_code, purpose):
+    """Check an OTP code and mark it as used
+    
+    Only the latest outstanding OTP for the purpose is considered. Codes
+    are compared in constant time, and the OTP is burned after
+    OTP_MAX_ATTEMPTS wrong guesses.
+    """
+    max_attempts = settings.HOSPITAL_SETTINGS.get('OTP_MAX_ATTEMPTS', 5)
+    error = None
+    
+    # The row lock serialises concurrent guesses, so each one counts against
+    # the attempts of the last and no more than max_attempts get compared
+    with transaction.atomic():
+        otp_verification = OTPVerification.objects.active_for(user, purpose).select_for_update().order_by(
+            '-created_at'
+        ).first()
+        
+        if not otp_verification:
+            error = 'Invalid OTP code'
+        elif not hmac.compare_digest(otp_verification.otp_code, str(otp_code)):
+            otp_verification.attempts += 1
+            otp_verification.is_used = otp_verification.attempts >= max_attempts
+            otp_verification.save(update_fields=['attempts', 'is_used'])
+            if otp_verification.is_used:
+                error = 'Too many failed attempts. Please request a new code'
+            else:
+                error = 'Invalid OTP code'
+        elif otp_verification.is_expired():
+            error = 'OTP code has expired'
+        else:
+            otp_verification.is_used = True
+            otp_verification.save(update_fields=['is_used'])
+    
+    # Raised outside the block so the attempt count is committed
+    if error:
+        raise OTPError(error)
+    return otp_verification
+
+
+def purge_expired_otps(retention=timedelta(hours=24), chunk_size=1000):
+    """Delete used and expired OTPs in chunks and return how many went
+    
+    Expired codes are kept for ``retention`` so recent failures can still
+    be inspected.
+    """
+    cutoff = timezone.now() - retention
+    stale = OTPVerification.objects.filter(
+        Q(is_used=True, created_at__lt=cutoff) | Q(expires_at__lt=cutoff)
+    )
+    
+    deleted = 0
+    while True:
+        ids = list(stale.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        count, _ = OTPVerification.objects.filter(id__in=ids).delete()
+        deleted += count
+    
+    return deleted
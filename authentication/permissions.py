@@ -1,5 +1,15 @@
 from rest_framework import permissions
 
+
+def get_token_payload(request):
+    """Get the JWT payload verified for this request"""
+    verified_token = getattr(request, 'verified_token', None)
+    if verified_token is not None and verified_token.is_valid:
+        return verified_token.payload
+    
+    return getattr(request.user, 'token_payload', {})
+
+
 class HasPermission(permissions.BasePermission):
     """Custom permission class that checks JWT token permissions"""
     
@@ -11,7 +21,7 @@ class HasPermission(permissions.BasePermission):
             return False
         
         # Get permissions from token payload
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         user_permissions = token_payload.get('permissions', [])
         
         return self.required_permission in user_permissions
@@ -24,7 +34,7 @@ class IsPatient(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         return token_payload.get('user_type') == 'patient'
 
 
@@ -35,7 +45,7 @@ class IsPersonnel(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         return token_payload.get('user_type') == 'personnel'
 
 
@@ -46,7 +56,7 @@ class IsVerifiedPersonnel(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         return (
             token_payload.get('user_type') == 'personnel' and
             token_payload.get('is_verified', False)
@@ -60,7 +70,7 @@ class CanTriggerEmergency(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         return (
             token_payload.get('user_type') == 'personnel' and
             token_payload.get('can_trigger_emergency', False)
@@ -77,7 +87,7 @@ class HasRole(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         user_roles = token_payload.get('roles', [])
         
         return self.required_role in user_roles
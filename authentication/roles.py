@@ -0,0 +1,144 @@
+import uuid
+from django.core.cache import cache
+
+from accounts.models import Role, PersonnelRole
+
+# Permissions granted by each Role.access_level
+ACCESS_LEVEL_PERMISSIONS = {
+    'basic': [
+        'view_patient_basic_info',
+    ],
+    'medical': [
+        'view_patient_basic_info',
+        'view_patient_medical_records',
+        'create_medical_records',
+        'view_prescriptions',
+        'view_lab_results',
+    ],
+    'senior_medical': [
+        'view_patient_basic_info',
+        'view_patient_medical_records',
+        'create_medical_records',
+        'edit_medical_records',
+        'view_prescriptions',
+        'create_prescriptions',
+        'view_lab_results',
+        'order_lab_tests',
+        'emergency_override',
+    ],
+    'administrative': [
+        'view_patient_basic_info',
+        'manage_appointments',
+        'manage_inventory',
+        'view_reports',
+        'manage_personnel',
+    ],
+    'emergency': [
+        'view_patient_basic_info',
+        'view_patient_medical_records',
+        'create_medical_records',
+        'emergency_override',
+        'critical_access',
+    ],
+}
+
+PATIENT_PERMISSIONS = ['view_own_records', 'book_appointments', 'view_own_prescriptions']
+
+REGISTRY_VERSION_CACHE_KEY = 'role_registry_version'
+CLAIMS_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+
+class RoleRegistry:
+    """In-process snapshot of the Role table with permissions precomputed
+    
+    The snapshot is loaded once per process and reloaded when the shared
+    version key in the cache changes. Role signals bump that key so every
+    worker picks up edits on its next lookup.
+    """
+    
+    _roles = None
+    _version = None
+    
+    @classmethod
+    def get_roles(cls):
+        """Get {role_id: role data} for every role"""
+        version = cls._current_version()
+        
+        if cls._roles is None or cls._version != version:
+            roles = {}
+            for role in Role.objects.values('id', 'name', 'access_level', 'can_trigger_emergency'):
+                role['permissions'] = frozenset(
+                    ACCESS_LEVEL_PERMISSIONS.get(role['access_level'], [])
+                )
+                roles[role['id']] = role
+            
+            cls._roles = roles
+            cls._version = version
+        
+        return cls._roles
+    
+    @classmethod
+    def invalidate(cls):
+        """Force every process to reload the registry"""
+        cls._roles = None
+        cache.set(REGISTRY_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    
+    @classmethod
+    def _current_version(cls):
+        version = cache.get(REGISTRY_VERSION_CACHE_KEY)
+        
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(REGISTRY_VERSION_CACHE_KEY, version, timeout=None):
+                version = cache.get(REGISTRY_VERSION_CACHE_KEY, version)
+        
+        return version
+    
+    @classmethod
+    def claims_for_roles(cls, role_ids):
+        """Build JWT role claims from a list of role ids"""
+        roles = cls.get_roles()
+        names = []
+        permissions = set()
+        can_trigger_emergency = False
+        
+        for role_id in role_ids:
+            role = roles.get(role_id)
+            if role is None:
+                continue
+            
+            names.append(role['name'])
+            permissions.update(role['permissions'])
+            can_trigger_emergency = can_trigger_emergency or role['can_trigger_emergency']
+        
+        return {
+            'roles': names,
+            'permissions': sorted(permissions),
+            'can_trigger_emergency': can_trigger_emergency
+        }
+
+
+def _claims_cache_key(personnel_id):
+    return f"personnel_claims_{personnel_id}_{RoleRegistry._current_version()}"
+
+
+def get_personnel_claims(personnel):
+    """Get roles, permissions and emergency capability for personnel"""
+    cache_key = _claims_cache_key(personnel.pk)
+    claims = cache.get(cache_key)
+    
+    if claims is None:
+        role_ids = PersonnelRole.objects.filter(
+            personnel_id=personnel.pk,
+            is_active=True
+        ).order_by('id').values_list('role_id', flat=True)
+        
+        claims = RoleRegistry.claims_for_roles(role_ids)
+        cache.set(cache_key, claims, timeout=CLAIMS_CACHE_TIMEOUT)
+    
+    return claims
+
+
+def invalidate_personnel_claims(personnel_id):
+    """Drop cached claims after a role assignment changes"""
+    cache.delete(_claims_cache_key(personnel_id))
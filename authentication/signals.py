@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from accounts.models import Patient, Personnel
+from accounts.models import Patient, Personnel, Role, PersonnelRole
+from .jwt_handler import UserStateCache
+from .roles import RoleRegistry, invalidate_personnel_claims
 import logging
 
 User = get_user_model()
@@ -28,8 +30,43 @@ def personnel_profile_created_handler(sender, instance, created, **kwargs):
     if created:
         logger.info(f"New personnel profile created: {instance.employee_id} for user {instance.user.email}")
 
+@receiver(post_save, sender=User)
+def user_search_fields_changed_handler(sender, instance, created, update_fields=None, **kwargs):
+    """Refresh patient search and matching fields when name or email changes"""
+    if created:
+        return
+    
+    if update_fields is not None and not set(update_fields) & {'first_name', 'last_name', 'email'}:
+        return
+    
+    patient = Patient.objects.filter(user=instance).first()
+    if patient:
+        patient.user = instance
+        derived = [getattr(patient, name) for name in Patient.DERIVED_FIELDS]
+        patient.refresh_derived_fields()
+        # Most saves without update_fields leave the name and email alone
+        if [getattr(patient, name) for name in Patient.DERIVED_FIELDS] != derived:
+            patient.save(update_fields=Patient.DERIVED_FIELDS)
+
 @receiver(pre_delete, sender=User)
 def user_deletion_handler(sender, instance, **kwargs):
     """Handle user deletion events"""
     logger.warning(f"User being deleted: {instance.email} ({instance.id})")
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_state_changed_handler(sender, instance, **kwargs):
+    """Drop the cached active state used by stateless JWT authentication"""
+    UserStateCache.invalidate(instance.id)
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def role_changed_handler(sender, instance, **kwargs):
+    """Reload the role/permission registry in every process"""
+    RoleRegistry.invalidate()
+
+@receiver(post_save, sender=PersonnelRole)
+@receiver(post_delete, sender=PersonnelRole)
+def role_assignment_changed_handler(sender, instance, **kwargs):
+    """Drop cached JWT claims for the affected personnel"""
+    invalidate_personnel_claims(instance.personnel_id)
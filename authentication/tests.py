@@ -1,3 +1,251 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from unittest import mock
+from django.conf import settings
+from django.core import mail
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
 
-# Create your tests here.
+from .audit import AuditWriter, replay_spill_files, spill, write_events
+from .mail import queue_otp_email, send_queued_emails
+from .models import AuditLog, OTPVerification, OutboundEmail, User
+from .otp import issue_otp, OTPError, verify_otp
+
+
+def wrong_code(code):
+    return '000000' if code != '000000' else '111111'
+
+
+class OTPVerificationTests(TestCase):
+    """verify_otp burns a code after OTP_MAX_ATTEMPTS wrong guesses"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user('patient@example.com', 'Pat', 'Ient', 'Passw0rd!')
+        self.max_attempts = settings.HOSPITAL_SETTINGS.get('OTP_MAX_ATTEMPTS', 5)
+    
+    def test_correct_code_is_accepted_once(self):
+        code = issue_otp(self.user, 'email_verification')
+        verify_otp(self.user, code, 'email_verification')
+        with self.assertRaisesMessage(OTPError, 'Invalid OTP code'):
+            verify_otp(self.user, code, 'email_verification')
+    
+    def test_wrong_guess_is_counted(self):
+        code = issue_otp(self.user, 'email_verification')
+        with self.assertRaisesMessage(OTPError, 'Invalid OTP code'):
+            verify_otp(self.user, wrong_code(code), 'email_verification')
+        self.assertEqual(OTPVerification.objects.get().attempts, 1)
+    
+    def test_code_is_burned_after_max_attempts(self):
+        code = issue_otp(self.user, 'email_verification')
+        for _ in range(self.max_attempts - 1):
+            with self.assertRaisesMessage(OTPError, 'Invalid OTP code'):
+                verify_otp(self.user, wrong_code(code), 'email_verification')
+        with self.assertRaisesMessage(OTPError, 'Too many failed attempts'):
+            verify_otp(self.user, wrong_code(code), 'email_verification')
+        
+        # Even the right code is refused now
+        with self.assertRaisesMessage(OTPError, 'Invalid OTP code'):
+            verify_otp(self.user, code, 'email_verification')
+        
+        otp = OTPVerification.objects.get()
+        self.assertTrue(otp.is_used)
+        self.assertEqual(otp.attempts, self.max_attempts)
+    
+    def test_new_code_replaces_the_old_one(self):
+        old_code = issue_otp(self.user, 'email_verification')
+        new_code = issue_otp(self.user, 'email_verification')
+        if old_code != new_code:
+            with self.assertRaises(OTPError):
+                verify_otp(self.user, old_code, 'email_verification')
+        verify_otp(self.user, new_code, 'email_verification')
+    
+    def test_purposes_are_separate(self):
+        code = issue_otp(self.user, 'password_reset')
+        with self.assertRaises(OTPError):
+            verify_otp(self.user, code, 'email_verification')
+        verify_otp(self.user, code, 'password_reset')
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentOTPVerificationTests(TransactionTestCase):
+    """Simultaneous guesses cannot get past the attempt limit"""
+    
+    def test_concurrent_guesses_stop_at_max_attempts(self):
+        user = User.objects.create_user('patient@example.com', 'Pat', 'Ient', 'Passw0rd!')
+        max_attempts = settings.HOSPITAL_SETTINGS.get('OTP_MAX_ATTEMPTS', 5)
+        code = issue_otp(user, 'email_verification')
+        barrier = threading.Barrier(max_attempts * 3)
+        errors = []
+        
+        def guess():
+            try:
+                barrier.wait()
+                verify_otp(user, wrong_code(code), 'email_verification')
+            except OTPError as e:
+                errors.append(str(e))
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=guess) for _ in range(max_attempts * 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        otp = OTPVerification.objects.get()
+        self.assertEqual(otp.attempts, max_attempts)
+        self.assertTrue(otp.is_used)
+        self.assertEqual(errors.count('Too many failed attempts. Please request a new code'), 1)
+
+
+class OutboundEmailTests(TestCase):
+    """send_queued_emails delivers the outbox and keeps no codes afterwards"""
+    
+    def test_sent_email_body_is_blanked(self):
+        queue_otp_email('patient@example.com', '123456')
+        self.assertEqual(send_queued_emails(), (1, 0))
+        
+        self.assertIn('123456', mail.outbox[0].body)
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.body), ('sent', ''))
+        self.assertEqual(email.recipients, ['patient@example.com'])
+    
+    def test_failed_delivery_is_retried_with_the_body(self):
+        queue_otp_email('patient@example.com', '123456')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('refused')):
+            self.assertEqual(send_queued_emails(), (0, 1))
+        
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'refused'))
+        self.assertIn('123456', email.body)
+    
+    @override_settings(HOSPITAL_SETTINGS={**settings.HOSPITAL_SETTINGS, 'EMAIL_OUTBOX_MAX_ATTEMPTS': 1})
+    def test_abandoned_email_body_is_blanked(self):
+        queue_otp_email('patient@example.com', '123456', purpose='password_reset')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('refused')):
+            with self.assertLogs('authentication.mail', 'ERROR'):
+                send_queued_emails()
+        
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.body), ('failed', ''))
+
+
+def audit_event(action='record_viewed'):
+    return {
+        'event_id': str(uuid.uuid4()),
+        'user_id': None,
+        'action': action,
+        'resource_type': 'patient',
+        'resource_id': 'HMS2025000001',
+        'details': {},
+        'ip_address': '10.0.0.1',
+        'occurred_at': timezone.now(),
+    }
+
+
+class AuditSpillTests(TestCase):
+    """Audit events survive a database outage through the spill files"""
+    
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        audit_settings = override_settings(AUDIT_LOG={
+            **settings.AUDIT_LOG,
+            'BUFFERED': True,
+            'BATCH_SIZE': 1000,
+            'FLUSH_INTERVAL_SECONDS': 3600,  # only the test flushes
+            'SPILL_DIR': self.spill_dir,
+        })
+        audit_settings.enable()
+        self.addCleanup(audit_settings.disable)
+    
+    def database_down(self):
+        return mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=OperationalError('database is down'))
+    
+    def spill_files(self):
+        return sorted(os.listdir(self.spill_dir))
+    
+    def spilled_lines(self, name):
+        with open(os.path.join(self.spill_dir, name), encoding='utf-8') as spill_file:
+            return [json.loads(line) for line in spill_file]
+    
+    def test_write_events(self):
+        self.assertTrue(write_events([audit_event(), audit_event()]))
+        self.assertEqual(AuditLog.objects.count(), 2)
+        self.assertEqual(self.spill_files(), [])
+    
+    def test_failed_write_spills_to_disk(self):
+        events = [audit_event(), audit_event()]
+        with self.database_down(), self.assertLogs('authentication.audit', 'ERROR'):
+            self.assertFalse(write_events(events))
+        
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(self.spill_files(), [f'audit-{os.getpid()}.jsonl'])
+        spilled = self.spilled_lines(f'audit-{os.getpid()}.jsonl')
+        self.assertEqual([event['event_id'] for event in spilled], [event['event_id'] for event in events])
+    
+    def test_replay_writes_spilled_events_and_removes_the_file(self):
+        spill([audit_event(), audit_event(), audit_event()])
+        self.assertEqual(replay_spill_files(), 3)
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(self.spill_files(), [])
+    
+    def test_replaying_an_event_twice_stores_it_once(self):
+        event = audit_event()
+        spill([event])
+        replay_spill_files()
+        spill([event])
+        replay_spill_files()
+        self.assertEqual(AuditLog.objects.filter(event_id=event['event_id']).count(), 1)
+    
+    def test_failed_replay_keeps_the_file(self):
+        spill([audit_event()])
+        with self.database_down(), self.assertLogs('authentication.audit', 'ERROR'):
+            self.assertEqual(replay_spill_files(), 0)
+        self.assertEqual(self.spill_files(), [f'audit-{os.getpid()}.jsonl'])
+        self.assertEqual(replay_spill_files(), 1)
+    
+    def test_files_of_exited_workers_are_replayed(self):
+        with open(os.path.join(self.spill_dir, 'audit-99999999.jsonl'), 'w', encoding='utf-8') as spill_file:
+            spill_file.write(json.dumps({**audit_event(), 'occurred_at': timezone.now().isoformat()}) + '\n')
+            spill_file.write('{"event_id": "torn')
+        with self.assertLogs('authentication.audit', 'ERROR') as logs:
+            self.assertEqual(replay_spill_files(), 1)
+        self.assertIn('Skipping unreadable audit spill line', logs.output[0])
+        self.assertEqual(self.spill_files(), [])
+    
+    def test_files_of_running_workers_are_left_alone(self):
+        name = f'audit-{os.getppid()}.jsonl'
+        with open(os.path.join(self.spill_dir, name), 'w', encoding='utf-8') as spill_file:
+            spill_file.write(json.dumps({**audit_event(), 'occurred_at': timezone.now().isoformat()}) + '\n')
+        self.assertEqual(replay_spill_files(), 0)
+        self.assertEqual(self.spill_files(), [name])
+    
+    def test_buffered_writer_spills_during_an_outage_and_replays_after(self):
+        writer = AuditWriter()
+        writer.record(audit_event())
+        writer.record(audit_event())
+        self.assertFalse(AuditLog.objects.exists())
+        
+        with self.database_down(), self.assertLogs('authentication.audit', 'ERROR'):
+            writer.flush()
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(len(self.spilled_lines(f'audit-{os.getpid()}.jsonl')), 2)
+        
+        # The next successful flush writes the new event and replays the spill
+        writer.record(audit_event())
+        writer.flush()
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(self.spill_files(), [])
+    
+    def test_full_buffer_goes_straight_to_disk(self):
+        with override_settings(AUDIT_LOG={**settings.AUDIT_LOG, 'MAX_BUFFERED': 2}):
+            writer = AuditWriter()
+            for _ in range(3):
+                writer.record(audit_event())
+        self.assertEqual(len(self.spilled_lines(f'audit-{os.getpid()}.jsonl')), 1)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     PersonnelLoginView,
@@ -11,9 +12,14 @@ from .views import (
     ChangePasswordView,
     TokenRefreshView,
     ValidateTokenView,
-    LogoutView
+    LogoutView,
+    DatabaseStatsView
 )
 
+if settings.ASYNC_READ_VIEWS:
+    # ASGI deployments validate tokens without a thread per request
+    from .async_views import ValidateTokenView
+
 app_name = 'authentication'
 
 urlpatterns = [
@@ -38,4 +44,7 @@ urlpatterns = [
     # Token Management
     path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('token/validate/', ValidateTokenView.as_view(), name='validate-token'),
+    
+    # Internal
+    path('internal/db-stats/', DatabaseStatsView.as_view(), name='db-stats'),
 ]
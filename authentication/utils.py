@@ -49,15 +49,13 @@ def send_otp_email(email, otp_code, purpose='verification'):
 def validate_patient_id_format(patient_id):
     """Validate patient ID format"""
     import re
-    pattern = r'^HMS\d{4}\d{6}
-          # HMS + year + 6 digits
+    pattern = r'^HMS\d{4}\d{6}$'  # HMS + year + 6 digits
     return bool(re.match(pattern, patient_id))
 
 def validate_employee_id_format(employee_id):
     """Validate employee ID format"""
     import re
-    pattern = r'^EMP\d{4}\d{4}
-          # EMP + year + 4 digits
+    pattern = r'^EMP\d{4}\d{4}$'  # EMP + year + 4 digits
     return bool(re.match(pattern, employee_id))
 
 def get_client_ip(request):
@@ -69,19 +67,20 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-def create_audit_log(user, action, details, ip_address=None):
-    """Create audit log entry"""
-    from .models import AuditLog
+def create_audit_log(user, action, details, ip_address=None, resource_type='', resource_id=''):
+    """Queue an audit log entry; it is written in the background in batches"""
+    from .audit import record_event
     
     try:
-        AuditLog.objects.create(
-            user=user,
-            action=action,
+        record_event(
+            action,
+            user_id=user.pk if user is not None else None,
+            resource_type=resource_type,
+            resource_id=resource_id,
             details=details,
-            ip_address=ip_address or '127.0.0.1'
+            ip_address=ip_address
         )
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
         logger.error(f"Failed to create audit log: {str(e)}")
-
@@ -2,17 +2,14 @@
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .jwt_handler import CustomJWTHandler, JWTTokenBlacklist
+from .jwt_handler import CustomJWTHandler, JWTTokenBlacklist, VerifiedToken
 from django.contrib.auth import authenticate
 from django.utils import timezone
-from django.conf import settings
-from django.core.mail import send_mail
 from django.db import transaction
-import random
-import string
-from datetime import timedelta
 
-from .models import User, OTPVerification
+from .models import User
+from .mail import queue_otp_email
+from .otp import OTPError, issue_otp, verify_otp
 from .serializers import (
     UserRegistrationSerializer, 
     LoginSerializer, 
@@ -21,6 +18,8 @@ from .serializers import (
     PasswordResetConfirmSerializer,
     ChangePasswordSerializer
 )
+from .db_stats import database_stats
+from .permissions import get_token_payload
 from accounts.models import Patient, Personnel
 
 class PersonnelRegisterView(generics.CreateAPIView):
@@ -40,47 +39,15 @@ class PersonnelRegisterView(generics.CreateAPIView):
             # Create personnel profile
             Personnel.objects.create_personnel_profile(user=user)
             
-            # Generate and send OTP
-            otp_code = self._generate_otp()
-            OTPVerification.objects.create(
-                user=user,
-                otp_code=otp_code,
-                purpose='email_verification',
-                expires_at=timezone.now() + timedelta(minutes=10)
-            )
-            
-            self._send_otp_email(user.email, otp_code, 'verification')
+            # Generate OTP and queue the email in the outbox
+            otp_code = issue_otp(user, 'email_verification')
+            queue_otp_email(user.email, otp_code, 'verification')
             
             return Response({
                 'message': 'Personnel account created successfully. Please check your email for verification code.',
                 'user_id': user.id,
                 'email': user.email
             }, status=status.HTTP_201_CREATED)
-    
-    def _generate_otp(self):
-        return ''.join(random.choices(string.digits, k=6))
-    
-    def _send_otp_email(self, email, otp_code, purpose):
-        subject_map = {
-            'verification': 'Hospital Management System - Email Verification',
-            'password_reset': 'Hospital Management System - Password Reset'
-        }
-        
-        message = f"""
-        Your verification code is: {otp_code}
-        
-        This code will expire in 10 minutes.
-        
-        If you didn't request this code, please ignore this email.
-        """
-        
-        send_mail(
-            subject=subject_map.get(purpose, 'Hospital Management System - Verification'),
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
 
 
 class PatientRegisterView(generics.CreateAPIView):
@@ -103,16 +70,9 @@ class PatientRegisterView(generics.CreateAPIView):
                 registration_type='online'
             )
             
-            # Generate and send OTP
-            otp_code = self._generate_otp()
-            OTPVerification.objects.create(
-                user=user,
-                otp_code=otp_code,
-                purpose='email_verification',
-                expires_at=timezone.now() + timedelta(minutes=10)
-            )
-            
-            self._send_otp_email(user.email, otp_code, 'verification')
+            # Generate OTP and queue the email in the outbox
+            otp_code = issue_otp(user, 'email_verification')
+            queue_otp_email(user.email, otp_code, 'verification')
             
             return Response({
                 'message': 'Patient account created successfully. Please check your email for verification code.',
@@ -120,31 +80,6 @@ class PatientRegisterView(generics.CreateAPIView):
                 'email': user.email,
                 'patient_id': user.patient_profile.patient_id
             }, status=status.HTTP_201_CREATED)
-    
-    def _generate_otp(self):
-        return ''.join(random.choices(string.digits, k=6))
-    
-    def _send_otp_email(self, email, otp_code, purpose):
-        subject_map = {
-            'verification': 'Hospital Management System - Email Verification',
-            'password_reset': 'Hospital Management System - Password Reset'
-        }
-        
-        message = f"""
-        Your verification code is: {otp_code}
-        
-        This code will expire in 10 minutes.
-        
-        If you didn't request this code, please ignore this email.
-        """
-        
-        send_mail(
-            subject=subject_map.get(purpose, 'Hospital Management System - Verification'),
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
 
 
 class VerifyEmailView(APIView):
@@ -159,27 +94,16 @@ class VerifyEmailView(APIView):
         
         try:
             user = User.objects.get(email=email)
-            otp_verification = OTPVerification.objects.filter(
-                user=user,
-                otp_code=otp_code,
-                purpose='email_verification',
-                is_used=False
-            ).first()
             
-            if not otp_verification:
+            # Check the OTP and mark it as used
+            try:
+                verify_otp(user, otp_code, 'email_verification')
+            except OTPError as e:
                 return Response({
-                    'error': 'Invalid OTP code'
+                    'error': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            if otp_verification.is_expired():
-                return Response({
-                    'error': 'OTP code has expired'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Mark OTP as used and verify user
-            otp_verification.is_used = True
-            otp_verification.save()
-            
+            # Verify user
             user.is_verified = True
             user.is_active = True
             user.save()
@@ -228,7 +152,7 @@ class PersonnelLoginView(APIView):
         
         # Update last login
         user.last_login = timezone.now()
-        user.save()
+        user.save(update_fields=['last_login'])
         
         # Generate JWT tokens
         tokens = CustomJWTHandler.generate_tokens(user)
@@ -237,54 +161,6 @@ class PersonnelLoginView(APIView):
             'message': 'Login successful',
             **tokens
         }, status=status.HTTP_200_OK)
-    
-    def _get_user_permissions(self, personnel):
-        """Get user permissions based on their roles"""
-        roles = personnel.role_assignments.filter(is_active=True).select_related('role')
-        permissions = set()
-        
-        for role_assignment in roles:
-            role = role_assignment.role
-            if role.access_level == 'basic':
-                permissions.update(['view_patient_basic_info'])
-            elif role.access_level == 'medical':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'view_prescriptions',
-                    'view_lab_results'
-                ])
-            elif role.access_level == 'senior_medical':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'edit_medical_records',
-                    'view_prescriptions',
-                    'create_prescriptions',
-                    'view_lab_results',
-                    'order_lab_tests',
-                    'emergency_override'
-                ])
-            elif role.access_level == 'administrative':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'manage_appointments',
-                    'manage_inventory',
-                    'view_reports',
-                    'manage_personnel'
-                ])
-            elif role.access_level == 'emergency':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'emergency_override',
-                    'critical_access'
-                ])
-        
-        return list(permissions)
 
 
 class PatientLoginView(APIView):
@@ -316,7 +192,7 @@ class PatientLoginView(APIView):
         
         # Update last login
         user.last_login = timezone.now()
-        user.save()
+        user.save(update_fields=['last_login'])
         
         # Generate JWT tokens
         tokens = CustomJWTHandler.generate_tokens(user)
@@ -370,24 +246,11 @@ class ResendOTPView(APIView):
                     'error': 'Email is already verified'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Invalidate previous OTPs
-            OTPVerification.objects.filter(
-                user=user,
-                purpose='email_verification',
-                is_used=False
-            ).update(is_used=True)
-            
-            # Generate new OTP
-            otp_code = ''.join(random.choices(string.digits, k=6))
-            OTPVerification.objects.create(
-                user=user,
-                otp_code=otp_code,
-                purpose='email_verification',
-                expires_at=timezone.now() + timedelta(minutes=10)
-            )
+            # Invalidate previous OTPs and generate a new one
+            otp_code = issue_otp(user, 'email_verification')
             
-            # Send OTP email
-            self._send_otp_email(user.email, otp_code, 'verification')
+            # Queue OTP email for the outbox worker
+            queue_otp_email(user.email, otp_code, 'verification')
             
             return Response({
                 'message': 'New verification code sent successfully'
@@ -397,28 +260,6 @@ class ResendOTPView(APIView):
             return Response({
                 'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
-    
-    def _send_otp_email(self, email, otp_code, purpose):
-        subject_map = {
-            'verification': 'Hospital Management System - Email Verification',
-            'password_reset': 'Hospital Management System - Password Reset'
-        }
-        
-        message = f"""
-        Your verification code is: {otp_code}
-        
-        This code will expire in 10 minutes.
-        
-        If you didn't request this code, please ignore this email.
-        """
-        
-        send_mail(
-            subject=subject_map.get(purpose, 'Hospital Management System - Verification'),
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
 
 
 class PasswordResetRequestView(APIView):
@@ -433,24 +274,11 @@ class PasswordResetRequestView(APIView):
         try:
             user = User.objects.get(email=email, is_active=True)
             
-            # Invalidate previous password reset OTPs
-            OTPVerification.objects.filter(
-                user=user,
-                purpose='password_reset',
-                is_used=False
-            ).update(is_used=True)
-            
-            # Generate new OTP
-            otp_code = ''.join(random.choices(string.digits, k=6))
-            OTPVerification.objects.create(
-                user=user,
-                otp_code=otp_code,
-                purpose='password_reset',
-                expires_at=timezone.now() + timedelta(minutes=15)
-            )
+            # Invalidate previous password reset OTPs and generate a new one
+            otp_code = issue_otp(user, 'password_reset')
             
-            # Send OTP email
-            self._send_otp_email(user.email, otp_code, 'password_reset')
+            # Queue OTP email for the outbox worker
+            queue_otp_email(user.email, otp_code, 'password_reset')
             
             return Response({
                 'message': 'Password reset code sent successfully'
@@ -461,28 +289,6 @@ class PasswordResetRequestView(APIView):
             return Response({
                 'message': 'Password reset code sent successfully'
             }, status=status.HTTP_200_OK)
-    
-    def _send_otp_email(self, email, otp_code, purpose):
-        subject_map = {
-            'verification': 'Hospital Management System - Email Verification',
-            'password_reset': 'Hospital Management System - Password Reset'
-        }
-        
-        message = f"""
-        Your password reset code is: {otp_code}
-        
-        This code will expire in 15 minutes.
-        
-        If you didn't request this code, please ignore this email.
-        """
-        
-        send_mail(
-            subject=subject_map.get(purpose, 'Hospital Management System - Password Reset'),
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
 
 
 class PasswordResetConfirmView(APIView):
@@ -498,27 +304,16 @@ class PasswordResetConfirmView(APIView):
         
         try:
             user = User.objects.get(email=email)
-            otp_verification = OTPVerification.objects.filter(
-                user=user,
-                otp_code=otp_code,
-                purpose='password_reset',
-                is_used=False
-            ).first()
-            
-            if not otp_verification:
-                return Response({
-                    'error': 'Invalid OTP code'
-                }, status=status.HTTP_400_BAD_REQUEST)
             
-            if otp_verification.is_expired():
+            # Check the OTP and mark it as used
+            try:
+                verify_otp(user, otp_code, 'password_reset')
+            except OTPError as e:
                 return Response({
-                    'error': 'OTP code has expired'
+                    'error': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Mark OTP as used and reset password
-            otp_verification.is_used = True
-            otp_verification.save()
-            
+            # Reset password
             user.set_password(new_password)
             user.save()
             
@@ -569,14 +364,18 @@ class TokenRefreshView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Check if token is blacklisted
-            if JWTTokenBlacklist.is_token_blacklisted(refresh_token):
+            # Decode once, then check if token is blacklisted
+            verified_token = VerifiedToken.from_token(refresh_token)
+            if verified_token.is_blacklisted:
                 return Response({
                     'error': 'Token has been revoked'
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
             # Generate new access token
-            tokens = CustomJWTHandler.refresh_access_token(refresh_token)
+            tokens = CustomJWTHandler.refresh_access_token(
+                refresh_token,
+                payload=verified_token.payload
+            )
             
             return Response({
                 'message': 'Token refreshed successfully',
@@ -589,78 +388,50 @@ class TokenRefreshView(APIView):
             }, status=status.HTTP_401_UNAUTHORIZED)
 
 
+def token_user_data(token_payload):
+    """User details carried by an access token, as returned by token validation"""
+    return {
+        'id': token_payload.get('user_id'),
+        'email': token_payload.get('email'),
+        'first_name': token_payload.get('first_name'),
+        'last_name': token_payload.get('last_name'),
+        'user_type': token_payload.get('user_type'),
+        'permissions': token_payload.get('permissions', []),
+        # Patient-specific data
+        'patient_id': token_payload.get('patient_id'),
+        'is_profile_complete': token_payload.get('is_profile_complete'),
+        # Personnel-specific data
+        'employee_id': token_payload.get('employee_id'),
+        'is_verified': token_payload.get('is_verified'),
+        'verification_status': token_payload.get('verification_status'),
+        'roles': token_payload.get('roles', []),
+        'can_trigger_emergency': token_payload.get('can_trigger_emergency', False)
+    }
+
+
 class ValidateTokenView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
         # User data is already in the token payload via our custom authentication
-        token_payload = getattr(request.user, 'token_payload', {})
+        token_payload = get_token_payload(request)
         
         return Response({
             'valid': True,
-            'user': {
-                'id': token_payload.get('user_id'),
-                'email': token_payload.get('email'),
-                'first_name': token_payload.get('first_name'),
-                'last_name': token_payload.get('last_name'),
-                'user_type': token_payload.get('user_type'),
-                'permissions': token_payload.get('permissions', []),
-                # Patient-specific data
-                'patient_id': token_payload.get('patient_id'),
-                'is_profile_complete': token_payload.get('is_profile_complete'),
-                # Personnel-specific data
-                'employee_id': token_payload.get('employee_id'),
-                'is_verified': token_payload.get('is_verified'),
-                'verification_status': token_payload.get('verification_status'),
-                'roles': token_payload.get('roles', []),
-                'can_trigger_emergency': token_payload.get('can_trigger_emergency', False)
-            }
+            'user': token_user_data(token_payload)
         }, status=status.HTTP_200_OK)
+
+
+class DatabaseStatsView(APIView):
+    """Database connection and pool statistics for the worker serving the request (Admin only)"""
+    permission_classes = [permissions.IsAuthenticated]
     
-    def _get_user_permissions(self, personnel):
-        """Get user permissions based on their roles - same as in PersonnelLoginView"""
-        roles = personnel.role_assignments.filter(is_active=True).select_related('role')
-        permissions = set()
-        
-        for role_assignment in roles:
-            role = role_assignment.role
-            if role.access_level == 'basic':
-                permissions.update(['view_patient_basic_info'])
-            elif role.access_level == 'medical':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'view_prescriptions',
-                    'view_lab_results'
-                ])
-            elif role.access_level == 'senior_medical':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'edit_medical_records',
-                    'view_prescriptions',
-                    'create_prescriptions',
-                    'view_lab_results',
-                    'order_lab_tests',
-                    'emergency_override'
-                ])
-            elif role.access_level == 'administrative':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'manage_appointments',
-                    'manage_inventory',
-                    'view_reports',
-                    'manage_personnel'
-                ])
-            elif role.access_level == 'emergency':
-                permissions.update([
-                    'view_patient_basic_info',
-                    'view_patient_medical_records',
-                    'create_medical_records',
-                    'emergency_override',
-                    'critical_access'
-                ])
-        
-        return list(permissions)
+    def get(self, request):
+        token_payload = get_token_payload(request)
+        if 'Admin' not in token_payload.get('roles', []):
+            return Response(
+                {'error': 'Permission denied'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        return Response(database_stats(), status=status.HTTP_200_OK)
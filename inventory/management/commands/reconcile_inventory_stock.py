@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import InventoryItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild InventoryItem.quantity_on_hand from stock levels and report drift'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without fixing it')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Items locked and checked per transaction')
+    
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        drifted = 0
+        checked = 0
+        last_id = 0
+        
+        while True:
+            with transaction.atomic():
+                # Lock the chunk so in-flight stock writes finish before we sum
+                item_ids = list(
+                    InventoryItem.objects.select_for_update().filter(
+                        id__gt=last_id
+                    ).order_by('id').values_list('id', flat=True)[:chunk_size]
+                )
+                if not item_ids:
+                    break
+                
+                for item in InventoryItem.objects.with_stock_drift().filter(id__in=item_ids):
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'{item.sku}: counter {item.quantity_on_hand}, actual {item.actual_stock} '
+                        f'(drift {item.quantity_on_hand - item.actual_stock:+d})'
+                    ))
+                    if not options['dry_run']:
+                        InventoryItem.objects.filter(pk=item.pk).update(quantity_on_hand=item.actual_stock)
+            
+            checked += len(item_ids)
+            last_id = item_ids[-1]
+        
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} items, {action} drift on {drifted}')
+        )
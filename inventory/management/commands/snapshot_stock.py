@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from inventory.stock import take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot ledger balances so stock can be computed without replaying all movements'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Snapshots written per statement')
+    
+    def handle(self, *args, **options):
+        written = take_snapshots(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Wrote {written} stock snapshots')
+        )
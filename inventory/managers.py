@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
-from django.db.models import Q, F, Sum  # Added F and Sum for low_stock_items and out_of_stock_items
+from django.db.models import Q, F, Sum
+from django.db.models.functions import Coalesce
 
 class InventoryItemManager(models.Manager):
     def active_items(self):
@@ -10,23 +11,31 @@ class InventoryItemManager(models.Manager):
     def low_stock_items(self):
         """Get items below reorder level"""
         return self.filter(
-            is_active=True
-        ).annotate(
-            current_stock=Sum('stock_levels__quantity', filter=Q(stock_levels__is_active=True))
-        ).filter(
-            current_stock__lt=F('reorder_level')
+            is_active=True,
+            quantity_on_hand__lt=F('reorder_level')
         )
     
     def out_of_stock_items(self):
         """Get out of stock items"""
         return self.filter(
-            is_active=True
-        ).annotate(
-            current_stock=Sum('stock_levels__quantity', filter=Q(stock_levels__is_active=True))
-        ).filter(
-            Q(current_stock=0) | Q(current_stock__isnull=True)
+            is_active=True,
+            quantity_on_hand__lte=0
         )
     
+    def adjust_on_hand(self, item_id, delta):
+        """Atomically add delta to an item's quantity_on_hand"""
+        if delta:
+            self.filter(pk=item_id).update(quantity_on_hand=F('quantity_on_hand') + delta)
+    
+    def with_stock_drift(self):
+        """Annotate actual stock and return items whose counter disagrees"""
+        return self.annotate(
+            actual_stock=Coalesce(
+                Sum('stock_levels__quantity', filter=Q(stock_levels__is_active=True)),
+                0
+            )
+        ).exclude(quantity_on_hand=F('actual_stock'))
+    
     def expiring_soon(self, days=30):
         """Get items expiring within specified days"""
         cutoff_date = timezone.now().date() + timezone.timedelta(days=days)
@@ -49,3 +58,30 @@ class InventoryItemManager(models.Manager):
             Q(description__icontains=query),
             is_active=True
         )
+
+
+class StockLevelManager(models.Manager):
+    def active_lots(self):
+        """Get lots that count towards stock on hand"""
+        return self.filter(is_active=True)
+    
+    def fefo_candidates(self, item_id, as_of=None):
+        """Active, unexpired lots of an item, first expiry first out"""
+        as_of = as_of or timezone.now().date()
+        return self.filter(
+            item_id=item_id,
+            is_active=True,
+            quantity__gt=0
+        ).exclude(
+            expiry_date__lt=as_of
+        ).order_by(F('expiry_date').asc(nulls_last=True), 'id')
+
+
+class StockMovementManager(models.Manager):
+    def for_item(self, item):
+        """Get the ledger for an item, oldest first"""
+        return self.filter(item=item).order_by('id')
+    
+    def for_reference(self, reference):
+        """Get movements recorded against a reference like prescription_item:42"""
+        return self.filter(reference=reference).order_by('id')
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 
-from .managers import InventoryItemManager  # Import the manager
+from .managers import InventoryItemManager, StockLevelManager, StockMovementManager  # Import managers
 
 class InventoryCategory(models.Model):
     name = models.CharField(max_length=200, unique=True)
@@ -28,17 +29,33 @@ class InventoryItem(models.Model):
     unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     
+    # Sum of active StockLevel quantities, kept up to date by StockLevel
+    # writes; rebuild with the reconcile_inventory_stock command
+    quantity_on_hand = models.IntegerField(default=0, editable=False)
+    
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Serves low_stock_items without touching healthy items
+            models.Index(
+                fields=['quantity_on_hand'],
+                condition=Q(is_active=True, quantity_on_hand__lt=F('reorder_level')),
+                name='inventory_low_stock_idx'
+            ),
+        ]
+    
     def current_stock(self):
-        return sum(stock.quantity for stock in self.stock_levels.filter(is_active=True))
+        return self.quantity_on_hand
     
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
 class StockLevel(models.Model):
+    objects = StockLevelManager()  # Assign the custom manager
+    
     item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='stock_levels')
     quantity = models.IntegerField()
     lot_number = models.CharField(max_length=100, blank=True)
@@ -48,5 +65,136 @@ class StockLevel(models.Model):
     updated_by = models.ForeignKey('accounts.Personnel', on_delete=models.SET_NULL, null=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Fields whose change moves stock on hand
+    ON_HAND_FIELDS = {'quantity', 'is_active', 'item', 'item_id'}
+    
     def __str__(self):
         return f"{self.item.name} - {self.quantity} units"
+    
+    def on_hand_contribution(self):
+        """Units this row adds to its item's quantity_on_hand"""
+        return self.quantity if self.is_active else 0
+    
+    def _lock_items(self, *item_ids):
+        """Lock item rows before any lot row, the order allocate_fefo uses
+        
+        Taking the locks in the same order keeps a dispense and a stock edit
+        of the same item from deadlocking.
+        """
+        item_ids = sorted({item_id for item_id in item_ids if item_id is not None})
+        list(
+            InventoryItem.objects.select_for_update().filter(pk__in=item_ids).order_by('pk').values_list('pk', flat=True)
+        )
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & self.ON_HAND_FIELDS:
+            # Nothing counted towards quantity_on_hand is written, whatever
+            # this instance holds in memory
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                stored_item_id = StockLevel.objects.filter(pk=self.pk).values_list('item_id', flat=True).first()
+                self._lock_items(stored_item_id, self.item_id)
+                # Lock the old row so concurrent edits apply their deltas in turn
+                previous = StockLevel.objects.select_for_update().filter(pk=self.pk).first()
+            else:
+                self._lock_items(self.item_id)
+            
+            super().save(*args, **kwargs)
+            
+            if previous is None:
+                self._record_change(self.item_id, self.on_hand_contribution(), 'receipt')
+            elif previous.item_id != self.item_id:
+                self._record_change(previous.item_id, -previous.on_hand_contribution(), 'transfer')
+                self._record_change(self.item_id, self.on_hand_contribution(), 'transfer')
+            else:
+                self._record_change(
+                    self.item_id,
+                    self.on_hand_contribution() - previous.on_hand_contribution(),
+                    'adjustment'
+                )
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self._lock_items(StockLevel.objects.filter(pk=self.pk).values_list('item_id', flat=True).first())
+            previous = StockLevel.objects.select_for_update().filter(pk=self.pk).first()
+            if previous is not None:
+                previous._record_change(previous.item_id, -previous.on_hand_contribution(), 'write_off')
+            result = super().delete(*args, **kwargs)
+        return result
+    
+    def _record_change(self, item_id, delta, movement_type):
+        """Apply a change to the item counter and append it to the ledger"""
+        if not delta:
+            return
+        
+        InventoryItem.objects.adjust_on_hand(item_id, delta)
+        StockMovement.objects.create(
+            item_id=item_id,
+            stock_level=self,
+            quantity=delta,
+            movement_type=movement_type,
+            lot_number=self.lot_number,
+            performed_by_id=self.updated_by_id
+        )
+
+
+class StockMovement(models.Model):
+    """Append-only ledger of every change to stock on hand"""
+    objects = StockMovementManager()  # Assign the custom manager
+    
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='stock_movements')
+    stock_level = models.ForeignKey(StockLevel, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    quantity = models.IntegerField()  # signed: positive adds stock, negative removes it
+    movement_type = models.CharField(max_length=20, choices=[
+        ('receipt', 'Receipt'),
+        ('dispense', 'Dispense'),
+        ('adjustment', 'Adjustment'),
+        ('transfer', 'Transfer'),
+        ('write_off', 'Write-off'),
+    ])
+    lot_number = models.CharField(max_length=100, blank=True)  # kept if the lot row is deleted
+    reference = models.CharField(max_length=100, blank=True)  # e.g. prescription_item:42
+    performed_by = models.ForeignKey('accounts.Personnel', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'id'], name='stock_movement_item_idx'),
+            models.Index(fields=['reference'], name='stock_movement_reference_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_movement_type_display()} {self.quantity:+d} of {self.item_id}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Stock movements are append-only; record a correcting movement instead")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError("Stock movements are append-only; record a correcting movement instead")
+
+
+class StockSnapshot(models.Model):
+    """Item balance up to and including a ledger position
+    
+    Balances are the latest snapshot plus the movements after it, so
+    history never has to be replayed from the start.
+    """
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='stock_snapshots')
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['item', 'last_movement_id']
+        indexes = [
+            models.Index(fields=['item', 'taken_at'], name='stock_snapshot_item_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.item_id}: {self.quantity} as of movement {self.last_movement_id}"
@@ -0,0 +1,140 @@
+from collections import namedtuple
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+
+from .models import InventoryItem, StockLevel, StockMovement, StockSnapshot
+
+Allocation = namedtuple('Allocation', ['stock_level', 'lot_number', 'expiry_date', 'quantity', 'movement'])
+
+
+class InsufficientStock(Exception):
+    """Raised when unexpired active lots cannot cover a request"""
+    
+    def __init__(self, item, requested, available):
+        self.item = item
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Only {available} of {requested} {item.unit_of_measure} of {item.sku} available")
+
+
+def allocate_fefo(item, quantity, movement_type='dispense', reference='', performed_by=None):
+    """Take stock from an item's lots, first expiry first out
+    
+    Runs as one transaction: the item row is locked to serialise allocations
+    of the same item, its lots are locked and read in one query, and the lot
+    decrements, ledger rows and counter update are each written in a single
+    statement. Raises InsufficientStock without changing anything if the
+    unexpired lots cannot cover the quantity.
+    """
+    if quantity <= 0:
+        raise ValueError("Quantity to allocate must be positive")
+    
+    with transaction.atomic():
+        item = InventoryItem.objects.select_for_update().get(pk=item.pk)
+        lots = list(StockLevel.objects.fefo_candidates(item.pk).select_for_update())
+        
+        remaining = quantity
+        taken = []
+        for lot in lots:
+            if not remaining:
+                break
+            take = min(remaining, lot.quantity)
+            lot.quantity -= take
+            remaining -= take
+            taken.append((lot, take))
+        
+        if remaining:
+            raise InsufficientStock(item, quantity, quantity - remaining)
+        
+        StockLevel.objects.bulk_update([lot for lot, _ in taken], ['quantity'])
+        movements = StockMovement.objects.bulk_create([
+            StockMovement(
+                item=item,
+                stock_level=lot,
+                quantity=-take,
+                movement_type=movement_type,
+                lot_number=lot.lot_number,
+                reference=reference,
+                performed_by=performed_by
+            )
+            for lot, take in taken
+        ])
+        InventoryItem.objects.adjust_on_hand(item.pk, -quantity)
+    
+    return [
+        Allocation(lot, lot.lot_number, lot.expiry_date, take, movement)
+        for (lot, take), movement in zip(taken, movements)
+    ]
+
+
+def get_balance(item, as_of=None):
+    """Stock on hand for an item from the ledger, optionally at a past time
+    
+    Starts from the latest snapshot at or before ``as_of`` and adds only the
+    movements recorded after it.
+    """
+    snapshots = StockSnapshot.objects.filter(item=item)
+    movements = StockMovement.objects.filter(item=item)
+    if as_of is not None:
+        snapshots = snapshots.filter(taken_at__lte=as_of)
+        movements = movements.filter(created_at__lte=as_of)
+    
+    snapshot = snapshots.order_by('-last_movement_id').first()
+    if snapshot is not None:
+        movements = movements.filter(id__gt=snapshot.last_movement_id)
+    
+    base = snapshot.quantity if snapshot is not None else 0
+    return base + (movements.aggregate(total=Sum('quantity'))['total'] or 0)
+
+
+def _snapshot_state():
+    latest_snapshot = StockSnapshot.objects.filter(item=OuterRef('pk')).order_by('-last_movement_id')
+    return InventoryItem.objects.annotate(
+        snapshot_quantity=Subquery(latest_snapshot.values('quantity')[:1]),
+        snapshot_movement_id=Subquery(latest_snapshot.values('last_movement_id')[:1]),
+        latest_movement_id=Max('stock_movements__id')
+    ).filter(latest_movement_id__isnull=False).values(
+        'id', 'snapshot_quantity', 'snapshot_movement_id', 'latest_movement_id'
+    )
+
+
+def take_snapshots(batch_size=500):
+    """Snapshot the ledger balance of every item with new movements
+    
+    Each batch of items is row locked before its balances are read.
+    Movements are only written under the item's lock (allocate_fefo,
+    StockLevel.save), so none below a snapshot's last_movement_id can still
+    be uncommitted and later be skipped by get_balance.
+    Returns the number of snapshots written.
+    """
+    pending = [
+        row['id'] for row in _snapshot_state().iterator()
+        if row['snapshot_movement_id'] != row['latest_movement_id']
+    ]
+    
+    written = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        with transaction.atomic():
+            # In primary key order, as StockLevel._lock_items takes them
+            list(InventoryItem.objects.select_for_update().filter(pk__in=batch).order_by('pk').values_list('pk', flat=True))
+            
+            snapshots = []
+            for row in _snapshot_state().filter(pk__in=batch):
+                if row['snapshot_movement_id'] == row['latest_movement_id']:
+                    continue
+                
+                new_quantity = StockMovement.objects.filter(
+                    item_id=row['id'],
+                    id__gt=row['snapshot_movement_id'] or 0,
+                    id__lte=row['latest_movement_id']
+                ).aggregate(total=Sum('quantity'))['total'] or 0
+                
+                snapshots.append(StockSnapshot(
+                    item_id=row['id'],
+                    quantity=(row['snapshot_quantity'] or 0) + new_quantity,
+                    last_movement_id=row['latest_movement_id']
+                ))
+            
+            written += len(StockSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True))
+    return written
@@ -1,3 +1,212 @@
-from django.test import TestCase
+import datetime
+import threading
+import time
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
 
-# Create your tests here.
+from .models import InventoryItem, StockLevel, StockMovement, StockSnapshot
+from .stock import allocate_fefo, get_balance, InsufficientStock, take_snapshots
+
+
+class StockLevelOnHandTests(TestCase):
+    """Saving and deleting lots keeps InventoryItem.quantity_on_hand in step"""
+    
+    def setUp(self):
+        self.item = InventoryItem.objects.create(name='Gauze', sku='GZ-1', unit_of_measure='box', reorder_level=10, unit_cost=1)
+        self.lot = StockLevel.objects.create(item=self.item, quantity=10, lot_number='A')
+    
+    def on_hand(self, item=None):
+        item = item or self.item
+        item.refresh_from_db()
+        return item.quantity_on_hand
+    
+    def test_receipt_and_adjustment(self):
+        self.assertEqual(self.on_hand(), 10)
+        self.lot.quantity = 7
+        self.lot.save()
+        self.assertEqual(self.on_hand(), 7)
+        self.assertEqual(
+            list(StockMovement.objects.filter(item=self.item).order_by('id').values_list('quantity', flat=True)),
+            [10, -3]
+        )
+    
+    def test_partial_save_of_other_fields_leaves_on_hand_alone(self):
+        # A stale quantity in memory is not written by update_fields=['supplier']
+        self.lot.quantity = 500
+        self.lot.supplier = 'Medline'
+        self.lot.save(update_fields=['supplier'])
+        self.assertEqual(self.on_hand(), 10)
+        self.lot.refresh_from_db()
+        self.assertEqual((self.lot.quantity, self.lot.supplier), (10, 'Medline'))
+    
+    def test_deactivating_a_lot(self):
+        self.lot.is_active = False
+        self.lot.save(update_fields=['is_active'])
+        self.assertEqual(self.on_hand(), 0)
+    
+    def test_moving_a_lot_to_another_item(self):
+        other = InventoryItem.objects.create(name='Gauze XL', sku='GZ-2', unit_of_measure='box', reorder_level=10, unit_cost=1)
+        self.lot.item = other
+        self.lot.save()
+        self.assertEqual(self.on_hand(), 0)
+        self.assertEqual(self.on_hand(other), 10)
+    
+    def test_delete_writes_off_the_lot(self):
+        self.lot.delete()
+        self.assertEqual(self.on_hand(), 0)
+
+
+class FefoAllocationTests(TestCase):
+    """allocate_fefo takes the lots that expire first and nothing expired"""
+    
+    def setUp(self):
+        self.today = datetime.date.today()
+        self.item = InventoryItem.objects.create(name='Amoxicillin', sku='AMX', unit_of_measure='capsule', reorder_level=10, unit_cost=1)
+        self.late = self.lot('LATE', 10, days=300)
+        self.soon = self.lot('SOON', 5, days=10)
+        self.expired = self.lot('EXPIRED', 50, days=-1)
+        self.undated = self.lot('UNDATED', 7, days=None)
+    
+    def lot(self, lot_number, quantity, days):
+        expiry_date = self.today + datetime.timedelta(days=days) if days is not None else None
+        return StockLevel.objects.create(item=self.item, quantity=quantity, lot_number=lot_number, expiry_date=expiry_date)
+    
+    def quantities(self):
+        return dict(StockLevel.objects.filter(item=self.item).values_list('lot_number', 'quantity'))
+    
+    def test_first_expiry_first_out(self):
+        allocations = allocate_fefo(self.item, 8, reference='test:1')
+        self.assertEqual([(a.lot_number, a.quantity) for a in allocations], [('SOON', 5), ('LATE', 3)])
+        self.assertEqual(self.quantities(), {'LATE': 7, 'SOON': 0, 'EXPIRED': 50, 'UNDATED': 7})
+    
+    def test_lots_without_expiry_go_last(self):
+        allocations = allocate_fefo(self.item, 20)
+        self.assertEqual([(a.lot_number, a.quantity) for a in allocations], [('SOON', 5), ('LATE', 10), ('UNDATED', 5)])
+    
+    def test_expired_lots_are_never_taken(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            allocate_fefo(self.item, 23)
+        self.assertEqual(raised.exception.available, 22)
+    
+    def test_insufficient_stock_changes_nothing(self):
+        before = self.quantities()
+        movements = StockMovement.objects.count()
+        with self.assertRaises(InsufficientStock):
+            allocate_fefo(self.item, 100)
+        
+        self.assertEqual(self.quantities(), before)
+        self.assertEqual(StockMovement.objects.count(), movements)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity_on_hand, 72)
+    
+    def test_ledger_and_counter_follow_the_allocation(self):
+        allocations = allocate_fefo(self.item, 8, reference='test:1')
+        self.assertEqual(
+            list(StockMovement.objects.for_reference('test:1').values_list('lot_number', 'quantity', 'movement_type')),
+            [('SOON', -5, 'dispense'), ('LATE', -3, 'dispense')]
+        )
+        self.assertEqual([a.movement.stock_level_id for a in allocations], [self.soon.pk, self.late.pk])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity_on_hand, 64)
+        self.assertEqual(get_balance(self.item), 64)
+    
+    def test_quantity_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            allocate_fefo(self.item, 0)
+
+
+class StockSnapshotTests(TestCase):
+    """get_balance from the latest snapshot plus the movements after it"""
+    
+    def setUp(self):
+        self.item = InventoryItem.objects.create(name='Saline', sku='NS-1', unit_of_measure='bag', reorder_level=5, unit_cost=1)
+        self.lot = StockLevel.objects.create(item=self.item, quantity=20, lot_number='A')
+    
+    def test_balance_without_a_snapshot(self):
+        self.assertEqual(get_balance(self.item), 20)
+    
+    def test_snapshot_then_new_movements(self):
+        self.assertEqual(take_snapshots(), 1)
+        snapshot = StockSnapshot.objects.get()
+        self.assertEqual(snapshot.quantity, 20)
+        
+        self.lot.quantity = 12
+        self.lot.save()
+        StockLevel.objects.create(item=self.item, quantity=5, lot_number='B')
+        self.assertEqual(get_balance(self.item), 17)
+        
+        self.assertEqual(take_snapshots(), 1)
+        self.assertEqual(StockSnapshot.objects.order_by('-last_movement_id').first().quantity, 17)
+        self.assertEqual(get_balance(self.item), 17)
+    
+    def test_unchanged_items_are_not_snapshotted_again(self):
+        take_snapshots()
+        self.assertEqual(take_snapshots(), 0)
+    
+    def test_balance_as_of_a_past_time(self):
+        take_snapshots()
+        before_change = timezone.now()
+        self.lot.quantity = 4
+        self.lot.save()
+        take_snapshots()
+        
+        self.assertEqual(get_balance(self.item, as_of=before_change), 20)
+        self.assertEqual(get_balance(self.item), 4)
+    
+    def test_small_batches(self):
+        others = [
+            InventoryItem.objects.create(name=f'Item {i}', sku=f'IT-{i}', unit_of_measure='box', reorder_level=1, unit_cost=1)
+            for i in range(3)
+        ]
+        for i, other in enumerate(others):
+            StockLevel.objects.create(item=other, quantity=i + 1, lot_number='A')
+        
+        self.assertEqual(take_snapshots(batch_size=2), 4)
+        for item in [self.item, *others]:
+            item.refresh_from_db()
+            self.assertEqual(get_balance(item), item.quantity_on_hand)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentStockSnapshotTests(TransactionTestCase):
+    """A snapshot waits for stock edits that hold the item's lock"""
+    
+    def test_snapshot_waits_for_an_open_stock_edit(self):
+        item = InventoryItem.objects.create(name='Saline', sku='NS-1', unit_of_measure='bag', reorder_level=5, unit_cost=1)
+        lot = StockLevel.objects.create(item=item, quantity=20, lot_number='A')
+        edit_started = threading.Event()
+        release_edit = threading.Event()
+        finished = []
+        
+        def edit():
+            try:
+                with transaction.atomic():
+                    lot.quantity = 8
+                    lot.save()
+                    edit_started.set()
+                    release_edit.wait(5)
+                finished.append('edit')
+            finally:
+                connection.close()
+        
+        def snapshot():
+            try:
+                take_snapshots()
+                finished.append('snapshot')
+            finally:
+                connection.close()
+        
+        editor = threading.Thread(target=edit)
+        editor.start()
+        edit_started.wait(5)
+        snapshotter = threading.Thread(target=snapshot)
+        snapshotter.start()
+        time.sleep(0.2)
+        release_edit.set()
+        editor.join()
+        snapshotter.join()
+        
+        self.assertEqual(finished, ['edit', 'snapshot'])
+        self.assertEqual(StockSnapshot.objects.order_by('-last_movement_id').first().quantity, 8)
+        self.assertEqual(get_balance(item), 8)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'krankenhaus.settings')
+# Lets settings pick connection handling and enable streams suited to ASGI
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
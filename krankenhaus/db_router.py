@@ -0,0 +1,156 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Reads inside use_replica() (or ReplicaReadMixin views) may go to a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# Per-request stickiness state, set by ReplicaStickinessMiddleware. A mutable
+# object so writes made in sync_to_async threads are seen by the request.
+_request_state = ContextVar('replica_request_state', default=None)
+
+# alias -> (checked_at, lag_seconds), per process
+_lag_checks = {}
+_lag_lock = threading.Lock()
+
+
+class ReplicaRequestState:
+    """Whether a request must read from the primary to see its own writes"""
+    
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def _options():
+    return getattr(settings, 'READ_REPLICAS', {})
+
+
+def replica_aliases():
+    return [alias for alias in _options().get('DATABASES', []) if alias in connections]
+
+
+def _replica_lag(alias):
+    """Replication lag of a replica in seconds, re-measured at most every LAG_CHECK_SECONDS"""
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_checks.get(alias)
+        if checked is not None and now - checked[0] < _options().get('LAG_CHECK_SECONDS', 5):
+            return checked[1]
+    
+    lag = 0.0
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+                )
+                lag = float(cursor.fetchone()[0])
+        except Exception as e:
+            logger.warning(f"Could not measure replication lag of {alias}: {str(e)}")
+            lag = float('inf')
+    
+    with _lag_lock:
+        _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def primary_required():
+    """Reads must see the primary: the request wrote, or was pinned after a write"""
+    state = _request_state.get()
+    if state is not None and (state.pinned or state.wrote):
+        return True
+    # Reads inside a transaction on the primary belong with its writes
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def read_database():
+    """Alias for a read that tolerates replication lag
+    
+    A random replica lagging less than MAX_LAG_SECONDS, or the primary when
+    there is none or read-your-writes consistency requires it.
+    """
+    if primary_required():
+        return DEFAULT_DB_ALIAS
+    
+    max_lag = _options().get('MAX_LAG_SECONDS', 10)
+    replicas = [alias for alias in replica_aliases() if _replica_lag(alias) <= max_lag]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def prefer_replica(queryset):
+    """Let a queryset's reads go to a replica; writes through it still go to the primary"""
+    queryset._add_hints(replica=True)
+    return queryset
+
+
+@contextmanager
+def use_replica():
+    """Send reads made inside the block to a replica"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def replica_request_state(pinned=False):
+    """Track writes for one request; used by ReplicaStickinessMiddleware"""
+    state = ReplicaRequestState(pinned)
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+class ReplicaReadMixin:
+    """View mixin: GET/HEAD/OPTIONS requests read from a replica"""
+    
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return super().dispatch(request, *args, **kwargs)
+        with use_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """Route opted-in reads to READ_REPLICAS['DATABASES'], everything else to the primary
+    
+    Reads opt in per queryset (prefer_replica, used by the search and
+    reporting managers) or per block/view (use_replica, ReplicaReadMixin).
+    Objects loaded from a replica keep reading related rows there, but
+    saving them always writes to the primary.
+    """
+    
+    def db_for_read(self, model, replica=False, **hints):
+        if replica or _replica_reads.get():
+            return read_database()
+        return None
+    
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in replica_aliases():
+            return False
+        return None
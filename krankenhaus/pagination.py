@@ -0,0 +1,106 @@
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first keyset pagination over (timestamp, id)
+    
+    Each page filters on the last row of the previous one instead of using
+    OFFSET, so deep pages cost the same as the first, and no COUNT(*) runs
+    unless the client asks for it with ?include_count=1. Cursors are signed
+    and opaque to clients.
+    
+    Views pick the timestamp column with ``keyset_ordering_field`` (default
+    created_at); an index on (field, id) makes every page an index range scan.
+    """
+    
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'include_count'
+    max_page_size = 100
+    ordering_field = 'created_at'
+    signing_salt = 'krankenhaus.pagination.keyset'
+    invalid_cursor_message = 'Invalid cursor'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering_field = getattr(view, 'keyset_ordering_field', self.ordering_field)
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) else None
+        
+        queryset = queryset.order_by(f'-{self.ordering_field}', '-id')
+        
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            position, last_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.ordering_field}__lt': position}) |
+                Q(**{self.ordering_field: position, 'id__lt': last_id})
+            )
+        
+        # One extra row tells us whether there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+    
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 20
+        requested = request.query_params.get(self.page_size_query_param)
+        if requested:
+            try:
+                page_size = int(requested)
+            except ValueError:
+                pass
+        return max(1, min(page_size, self.max_page_size))
+    
+    def encode_cursor(self, instance):
+        position = getattr(instance, self.ordering_field)
+        return signing.dumps([position.isoformat(), instance.id], salt=self.signing_salt, compress=True)
+    
+    def decode_cursor(self, cursor):
+        try:
+            position, last_id = signing.loads(cursor, salt=self.signing_salt)
+            position = parse_datetime(position)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, last_id
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+    
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+    
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+    
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'count': {'type': 'integer', 'description': f'Only present with ?{self.count_query_param}=1'},
+                'results': schema,
+            },
+        }
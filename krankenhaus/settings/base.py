@@ -37,6 +37,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 # Middleware
 MIDDLEWARE = [
+    'authentication.middleware.QueryInstrumentationMiddleware',  # first, so every query is counted
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -46,11 +47,21 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'authentication.middleware.JWTAuthenticationMiddleware',
+    'authentication.middleware.ReplicaStickinessMiddleware',  # after JWT, to know who is reading
 ]
 
 # URL and WSGI configuration
 ROOT_URLCONF = 'krankenhaus.urls'
 WSGI_APPLICATION = 'krankenhaus.wsgi.application'
+ASGI_APPLICATION = 'krankenhaus.asgi.application'
+
+# 'asgi' when served through krankenhaus.asgi, which sets it; decides connection
+# handling (production.py) and whether event streams are served
+SERVER_INTERFACE = config('SERVER_INTERFACE', default='wsgi')
+
+# Serve token validation and patient profile/search/detail with async views
+# (only worthwhile when running under ASGI, e.g. uvicorn krankenhaus.asgi:application)
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
 
 # Templates
 TEMPLATES = [
@@ -88,7 +99,7 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'krankenhaus.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     'EXCEPTION_HANDLER': 'authentication.exceptions.custom_exception_handler',
 }
@@ -104,6 +115,46 @@ JWT_SETTINGS = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('authentication.jwt_handler.CustomJWTHandler',),
+    # Build request.user from the token claims instead of loading auth_user
+    'STATELESS_PRINCIPAL': config('JWT_STATELESS_PRINCIPAL', default=False, cast=bool),
+    'USER_STATE_CACHE_TIMEOUT': 30,  # seconds an is_active check is trusted
+}
+
+# Read replicas (krankenhaus.db_router): aliases in DATABASES that replicate 'default'.
+# Search and reporting reads go to them; writes and read-your-writes stay on the primary.
+DATABASE_ROUTERS = ['krankenhaus.db_router.ReplicaRouter']
+READ_REPLICAS = {
+    'DATABASES': [],  # filled in by environment-specific settings
+    'STICKY_SECONDS': 15,  # a user who wrote reads from the primary for this long; at least MAX_LAG_SECONDS + LAG_CHECK_SECONDS
+    'MAX_LAG_SECONDS': 10,  # replicas further behind than this are skipped
+    'LAG_CHECK_SECONDS': 5,  # how often each worker re-measures a replica's lag
+}
+
+# Per-request SQL instrumentation (authentication.middleware.QueryInstrumentationMiddleware)
+QUERY_INSTRUMENTATION = {
+    'ENABLED': config('QUERY_INSTRUMENTATION_ENABLED', default=True, cast=bool),
+    'HEADERS': True,  # X-Query-Count, X-Query-Time-Ms, X-Query-Duplicates
+    'DUPLICATE_THRESHOLD': 3,  # identical statements in one request flagged as a possible N+1
+    'DEFAULT_BUDGET': None,  # max queries for views without their own budget
+    'BUDGETS': {  # keyed by URL name
+        'accounts:patient-search': 4,
+        'accounts:patient-detail': 4,
+        'accounts:patient-profile': 3,
+        'accounts:emergency-access-log': 3,
+    },
+    'RAISE_ON_BUDGET_EXCEEDED': config('QUERY_BUDGET_STRICT', default=False, cast=bool),
+}
+
+# Audit trail (authentication.audit): events are buffered in memory and
+# written in batches by a background thread, spilling to disk while the
+# database is unavailable
+AUDIT_LOG = {
+    'BUFFERED': config('AUDIT_LOG_BUFFERED', default=True, cast=bool),  # False writes each event inline
+    'BATCH_SIZE': 200,  # flush as soon as this many events are waiting
+    'FLUSH_INTERVAL_SECONDS': 2.0,  # ...and at least this often
+    'MAX_BUFFERED': 10000,  # beyond this, events go straight to the spill file
+    'SPILL_DIR': config('AUDIT_SPILL_DIR', default=os.path.join(BASE_DIR, 'audit_spill')),
+    'PARTITION_MONTHS_AHEAD': 3,  # monthly partitions kept ready on PostgreSQL
 }
 
 # Email settings for OTP
@@ -252,12 +303,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 HOSPITAL_SETTINGS = {
     'OTP_EXPIRY_MINUTES': 10,
     'PASSWORD_RESET_OTP_EXPIRY_MINUTES': 15,
+    'OTP_MAX_ATTEMPTS': 5,  # wrong guesses before an OTP is burned
     'MAX_LOGIN_ATTEMPTS': 5,
     'LOGIN_LOCKOUT_DURATION_MINUTES': 30,
     'PATIENT_ID_PREFIX': 'HMS',
     'EMPLOYEE_ID_PREFIX': 'EMP',
+    'PATIENT_ID_BLOCK_SIZE': 100,  # IDs reserved per process at a time
+    'EMPLOYEE_ID_BLOCK_SIZE': 5,  # kept small: only 9,999 employee IDs a year
     'APPOINTMENT_BOOKING_DAYS_ADVANCE': 30,
+    'AVAILABILITY_CACHE_TIMEOUT': 300,  # seconds a department's free slots for a day stay cached
     'EMERGENCY_ACCESS_TIMEOUT_HOURS': 2,
+    'EMERGENCY_MATCH_MAX_CANDIDATES': 500,  # rows scored per emergency lookup
+    'EMERGENCY_MATCH_AUTO_SELECT_SCORE': 0.9,  # best score needed to open a record without a patient ID
+    'EMERGENCY_MATCH_MIN_MARGIN': 0.1,  # lead the best match needs over the runner-up
+    'PATIENT_SUMMARY_CACHE_TIMEOUT': 60 * 60 * 24,  # summaries are refreshed on change, this only bounds memory
+    'PATIENT_SUMMARY_CRITICAL_LAB_DAYS': 30,  # how far back critical lab results appear in a summary
+    'LAB_QUEUE_CLAIM_TIMEOUT_MINUTES': 30,  # an unfinished claim is returned to the queue after this
+    'LAB_NOTIFICATION_BROKER': config('LAB_NOTIFICATION_BROKER', default='memory'),  # 'redis' when running several workers
+    'LAB_NOTIFICATION_REDIS_URL': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+    'LAB_NOTIFICATION_HEARTBEAT_SECONDS': 15,  # keep-alive comments on idle event streams
+    'EMAIL_OUTBOX_MAX_ATTEMPTS': 5,
+    'EMAIL_OUTBOX_RETRY_BASE_SECONDS': 30,  # doubled after each failed attempt
+    'EMAIL_OUTBOX_RETRY_MAX_SECONDS': 60 * 60,
 }
 
 # Environment-specific settings
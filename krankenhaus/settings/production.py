@@ -9,6 +9,20 @@ DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='').split(',')
 
 # Database
+# Which setting keeps connections warm depends on the server:
+# - WSGI (gunicorn krankenhaus.wsgi): connections are kept open between
+#   requests (DB_CONN_MAX_AGE, checked before reuse) so a request does not
+#   pay for a TCP/TLS/auth handshake.
+# - ASGI (uvicorn krankenhaus.asgi, which sets SERVER_INTERFACE=asgi): sync
+#   ORM calls run in per-request threads, so persistent connections are
+#   never reused and pile up until max_connections. DB_CONN_MAX_AGE
+#   defaults to 0 there; use DB_POOL for reuse.
+# DB_POOL=true uses psycopg 3's connection pool under either server (needs
+# psycopg[pool] installed in place of psycopg2); pooling requires
+# CONN_MAX_AGE 0. Pool sizes are per worker process, so size them against
+# max_connections / workers.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -17,14 +31,44 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else config(
+            'DB_CONN_MAX_AGE', default=0 if SERVER_INTERFACE == 'asgi' else 600, cast=int
+        ),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+        },
     }
 }
 
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),  # seconds to wait for a free connection
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+    }
+
+# Read replicas: comma-separated hosts sharing the primary's credentials
+for index, replica_host in enumerate(host.strip() for host in config('DB_REPLICA_HOSTS', default='').split(',') if host.strip()):
+    replica_alias = f'replica_{index + 1}'
+    DATABASES[replica_alias] = dict(
+        DATABASES['default'],
+        HOST=replica_host,
+        OPTIONS=dict(DATABASES['default']['OPTIONS']),
+        TEST={'MIRROR': 'default'},
+    )
+    READ_REPLICAS['DATABASES'].append(replica_alias)
+
 # JWT Settings
 JWT_SECRET_KEY = SECRET_KEY
 JWT_ACCESS_TOKEN_LIFETIME = timedelta(minutes=config('JWT_ACCESS_MINUTES', default=15, cast=int))
 JWT_REFRESH_TOKEN_LIFETIME = timedelta(days=config('JWT_REFRESH_DAYS', default=1, cast=int))
 
+# Query instrumentation: keep the logs, but don't advertise query counts publicly
+QUERY_INSTRUMENTATION['HEADERS'] = config('QUERY_INSTRUMENTATION_HEADERS', default=False, cast=bool)
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -46,5 +90,8 @@ SECURE_HSTS_PRELOAD = True
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 
+# Audit events spilled while the database is down; must survive restarts
+AUDIT_LOG['SPILL_DIR'] = config('AUDIT_SPILL_DIR', default='/var/lib/krankenhaus/audit-spill')
+
 # Logging
 LOGGING['handlers']['file']['filename'] = config('LOG_FILE', default='/var/log/krankenhaus/krankenhaus.log')
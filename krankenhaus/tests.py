@@ -0,0 +1,87 @@
+import datetime
+from urllib.parse import parse_qs, urlparse
+from django.core import signing
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .pagination import KeysetPagination
+from accounts.models import Department
+
+
+class KeysetPaginationTests(TestCase):
+    """KeysetPagination pages newest first on (created_at, id)"""
+    
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        # Three departments share a timestamp, so only the id tells them apart
+        instant = timezone.now().replace(microsecond=0)
+        self.departments = [Department.objects.create(name=f'Department {i}') for i in range(5)]
+        for department, minutes in zip(self.departments, [0, 0, 0, -1, 1]):
+            Department.objects.filter(pk=department.pk).update(created_at=instant + datetime.timedelta(minutes=minutes))
+    
+    def paginate(self, **params):
+        paginator = KeysetPagination()
+        request = Request(self.factory.get('/departments/', params))
+        page = paginator.paginate_queryset(Department.objects.all(), request)
+        return paginator, [department.pk for department in page]
+    
+    def cursor_from(self, paginator):
+        next_link = paginator.get_next_link()
+        return parse_qs(urlparse(next_link).query)['cursor'][0] if next_link else None
+    
+    def walk(self, page_size, max_pages=20):
+        seen = []
+        cursor = None
+        for _ in range(max_pages):
+            paginator, page = self.paginate(page_size=page_size, **({'cursor': cursor} if cursor else {}))
+            seen.extend(page)
+            cursor = self.cursor_from(paginator)
+            if cursor is None:
+                return seen
+        self.fail(f'Still paging after {max_pages} pages of {page_size}')
+    
+    def test_newest_first_with_ties_by_id(self):
+        _, page = self.paginate(page_size=10)
+        first, second, third, older, newer = [department.pk for department in self.departments]
+        self.assertEqual(page, [newer, third, second, first, older])
+    
+    def test_cursor_round_trip_splits_ties(self):
+        everything = self.paginate(page_size=10)[1]
+        for page_size in (1, 2, 3):
+            self.assertEqual(self.walk(page_size), everything, page_size)
+    
+    def test_cursor_decodes_to_the_last_row(self):
+        paginator, page = self.paginate(page_size=2)
+        last = Department.objects.get(pk=page[-1])
+        self.assertEqual(paginator.decode_cursor(self.cursor_from(paginator)), (last.created_at, last.pk))
+    
+    def test_tampered_cursor_is_refused(self):
+        paginator, _ = self.paginate(page_size=2)
+        cursor = self.cursor_from(paginator)
+        tampered = cursor[:-2] + ('AA' if not cursor.endswith('AA') else 'BB')
+        with self.assertRaises(NotFound):
+            self.paginate(cursor=tampered)
+        signed_elsewhere = signing.dumps([timezone.now().isoformat(), 1], salt='another.salt', compress=True)
+        with self.assertRaises(NotFound):
+            self.paginate(cursor=signed_elsewhere)
+        not_a_time = signing.dumps(['yesterday', 1], salt=KeysetPagination.signing_salt, compress=True)
+        with self.assertRaises(NotFound):
+            self.paginate(cursor=not_a_time)
+    
+    def test_last_page_has_no_next_link(self):
+        paginator, page = self.paginate(page_size=5)
+        self.assertEqual(len(page), 5)
+        self.assertIsNone(paginator.get_next_link())
+    
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.paginate(page_size=0)[1]), 1)
+        self.assertEqual(self.paginate(page_size=1000)[0].page_size, KeysetPagination.max_page_size)
+    
+    def test_count_only_on_request(self):
+        paginator, _ = self.paginate(page_size=2)
+        self.assertNotIn('count', paginator.get_paginated_response([]).data)
+        paginator, _ = self.paginate(page_size=2, include_count=1)
+        self.assertEqual(paginator.get_paginated_response([]).data['count'], 5)
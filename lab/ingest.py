@@ -0,0 +1,327 @@
+import csv
+import re
+from collections import namedtuple
+from datetime import datetime
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import LabOrder, LabOrderItem, LabResult
+from .notifications import schedule_critical_notifications
+from medical_records.summary import schedule_summary_refresh
+
+ParsedResult = namedtuple('ParsedResult', [
+    'line_number', 'order_number', 'test_code', 'value', 'unit',
+    'reference_range', 'flag', 'collected_at', 'notes'
+])
+
+# Results further outside the normal range than this share of its width are critical
+CRITICAL_DEVIATION = 0.5
+
+# HL7 abnormal flags (OBX-8) that decide the status outright
+HL7_FLAG_STATUSES = {
+    'N': 'normal',
+    'H': 'abnormal',
+    'L': 'abnormal',
+    'A': 'abnormal',
+    'HH': 'critical',
+    'LL': 'critical',
+    'AA': 'critical',
+}
+
+MAX_REPORTED_PROBLEMS = 100
+
+_NUMBER = r'[-+]?\d+(?:\.\d+)?'
+_RANGE = re.compile(rf'^\s*({_NUMBER})\s*(?:-|–|to)\s*({_NUMBER})')
+_UPPER = re.compile(rf'^\s*(?:<|<=|≤)\s*({_NUMBER})')
+_LOWER = re.compile(rf'^\s*(?:>|>=|≥)\s*({_NUMBER})')
+
+
+class ImportFormatError(Exception):
+    """Raised when a result file is not in the expected format"""
+    pass
+
+
+class ImportReport:
+    """Running totals for an import; keeps only a bounded sample of problems"""
+    
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.critical = 0
+        self.abnormal = 0
+        self.skipped = 0
+        self.problems = []
+    
+    def problem(self, line_number, message):
+        self.skipped += 1
+        if len(self.problems) < MAX_REPORTED_PROBLEMS:
+            self.problems.append({'line': line_number, 'error': message})
+    
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'critical': self.critical,
+            'abnormal': self.abnormal,
+            'skipped': self.skipped,
+            'problems': self.problems,
+        }
+
+
+def _parse_timestamp(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None and value.isdigit() and len(value) in (8, 12, 14):
+        # HL7 DTM: YYYYMMDD[HHMM[SS]]
+        parsed = datetime.strptime(value, {8: '%Y%m%d', 12: '%Y%m%d%H%M', 14: '%Y%m%d%H%M%S'}[len(value)])
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_csv(lines):
+    """Yield results from CSV with order_number, test_code and value columns
+    
+    Optional columns: unit, reference_range, flag, collected_at, notes.
+    """
+    reader = csv.DictReader(lines)
+    missing = {'order_number', 'test_code', 'value'} - set(reader.fieldnames or [])
+    if missing:
+        raise ImportFormatError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    
+    for row in reader:
+        yield ParsedResult(
+            line_number=reader.line_num,
+            order_number=(row.get('order_number') or '').strip(),
+            test_code=(row.get('test_code') or '').strip(),
+            value=(row.get('value') or '').strip(),
+            unit=(row.get('unit') or '').strip(),
+            reference_range=(row.get('reference_range') or '').strip(),
+            flag=(row.get('flag') or '').strip().upper(),
+            collected_at=row.get('collected_at'),
+            notes=(row.get('notes') or '').strip()
+        )
+
+
+def parse_hl7(lines):
+    """Yield results from a pipe-delimited, HL7-like export
+    
+    ORC|<order_number> starts an order; each following
+    OBX|<seq>|<test_code>|<value>|<unit>|<reference_range>|<flag>|<observed_at>
+    is a result for it. Other segments are ignored.
+    """
+    order_number = ''
+    for line_number, line in enumerate(lines, start=1):
+        fields = line.rstrip('\r\n').split('|')
+        segment = fields[0].strip().upper()
+        if segment == 'ORC':
+            order_number = fields[1].strip() if len(fields) > 1 else ''
+        elif segment == 'OBX':
+            fields += [''] * (8 - len(fields))
+            yield ParsedResult(
+                line_number=line_number,
+                order_number=order_number,
+                test_code=fields[2].strip(),
+                value=fields[3].strip(),
+                unit=fields[4].strip(),
+                reference_range=fields[5].strip(),
+                flag=fields[6].strip().upper(),
+                collected_at=fields[7],
+                notes=''
+            )
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'hl7': parse_hl7,
+}
+
+
+def parse_normal_range(normal_range):
+    """(low, high) bounds from text such as "3.5-5.0 mmol/L", "<200" or ">60"; either may be None"""
+    text = (normal_range or '').replace(',', '.')
+    match = _RANGE.match(text)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    match = _UPPER.match(text)
+    if match:
+        return None, float(match.group(1))
+    match = _LOWER.match(text)
+    if match:
+        return float(match.group(1)), None
+    return None, None
+
+
+def classify_result(value, normal_range, flag=''):
+    """normal, abnormal or critical; blank when a non-numeric value cannot be judged"""
+    if flag in HL7_FLAG_STATUSES:
+        return HL7_FLAG_STATUSES[flag]
+    
+    try:
+        number = float(value)
+    except ValueError:
+        return ''
+    
+    low, high = parse_normal_range(normal_range)
+    if low is None and high is None:
+        return ''
+    
+    if low is not None and high is not None:
+        margin = (high - low) * CRITICAL_DEVIATION
+    else:
+        margin = abs(high if high is not None else low) * CRITICAL_DEVIATION
+    
+    if low is not None and number < low:
+        return 'critical' if number < low - margin else 'abnormal'
+    if high is not None and number > high:
+        return 'critical' if number > high + margin else 'abnormal'
+    return 'normal'
+
+
+def _chunks(results, size):
+    chunk = []
+    for result in results:
+        chunk.append(result)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _import_chunk(chunk, report, performed_by, dry_run):
+    order_numbers = {result.order_number for result in chunk}
+    test_codes = {result.test_code for result in chunk}
+    
+    # One lookup for the whole chunk instead of one per row
+    items = {
+        (item.lab_order.order_number, item.test_type.code): item
+        for item in LabOrderItem.objects.filter(
+            lab_order__order_number__in=order_numbers,
+            test_type__code__in=test_codes
+        ).select_related('lab_order', 'test_type')
+    }
+    already_resulted = set(
+        LabResult.objects.filter(lab_order_item__in=[item.pk for item in items.values()]).values_list(
+            'lab_order_item_id', flat=True
+        )
+    )
+    
+    now = timezone.now()
+    pending = []
+    for parsed in chunk:
+        if not parsed.order_number or not parsed.test_code or not parsed.value:
+            report.problem(parsed.line_number, 'order number, test code and value are required')
+            continue
+        
+        item = items.get((parsed.order_number, parsed.test_code))
+        if item is None:
+            report.problem(parsed.line_number, f'no {parsed.test_code} test on order {parsed.order_number}')
+            continue
+        if item.status == 'cancelled':
+            report.problem(parsed.line_number, f'{parsed.test_code} on order {parsed.order_number} is cancelled')
+            continue
+        if item.pk in already_resulted:
+            report.problem(parsed.line_number, f'{parsed.test_code} on order {parsed.order_number} already has a result')
+            continue
+        
+        try:
+            collected_at = _parse_timestamp(parsed.collected_at)
+        except ValueError:
+            report.problem(parsed.line_number, f'invalid timestamp {parsed.collected_at!r}')
+            continue
+        
+        reference_range = parsed.reference_range or item.test_type.normal_range
+        pending.append((parsed.line_number, LabResult(
+            lab_order_item=item,
+            performed_by=performed_by,
+            result_value=parsed.value,
+            result_unit=parsed.unit or item.test_type.unit,
+            reference_range=reference_range[:200],
+            result_status=classify_result(parsed.value, reference_range, parsed.flag),
+            notes=parsed.notes,
+            sample_collected_at=collected_at
+        )))
+        already_resulted.add(item.pk)
+    
+    if not pending:
+        return
+    
+    accepted = []
+    try:
+        with transaction.atomic():
+            # Lock the items and look again: a result saved since the read
+            # above, say by a parallel import, would break the one-to-one
+            item_ids = sorted(result.lab_order_item_id for _, result in pending)
+            list(LabOrderItem.objects.select_for_update().filter(pk__in=item_ids).order_by('pk').values_list('pk', flat=True))
+            resulted_since = set(
+                LabResult.objects.filter(lab_order_item__in=item_ids).values_list('lab_order_item_id', flat=True)
+            )
+            
+            completed_items = []
+            for line_number, result in pending:
+                item = result.lab_order_item
+                if item.pk in resulted_since:
+                    report.problem(line_number, f'{item.test_type.code} on order {item.lab_order.order_number} already has a result')
+                    continue
+                accepted.append((line_number, result))
+                item.status = 'completed'
+                item.completed_at = now
+                completed_items.append(item)
+            
+            if not accepted:
+                return
+            
+            results = [result for _, result in accepted]
+            LabResult.objects.bulk_create(results)
+            LabOrderItem.objects.bulk_update(completed_items, ['status', 'completed_at'])
+            
+            # Orders with every test completed or cancelled are complete
+            order_ids = {item.lab_order_id for item in completed_items}
+            orders = LabOrder.objects.filter(pk__in=order_ids).annotate(
+                open_items=Count('test_items', filter=~Q(test_items__status__in=['completed', 'cancelled']))
+            ).values_list('pk', 'open_items')
+            finished = [order_id for order_id, open_items in orders if not open_items]
+            LabOrder.objects.filter(pk__in=finished).update(status='completed')
+            LabOrder.objects.filter(pk__in=order_ids - set(finished)).exclude(status='cancelled').update(status='in_progress')
+            
+            # bulk_create skips the LabResult signals; refresh summaries and notify directly
+            for patient_id in {item.lab_order.patient_id for item in completed_items}:
+                schedule_summary_refresh(patient_id, 'critical_lab_results')
+            schedule_critical_notifications(result.pk for result in results if result.result_status == 'critical')
+            
+            if dry_run:
+                transaction.set_rollback(True)
+    except IntegrityError:
+        # Saved by something that does not take the item locks; nothing in
+        # this chunk was written, so report every row for re-import
+        for line_number, result in accepted:
+            report.problem(line_number, f'a result for order {result.lab_order_item.lab_order.order_number} was saved during the import; import the row again')
+        return
+    
+    report.imported += len(results)
+    report.critical += sum(1 for result in results if result.result_status == 'critical')
+    report.abnormal += sum(1 for result in results if result.result_status == 'abnormal')
+
+
+def import_results(lines, file_format='csv', performed_by=None, chunk_size=500, dry_run=False):
+    """Import analyser results from an iterable of text lines
+    
+    Lines are parsed lazily and handled ``chunk_size`` rows at a time: each
+    chunk costs a fixed number of queries (matching, bulk insert, bulk
+    status updates) and is committed on its own, so memory use does not
+    grow with the file. Rows that cannot be matched are skipped and
+    reported. Returns an ImportReport.
+    """
+    if file_format not in PARSERS:
+        raise ImportFormatError(f"Unknown format {file_format!r}")
+    
+    report = ImportReport()
+    for chunk in _chunks(PARSERS[file_format](lines), chunk_size):
+        report.rows += len(chunk)
+        _import_chunk(chunk, report, performed_by, dry_run)
+    return report
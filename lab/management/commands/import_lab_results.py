@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Personnel
+from lab.ingest import PARSERS, ImportFormatError, import_results
+
+
+class Command(BaseCommand):
+    help = 'Import analyser result exports (CSV or pipe-delimited HL7-like) in streaming chunks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Result file exported by the analyser')
+        parser.add_argument('--format', choices=sorted(PARSERS), default=None,
+                            help='File format (default: from the extension, .csv or .hl7)')
+        parser.add_argument('--performed-by',
+                            help='Employee ID recorded as performing the tests')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Rows matched and inserted per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Match and validate without saving anything')
+    
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('hl7' if options['path'].lower().endswith(('.hl7', '.txt')) else 'csv')
+        
+        performed_by = None
+        if options['performed_by']:
+            performed_by = Personnel.objects.filter(employee_id=options['performed_by']).first()
+            if performed_by is None:
+                raise CommandError(f"No personnel with employee ID {options['performed_by']}")
+        
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as lines:
+                report = import_results(
+                    lines,
+                    file_format=file_format,
+                    performed_by=performed_by,
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run']
+                )
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        
+        for problem in report.problems:
+            self.stdout.write(self.style.WARNING(f"Line {problem['line']}: {problem['error']}"))
+        
+        action = 'would import' if options['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.rows} rows read, {action} {report.imported} '
+            f'({report.critical} critical, {report.abnormal} abnormal), skipped {report.skipped}'
+        ))
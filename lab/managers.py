@@ -1,6 +1,11 @@
 from django.db import models
 from django.utils import timezone
 from django.db.models import Q  # Added for search_tests
+from krankenhaus.db_router import prefer_replica
+
+# Item statuses still waiting for a technician
+QUEUED_STATUSES = ['pending', 'collected']
+
 
 class LabOrderManager(models.Manager):
     def pending_orders(self):
@@ -44,9 +49,18 @@ class LabTestTypeManager(models.Manager):
     
     def search_tests(self, query):
         """Search test types"""
-        return self.filter(
+        return prefer_replica(self.filter(
             Q(name__icontains=query) |
             Q(code__icontains=query) |
             Q(category__icontains=query),
             is_active=True
-        )
+        ))
+
+
+class LabOrderItemManager(models.Manager):
+    def queued(self, sample_type=None):
+        """Get items waiting for a technician, STAT first, then urgent, then oldest"""
+        items = self.filter(status__in=QUEUED_STATUSES)
+        if sample_type:
+            items = items.filter(sample_type=sample_type)
+        return items.order_by('priority_rank', 'queued_at', 'id')
@@ -1,6 +1,10 @@
 from django.db import models
+from django.utils import timezone
 
-from .managers import LabTestTypeManager, LabOrderManager  # Import managers
+from .managers import LabTestTypeManager, LabOrderManager, LabOrderItemManager, QUEUED_STATUSES  # Import managers
+
+# Queue order: lower rank is worked first
+PRIORITY_RANKS = {'stat': 0, 'urgent': 1, 'routine': 2}
 
 class LabTestType(models.Model):
     objects = LabTestTypeManager()  # Assign the custom manager
@@ -52,10 +56,24 @@ class LabOrder(models.Model):
     
     clinical_notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='lab_order_keyset_idx'),
+            models.Index(fields=['patient', 'order_date', 'id'], name='lab_order_timeline_idx'),
+        ]
+    
     def __str__(self):
         return f"Lab Order {self.order_number} for {self.patient.patient_id}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Items carry the order's priority so the work queue needs no join
+        rank = PRIORITY_RANKS.get(self.priority, PRIORITY_RANKS['routine'])
+        self.test_items.exclude(priority_rank=rank).update(priority_rank=rank)
 
 class LabOrderItem(models.Model):
+    objects = LabOrderItemManager()  # Assign the custom manager
+    
     lab_order = models.ForeignKey(LabOrder, on_delete=models.CASCADE, related_name='test_items')
     test_type = models.ForeignKey(LabTestType, on_delete=models.CASCADE)
     
@@ -67,8 +85,44 @@ class LabOrderItem(models.Model):
         ('cancelled', 'Cancelled'),
     ], default='pending')
     
+    # Copied from the order and test type so the work queue reads one table
+    priority_rank = models.PositiveSmallIntegerField(default=PRIORITY_RANKS['routine'], editable=False)
+    sample_type = models.CharField(max_length=100, blank=True, editable=False)
+    queued_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    claimed_by = models.ForeignKey('accounts.Personnel', on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_lab_items')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Partial: only items still in the queue are indexed
+            models.Index(
+                fields=['priority_rank', 'queued_at', 'id'],
+                name='lab_item_queue_idx',
+                condition=models.Q(status__in=QUEUED_STATUSES)
+            ),
+            models.Index(
+                fields=['sample_type', 'priority_rank', 'queued_at', 'id'],
+                name='lab_item_sample_queue_idx',
+                condition=models.Q(status__in=QUEUED_STATUSES)
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.test_type.name} for order {self.lab_order.order_number}"
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.priority_rank = PRIORITY_RANKS.get(self.lab_order.priority, PRIORITY_RANKS['routine'])
+            self.sample_type = self.test_type.sample_type
+            self.queued_at = self.lab_order.order_date or timezone.now()
+        if self.status == 'completed' and self.completed_at is None:
+            self.completed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'completed_at' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['completed_at']
+        super().save(*args, **kwargs)
 
 class LabResult(models.Model):
     lab_order_item = models.OneToOneField(LabOrderItem, on_delete=models.CASCADE, related_name='result')
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import threading
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import LabResult
+from accounts.models import Personnel
+
+logger = logging.getLogger(__name__)
+
+# Events waiting for a slow subscriber before the oldest are dropped
+MAX_PENDING_EVENTS = 100
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def personnel_channel(personnel_id):
+    return f"lab_critical_results_{personnel_id}"
+
+
+def _offer(queue, message):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class InProcessSubscription:
+    """A subscriber's queue, filled from the thread that publishes"""
+    
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+    
+    async def get(self, timeout):
+        """Next message, or None if nothing arrived within ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+    
+    async def close(self):
+        self.broker._remove(self)
+
+
+class InProcessBroker:
+    """Fans messages out to subscribers in this process only
+    
+    Enough for development and single-worker deployments; with several
+    workers a result saved by one is never seen by clients of another.
+    """
+    
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+    
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        # Publishers run in sync code on any thread; hand over to each subscriber's loop
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(_offer, subscription.queue, message)
+    
+    async def subscribe(self, channels):
+        subscription = InProcessSubscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+    
+    def _remove(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+
+class RedisSubscription:
+    """A Redis pub/sub connection for one subscriber"""
+    
+    def __init__(self, client, pubsub):
+        self.client = client
+        self.pubsub = pubsub
+    
+    async def get(self, timeout):
+        """Next message, or None if nothing arrived within ``timeout`` seconds"""
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        data = message['data']
+        return data.decode() if isinstance(data, bytes) else data
+    
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisBroker:
+    """Redis pub/sub, so every worker sees every published event"""
+    
+    def __init__(self, url):
+        import redis  # Only needed when this broker is configured
+        
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+    
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+    
+    async def subscribe(self, channels):
+        from redis import asyncio as aioredis
+        
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*channels)
+        return RedisSubscription(client, pubsub)
+
+
+def get_broker():
+    """The broker named by HOSPITAL_SETTINGS['LAB_NOTIFICATION_BROKER']"""
+    global _broker
+    
+    with _broker_lock:
+        if _broker is None:
+            if settings.HOSPITAL_SETTINGS.get('LAB_NOTIFICATION_BROKER', 'memory') == 'redis':
+                _broker = RedisBroker(settings.HOSPITAL_SETTINGS['LAB_NOTIFICATION_REDIS_URL'])
+            else:
+                _broker = InProcessBroker()
+    return _broker
+
+
+def critical_result_event(result):
+    item = result.lab_order_item
+    order = item.lab_order
+    patient = order.patient
+    return {
+        'result_id': result.pk,
+        'order_number': order.order_number,
+        'priority': order.priority,
+        'patient_id': patient.patient_id,
+        'patient_name': f"{patient.user.first_name} {patient.user.last_name}".strip(),
+        'test': item.test_type.name,
+        'value': result.result_value,
+        'unit': result.result_unit,
+        'reference_range': result.reference_range,
+        'result_date': result.result_date,
+    }
+
+
+def notify_critical_results(result_ids):
+    """Publish critical results to the ordering doctors and on-call staff
+    
+    Costs two queries however many results are sent. Delivery problems are
+    logged rather than raised: the results themselves are already saved.
+    """
+    results = list(
+        LabResult.objects.filter(pk__in=result_ids, result_status='critical').select_related(
+            'lab_order_item__test_type', 'lab_order_item__lab_order__patient__user'
+        )
+    )
+    if not results:
+        return
+    
+    on_call = list(Personnel.objects.filter(is_on_call=True, is_active=True).values_list('pk', flat=True))
+    broker = get_broker()
+    
+    for result in results:
+        message = json.dumps(critical_result_event(result), cls=DjangoJSONEncoder)
+        recipients = set(on_call)
+        if result.lab_order_item.lab_order.ordered_by_id:
+            recipients.add(result.lab_order_item.lab_order.ordered_by_id)
+        
+        for personnel_id in recipients:
+            try:
+                broker.publish(personnel_channel(personnel_id), message)
+            except Exception as e:
+                logger.error(f"Could not publish critical result {result.pk} to personnel {personnel_id}: {str(e)}")
+
+
+def schedule_critical_notifications(result_ids):
+    """Notify once the current transaction commits, so rolled back results are never sent"""
+    result_ids = list(result_ids)
+    if result_ids:
+        transaction.on_commit(lambda: notify_critical_results(result_ids))
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import PRIORITY_RANKS, LabOrderItem
+
+PRIORITY_NAMES = {rank: name for name, rank in PRIORITY_RANKS.items()}
+
+
+class QueueError(Exception):
+    """Raised when a queue item cannot be claimed or released"""
+    pass
+
+
+def _claim_cutoff():
+    minutes = settings.HOSPITAL_SETTINGS.get('LAB_QUEUE_CLAIM_TIMEOUT_MINUTES', 30)
+    return timezone.now() - timedelta(minutes=minutes)
+
+
+def _claimable():
+    # Unclaimed, or claimed by someone who has since gone quiet
+    return Q(claimed_at__isnull=True) | Q(claimed_at__lt=_claim_cutoff())
+
+
+def queue_items(sample_type=None):
+    """Items available to claim, in the order they should be worked"""
+    return LabOrderItem.objects.queued(sample_type).filter(_claimable())
+
+
+def claim_next(technician, sample_type=None, limit=1):
+    """Claim the next items from the queue for a technician
+    
+    Candidate rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    technicians polling at the same time each get different items instead
+    of queueing behind one another's locks. The claim itself is a
+    conditional UPDATE as well, which keeps databases without SKIP LOCKED
+    from handing out an item twice. Returns the claimed items.
+    """
+    now = timezone.now()
+    claimed = []
+    
+    with transaction.atomic():
+        candidates = list(
+            queue_items(sample_type).select_for_update(skip_locked=True, of=('self',)).values_list('id', flat=True)[:limit]
+        )
+        for item_id in candidates:
+            updated = LabOrderItem.objects.filter(pk=item_id).filter(_claimable()).update(
+                claimed_by=technician,
+                claimed_at=now
+            )
+            if updated:
+                claimed.append(item_id)
+    
+    return list(
+        LabOrderItem.objects.filter(pk__in=claimed).select_related(
+            'lab_order__patient', 'test_type', 'claimed_by'
+        ).order_by('priority_rank', 'queued_at', 'id')
+    )
+
+
+def release_item(item_id, technician):
+    """Hand a claimed item back to the queue"""
+    released = LabOrderItem.objects.filter(pk=item_id, claimed_by=technician).update(
+        claimed_by=None,
+        claimed_at=None
+    )
+    if not released:
+        raise QueueError("Item is not claimed by you")
+
+
+def queue_depth(sample_type=None):
+    """Number of claimable items per priority"""
+    counts = {name: 0 for name in PRIORITY_RANKS}
+    rows = queue_items(sample_type).order_by().values('priority_rank').annotate(count=Count('id'))
+    for row in rows:
+        counts[PRIORITY_NAMES.get(row['priority_rank'], 'routine')] += row['count']
+    return counts
+
+
+def turnaround_times(start, end, priority=None):
+    """Queue-to-completion turnaround for items completed in a period
+    
+    Returns {priority: {'count', 'mean_minutes', 'p90_minutes', 'max_minutes'}}.
+    """
+    items = LabOrderItem.objects.filter(
+        completed_at__gte=start,
+        completed_at__lt=end,
+        queued_at__isnull=False
+    )
+    if priority:
+        items = items.filter(priority_rank=PRIORITY_RANKS[priority])
+    
+    durations = {}
+    for rank, queued_at, completed_at in items.values_list('priority_rank', 'queued_at', 'completed_at').iterator():
+        durations.setdefault(PRIORITY_NAMES.get(rank, 'routine'), []).append(
+            (completed_at - queued_at).total_seconds() / 60
+        )
+    
+    report = {}
+    for name, minutes in durations.items():
+        minutes.sort()
+        report[name] = {
+            'count': len(minutes),
+            'mean_minutes': round(sum(minutes) / len(minutes), 1),
+            'p90_minutes': round(minutes[min(len(minutes) - 1, int(len(minutes) * 0.9))], 1),
+            'max_minutes': round(minutes[-1], 1),
+        }
+    return report
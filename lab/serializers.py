@@ -0,0 +1,47 @@
+from rest_framework import serializers
+from .models import LabOrder, LabOrderItem
+
+
+class LabOrderItemSerializer(serializers.ModelSerializer):
+    """Test requested on a lab order"""
+    test_type = serializers.CharField(source='test_type.name', read_only=True)
+    
+    class Meta:
+        model = LabOrderItem
+        fields = ['id', 'test_type', 'status']
+
+
+class LabOrderSerializer(serializers.ModelSerializer):
+    """Lab order with its tests for listings"""
+    patient_id = serializers.CharField(source='patient.patient_id', read_only=True)
+    ordered_by = serializers.CharField(source='ordered_by.employee_id', read_only=True)
+    test_items = LabOrderItemSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = LabOrder
+        fields = [
+            'id', 'order_number', 'patient_id', 'ordered_by', 'order_date',
+            'priority', 'status', 'clinical_notes', 'test_items'
+        ]
+
+
+class LabQueueItemSerializer(serializers.ModelSerializer):
+    """Work queue entry for technicians"""
+    order_number = serializers.CharField(source='lab_order.order_number', read_only=True)
+    patient_id = serializers.CharField(source='lab_order.patient.patient_id', read_only=True)
+    test_type = serializers.CharField(source='test_type.name', read_only=True)
+    priority = serializers.CharField(source='lab_order.priority', read_only=True)
+    claimed_by = serializers.CharField(source='claimed_by.employee_id', read_only=True, default=None)
+    
+    class Meta:
+        model = LabOrderItem
+        fields = [
+            'id', 'order_number', 'patient_id', 'test_type', 'sample_type', 'priority',
+            'status', 'queued_at', 'claimed_by', 'claimed_at'
+        ]
+
+
+class LabQueueClaimSerializer(serializers.Serializer):
+    """Request to claim the next items from the queue"""
+    sample_type = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=1)
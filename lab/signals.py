@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .models import LabResult
+from .notifications import schedule_critical_notifications
+
+
+@receiver(pre_save, sender=LabResult)
+def critical_result_previous_status_handler(sender, instance, **kwargs):
+    """Remember whether an existing result was already critical"""
+    instance._was_critical = bool(
+        instance.pk and instance.result_status == 'critical' and
+        LabResult.objects.filter(pk=instance.pk, result_status='critical').exists()
+    )
+
+
+@receiver(post_save, sender=LabResult)
+def critical_result_notification_handler(sender, instance, created, **kwargs):
+    """Push results that have just become critical"""
+    if instance.result_status == 'critical' and not getattr(instance, '_was_critical', False):
+        schedule_critical_notifications([instance.pk])
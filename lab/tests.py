@@ -1,3 +1,193 @@
-from django.test import TestCase
+import datetime
+import io
+import threading
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
 
-# Create your tests here.
+from . import ingest
+from .ingest import import_results
+from .queue import claim_next, QueueError, release_item
+from .models import LabOrder, LabOrderItem, LabResult, LabTestType
+from accounts.models import Patient, Personnel, PersonnelRole, Role
+from authentication.models import User
+from medical_records.models import MedicalRecord
+
+
+class LabFixtureMixin:
+    """A lab technician and a patient with lab orders"""
+    
+    def create_fixtures(self):
+        call_command('create_roles', stdout=StringIO())
+        technician_user = User.objects.create_user('labtech@example.com', 'Lab', 'Tech', 'Passw0rd!', is_active=True, is_verified=True)
+        self.technician = Personnel.objects.create_personnel_profile(user=technician_user, is_verified=True)
+        PersonnelRole.objects.create(personnel=self.technician, role=Role.objects.get(name='Lab Technician'))
+        patient_user = User.objects.create_user('patient@example.com', 'Pat', 'Ient', 'Passw0rd!', is_active=True)
+        self.patient = Patient.objects.create_patient_profile(user=patient_user)
+        self.medical_record = MedicalRecord.objects.create(patient=self.patient, created_by=self.technician, visit_type='consultation')
+        self.potassium = LabTestType.objects.create(
+            name='Potassium', code='K', category='chemistry', sample_type='blood', cost=1, normal_range='3.5-5.0 mmol/L', unit='mmol/L'
+        )
+    
+    def create_order(self, order_number, test_types, priority='routine'):
+        order = LabOrder.objects.create(
+            patient=self.patient,
+            ordered_by=self.technician,
+            medical_record=self.medical_record,
+            order_number=order_number,
+            priority=priority
+        )
+        return [LabOrderItem.objects.create(lab_order=order, test_type=test_type) for test_type in test_types]
+
+
+class ImportResultsTests(LabFixtureMixin, TestCase):
+    """import_results stores one result per order item and reports the rest"""
+    
+    header = 'order_number,test_code,value,collected_at\n'
+    
+    def setUp(self):
+        self.create_fixtures()
+        self.first, = self.create_order('LO1', [self.potassium])
+        self.second, = self.create_order('LO2', [self.potassium])
+    
+    def run_import(self, rows, **kwargs):
+        return import_results(io.StringIO(self.header + rows), performed_by=self.technician, **kwargs).as_dict()
+    
+    def test_import(self):
+        report = self.run_import('LO1,K,6.1,2026-01-02T08:00\nLO2,K,4.2,\nLO9,K,4,\n')
+        self.assertEqual((report['rows'], report['imported'], report['critical'], report['skipped']), (3, 2, 1, 1))
+        self.assertEqual(LabResult.objects.count(), 2)
+        self.assertEqual(LabOrder.objects.get(order_number='LO1').status, 'completed')
+    
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import('LO1,K,4.2,\n', dry_run=True)
+        self.assertEqual(report['imported'], 1)
+        self.assertFalse(LabResult.objects.exists())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, 'pending')
+    
+    def test_existing_result_is_reported(self):
+        self.run_import('LO1,K,4.2,\n')
+        report = self.run_import('LO1,K,4.4,\n')
+        self.assertEqual((report['imported'], report['skipped']), (0, 1))
+        self.assertIn('already has a result', report['problems'][0]['error'])
+    
+    def test_result_saved_during_the_import_is_reported(self):
+        classify_result = ingest.classify_result
+        
+        def save_first_result_elsewhere(*args, **kwargs):
+            # Another writer stores a result after the chunk's first read
+            if not LabResult.objects.filter(lab_order_item=self.first).exists():
+                LabResult.objects.create(lab_order_item=self.first, performed_by=self.technician, result_value='4.0')
+            return classify_result(*args, **kwargs)
+        
+        with mock.patch('lab.ingest.classify_result', side_effect=save_first_result_elsewhere):
+            report = self.run_import('LO1,K,4.2,\nLO2,K,4.3,\n')
+        
+        self.assertEqual((report['imported'], report['skipped']), (1, 1))
+        self.assertEqual(report['problems'], [{'line': 2, 'error': 'K on order LO1 already has a result'}])
+        self.assertEqual(LabResult.objects.get(lab_order_item=self.first).result_value, '4.0')
+        self.assertEqual(LabResult.objects.get(lab_order_item=self.second).result_value, '4.3')
+
+
+class LabQueueTests(LabFixtureMixin, TestCase):
+    """claim_next hands out the most urgent items, each to one technician"""
+    
+    def setUp(self):
+        self.create_fixtures()
+        other_user = User.objects.create_user('labtech2@example.com', 'Lab', 'Tech2', 'Passw0rd!', is_active=True, is_verified=True)
+        self.other_technician = Personnel.objects.create_personnel_profile(user=other_user, is_verified=True)
+        self.sodium = LabTestType.objects.create(name='Sodium', code='NA', category='chemistry', sample_type='blood', cost=1)
+        self.culture = LabTestType.objects.create(name='Urine culture', code='UC', category='microbiology', sample_type='urine', cost=1)
+        self.routine = self.create_order('LO1', [self.potassium, self.sodium])
+        self.stat = self.create_order('LO2', [self.potassium], priority='stat')
+        self.urgent = self.create_order('LO3', [self.culture], priority='urgent')
+    
+    def test_most_urgent_first(self):
+        claimed = claim_next(self.technician, limit=10)
+        self.assertEqual([item.pk for item in claimed], [item.pk for item in self.stat + self.urgent + self.routine])
+        self.assertTrue(all(item.claimed_by_id == self.technician.pk for item in claimed))
+    
+    def test_sample_type_filter(self):
+        claimed = claim_next(self.technician, sample_type='urine', limit=10)
+        self.assertEqual([item.pk for item in claimed], [self.urgent[0].pk])
+    
+    def test_claims_never_overlap(self):
+        first = claim_next(self.technician, limit=2)
+        second = claim_next(self.other_technician, limit=10)
+        self.assertFalse({item.pk for item in first} & {item.pk for item in second})
+        self.assertEqual(len(first) + len(second), 4)
+        self.assertEqual(claim_next(self.other_technician), [])
+    
+    def test_stale_claim_returns_to_the_queue(self):
+        item, = claim_next(self.technician)
+        self.assertNotEqual(claim_next(self.other_technician)[0].pk, item.pk)
+        
+        timeout = settings.HOSPITAL_SETTINGS.get('LAB_QUEUE_CLAIM_TIMEOUT_MINUTES', 30)
+        stale = timezone.now() - datetime.timedelta(minutes=timeout + 1)
+        LabOrderItem.objects.filter(pk=item.pk).update(claimed_at=stale)
+        reclaimed = claim_next(self.other_technician)
+        self.assertEqual([(claimed.pk, claimed.claimed_by_id) for claimed in reclaimed], [(item.pk, self.other_technician.pk)])
+    
+    def test_release_returns_the_item(self):
+        item, = claim_next(self.technician)
+        with self.assertRaises(QueueError):
+            release_item(item.pk, self.other_technician)
+        release_item(item.pk, self.technician)
+        self.assertEqual(claim_next(self.other_technician)[0].pk, item.pk)
+    
+    def test_finished_items_leave_the_queue(self):
+        LabOrderItem.objects.filter(pk=self.stat[0].pk).update(status='completed')
+        LabOrderItem.objects.filter(pk=self.urgent[0].pk).update(status='cancelled')
+        claimed = claim_next(self.technician, limit=10)
+        self.assertEqual([item.pk for item in claimed], [item.pk for item in self.routine])
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentLabQueueTests(LabFixtureMixin, TransactionTestCase):
+    """Technicians polling at once never get the same item"""
+    
+    def test_concurrent_claims_are_distinct(self):
+        self.create_fixtures()
+        sodium = LabTestType.objects.create(name='Sodium', code='NA', category='chemistry', sample_type='blood', cost=1)
+        for i in range(4):
+            self.create_order(f'LO{i}', [self.potassium, sodium])
+        barrier = threading.Barrier(6)
+        claimed = []
+        
+        def claim():
+            try:
+                barrier.wait()
+                claimed.extend(item.pk for item in claim_next(self.technician, limit=2))
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=claim) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(claimed), len(set(claimed)))
+        self.assertEqual(LabOrderItem.objects.filter(claimed_by=self.technician).count(), len(claimed))
+
+
+class CriticalResultStreamTests(TestCase):
+    """GET /api/lab/critical-results/stream/"""
+
+    url = '/api/lab/critical-results/stream/'
+
+    @override_settings(SERVER_INTERFACE='wsgi')
+    def test_not_served_under_wsgi(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+
+    @override_settings(SERVER_INTERFACE='asgi')
+    def test_requires_a_token_under_asgi(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,14 @@
+from django.urls import path
+from .views import LabOrderListView, LabResultImportView, LabQueueClaimView, LabQueueReleaseView, LabQueueView, LabTurnaroundView, critical_result_stream
+
+app_name = 'lab'
+
+urlpatterns = [
+    path('orders/', LabOrderListView.as_view(), name='lab-order-list'),
+    path('results/import/', LabResultImportView.as_view(), name='lab-result-import'),
+    path('queue/', LabQueueView.as_view(), name='lab-queue'),
+    path('queue/claim/', LabQueueClaimView.as_view(), name='lab-queue-claim'),
+    path('queue/items/<int:item_id>/release/', LabQueueReleaseView.as_view(), name='lab-queue-release'),
+    path('queue/turnaround/', LabTurnaroundView.as_view(), name='lab-turnaround'),
+    path('critical-results/stream/', critical_result_stream, name='lab-critical-result-stream'),
+]
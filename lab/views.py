@@ -0,0 +1,269 @@
+import io
+import time
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .ingest import PARSERS, ImportFormatError, import_results
+from .models import LabOrder
+from .notifications import get_broker, personnel_channel
+from .queue import QueueError, claim_next, queue_depth, queue_items, release_item, turnaround_times
+from .serializers import LabOrderSerializer, LabQueueClaimSerializer, LabQueueItemSerializer
+from accounts.models import Personnel
+from authentication.audit import PHIListAuditMixin
+from authentication.jwt_handler import JWTTokenBlacklist, UserStateCache, VerifiedToken
+from authentication.permissions import IsVerifiedPersonnel, get_token_payload
+from krankenhaus.db_router import ReplicaReadMixin
+from krankenhaus.pagination import KeysetPagination
+
+
+class LabOrderListView(PHIListAuditMixin, generics.ListAPIView):
+    """List lab orders, newest first
+    
+    Patients see their own orders; personnel need the view_lab_results
+    permission.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = LabOrderSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering_field = 'order_date'
+    audit_action = 'lab_orders_viewed'
+    
+    def audit_patient_ids(self, orders):
+        return [order.patient.patient_id for order in orders]
+    
+    def get_queryset(self):
+        orders = LabOrder.objects.select_related(
+            'patient', 'ordered_by'
+        ).prefetch_related('test_items__test_type')
+        token_payload = get_token_payload(self.request)
+        
+        if token_payload.get('user_type') == 'patient':
+            return orders.filter(patient__user_id=self.request.user.pk)
+        
+        if 'view_lab_results' not in token_payload.get('permissions', []):
+            raise PermissionDenied('Insufficient permissions')
+        
+        params = self.request.GET
+        if params.get('patient'):
+            orders = orders.filter(patient__patient_id=params['patient'])
+        if params.get('status'):
+            orders = orders.filter(status=params['status'])
+        if params.get('priority'):
+            orders = orders.filter(priority=params['priority'])
+        
+        return orders
+
+
+class LabQueueAccessMixin:
+    """Queue endpoints are for lab technicians"""
+    permission_classes = [IsAuthenticated, IsVerifiedPersonnel]
+    queue_roles = ['Lab Technician']
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        token_payload = get_token_payload(request)
+        if not any(role in token_payload.get('roles', []) for role in self.queue_roles):
+            raise PermissionDenied('Permission denied')
+
+
+class LabQueueView(LabQueueAccessMixin, APIView):
+    """Head of the lab work queue, STAT first; ?sample_type= picks a sub-queue"""
+    max_items = 50
+    
+    def get(self, request):
+        sample_type = request.GET.get('sample_type') or None
+        items = queue_items(sample_type).select_related(
+            'lab_order__patient', 'test_type', 'claimed_by'
+        )[:self.max_items]
+        return Response({
+            'sample_type': sample_type,
+            'depth': queue_depth(sample_type),
+            'items': LabQueueItemSerializer(items, many=True).data,
+        })
+
+
+class LabQueueClaimView(LabQueueAccessMixin, APIView):
+    """Claim the next item(s) from the queue"""
+    
+    def post(self, request):
+        serializer = LabQueueClaimSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        technician = get_object_or_404(Personnel, user_id=request.user.pk)
+        items = claim_next(
+            technician,
+            sample_type=serializer.validated_data.get('sample_type') or None,
+            limit=serializer.validated_data['limit']
+        )
+        if not items:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        
+        return Response({'items': LabQueueItemSerializer(items, many=True).data})
+
+
+class LabQueueReleaseView(LabQueueAccessMixin, APIView):
+    """Return a claimed item to the queue"""
+    
+    def post(self, request, item_id):
+        technician = get_object_or_404(Personnel, user_id=request.user.pk)
+        try:
+            release_item(item_id, technician)
+        except QueueError as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'message': 'Item released'})
+
+
+class LabTurnaroundView(ReplicaReadMixin, LabQueueAccessMixin, APIView):
+    """Queue-to-completion turnaround by priority over the last ?days (default 7)"""
+    queue_roles = ['Lab Technician', 'Admin']
+    
+    def get(self, request):
+        try:
+            days = max(1, min(int(request.GET.get('days', 7)), 366))
+        except ValueError:
+            days = 7
+        end = timezone.now()
+        start = end - timedelta(days=days)
+        return Response({
+            'start': start,
+            'end': end,
+            'priorities': turnaround_times(start, end),
+        })
+
+
+class LabResultImportView(LabQueueAccessMixin, APIView):
+    """Import an analyser export uploaded as "file" (multipart)
+    
+    A "format" form field picks csv (default) or hl7; ?format= is taken
+    by DRF content negotiation. ?dry_run=1 validates without saving.
+    """
+    
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'Upload the export as "file"'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        file_format = request.data.get('format') or 'csv'
+        if file_format not in PARSERS:
+            return Response(
+                {'error': f"format must be one of {', '.join(sorted(PARSERS))}"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Read the upload line by line rather than loading it into memory
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            report = import_results(
+                lines,
+                file_format=file_format,
+                performed_by=Personnel.objects.filter(user_id=request.user.pk).first(),
+                dry_run=bool(request.GET.get('dry_run'))
+            )
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+def _stream_subscriber(request):
+    """(personnel ID, token payload) behind a request's access token, or an error response"""
+    verified_token = VerifiedToken.from_request(request)
+    if verified_token is None or verified_token.is_blacklisted or verified_token.payload.get('type') != 'access':
+        return None, None, JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    payload = verified_token.payload
+    if payload.get('user_type') != 'personnel' or not payload.get('is_verified', False):
+        return None, None, JsonResponse({'error': 'Permission denied'}, status=403)
+    if not UserStateCache.is_active(payload.get('user_id')):
+        return None, None, JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    personnel_id = Personnel.objects.filter(
+        user_id=payload.get('user_id'), is_active=True
+    ).values_list('pk', flat=True).first()
+    if personnel_id is None:
+        return None, None, JsonResponse({'error': 'Permission denied'}, status=403)
+    return personnel_id, payload, None
+
+
+async def _session_valid(payload):
+    """Whether the token behind an open stream is still good"""
+    if payload.get('exp') is not None and time.time() >= payload['exp']:
+        return False
+    if await JWTTokenBlacklist.ais_payload_blacklisted(payload):
+        return False
+    return await UserStateCache.ais_active(payload.get('user_id'))
+
+
+async def _critical_result_events(subscription, heartbeat, payload):
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            timeout = heartbeat
+            if payload.get('exp') is not None:
+                # Wake at expiry rather than up to a heartbeat after it
+                timeout = max(0, min(heartbeat, payload['exp'] - time.time()))
+            message = await subscription.get(timeout)
+            
+            # Logout, expiry and deactivation end the stream; the client
+            # reconnects with a fresh token
+            if not await _session_valid(payload):
+                yield 'event: session_ended\ndata: {}\n\n'
+                return
+            
+            if message is None:
+                # Comment line so proxies do not time out an idle stream
+                yield ': keep-alive\n\n'
+            else:
+                yield f'event: critical_result\ndata: {message}\n\n'
+    finally:
+        await subscription.close()
+
+
+async def critical_result_stream(request):
+    """Server-sent events carrying critical lab results for the caller
+    
+    Ordering doctors and on-call staff receive each critical result as it
+    is saved, so ward terminals do not have to poll. This is a plain async
+    view: under ASGI (krankenhaus/asgi.py) an open stream holds no worker
+    thread. Under WSGI the response would be collected in full before
+    sending, tying up a worker until the token expires, so it answers 503
+    there. Authenticate with the usual Bearer access token; the stream
+    ends with a session_ended event when it expires or is revoked.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    if settings.SERVER_INTERFACE != 'asgi':
+        return JsonResponse({'error': 'Critical result streaming is only served under ASGI'}, status=503)
+    
+    personnel_id, payload, error = await sync_to_async(_stream_subscriber)(request)
+    if error is not None:
+        return error
+    
+    subscription = await get_broker().subscribe([personnel_channel(personnel_id)])
+    heartbeat = settings.HOSPITAL_SETTINGS.get('LAB_NOTIFICATION_HEARTBEAT_SECONDS', 15)
+    response = StreamingHttpResponse(
+        _critical_result_events(subscription, heartbeat, payload),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx buffering the stream
+    return response
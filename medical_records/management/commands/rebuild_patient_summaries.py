@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Patient
+from medical_records.summary import refresh_patient_summary
+
+
+class Command(BaseCommand):
+    help = 'Build or rebuild the materialised clinical summary of every patient'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', action='append', default=[],
+                            help='Only rebuild this patient ID (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Patient ids read per query')
+    
+    def handle(self, *args, **options):
+        patients = Patient.objects.order_by('id')
+        if options['patient']:
+            patients = patients.filter(patient_id__in=options['patient'])
+        
+        rebuilt = 0
+        last_id = 0
+        while True:
+            patient_ids = list(
+                patients.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not patient_ids:
+                break
+            
+            for patient_id in patient_ids:
+                if refresh_patient_summary(patient_id) is not None:
+                    rebuilt += 1
+            last_id = patient_ids[-1]
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} patient summaries'))
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
-from django.db.models import Q  # Added for Q objects in for_patient
+from django.db.models import Avg, Count, Max, Min, Q  # Added for Q objects in for_patient
+from django.db.models.functions import TruncDay, TruncHour
 
 class MedicalRecordManager(models.Manager):
     def for_patient(self, patient):
@@ -63,3 +64,28 @@ class AllergyManager(models.Manager):
     def by_allergen(self, allergen):
         """Get allergies by specific allergen"""
         return self.filter(allergen__icontains=allergen, is_active=True)
+
+
+class VitalSignObservationManager(models.Manager):
+    def for_patient(self, patient, vital_type=None, start=None, end=None):
+        """Get a patient's readings, oldest first, optionally by type and time range"""
+        observations = self.filter(patient=patient)
+        if vital_type:
+            observations = observations.filter(vital_type=vital_type)
+        if start:
+            observations = observations.filter(observed_at__gte=start)
+        if end:
+            observations = observations.filter(observed_at__lt=end)
+        return observations.order_by('observed_at')
+    
+    def trend(self, patient, vital_type, start, end, bucket='hour'):
+        """Get min/max/mean/count of one vital per hour or day, aggregated in the database"""
+        trunc = TruncDay if bucket == 'day' else TruncHour
+        return self.for_patient(patient, vital_type, start, end).annotate(
+            bucket=trunc('observed_at')
+        ).values('bucket').annotate(
+            minimum=Min('value'),
+            maximum=Max('value'),
+            mean=Avg('value'),
+            count=Count('id')
+        ).order_by('bucket')
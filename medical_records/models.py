@@ -1,6 +1,7 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-from .managers import MedicalRecordManager, DiagnosisManager, AllergyManager  # Import managers
+from .managers import MedicalRecordManager, DiagnosisManager, AllergyManager, VitalSignObservationManager  # Import managers
 
 class MedicalRecord(models.Model):
     objects = MedicalRecordManager()  # Assign the custom manager
@@ -37,6 +38,11 @@ class MedicalRecord(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'created_at', 'id'], name='medical_record_timeline_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.patient.patient_id} - {self.visit_type} on {self.created_at.date()}"
 
@@ -90,3 +96,62 @@ class Allergy(models.Model):
     
     def __str__(self):
         return f"{self.patient.patient_id} - {self.allergen} ({self.severity})"
+
+class PatientSummary(models.Model):
+    """Materialised clinical summary of a patient, kept current by signals"""
+    patient = models.OneToOneField('accounts.Patient', on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Summary for patient {self.patient_id}"
+
+class VitalSignObservation(models.Model):
+    """A single vital sign reading, one row per measurement
+    
+    Bedside monitors record many times a day, so readings live here rather
+    than as MedicalRecord columns; encounter vitals are mirrored in too.
+    """
+    objects = VitalSignObservationManager()  # Assign the custom manager
+    
+    VITAL_TYPE_CHOICES = [
+        ('temperature', 'Temperature'),
+        ('bp_systolic', 'Blood Pressure (Systolic)'),
+        ('bp_diastolic', 'Blood Pressure (Diastolic)'),
+        ('heart_rate', 'Heart Rate'),
+        ('respiratory_rate', 'Respiratory Rate'),
+        ('oxygen_saturation', 'Oxygen Saturation'),
+        ('weight', 'Weight'),
+        ('height', 'Height'),
+    ]
+    
+    patient = models.ForeignKey('accounts.Patient', on_delete=models.CASCADE, related_name='vital_observations')
+    vital_type = models.CharField(max_length=20, choices=VITAL_TYPE_CHOICES)
+    value = models.FloatField()
+    observed_at = models.DateTimeField()
+    
+    source = models.CharField(max_length=20, choices=[
+        ('monitor', 'Bedside Monitor'),
+        ('manual', 'Manual Entry'),
+        ('encounter', 'Encounter Record'),
+    ], default='manual')
+    device_id = models.CharField(max_length=100, blank=True)
+    medical_record = models.ForeignKey(MedicalRecord, on_delete=models.CASCADE, null=True, blank=True, related_name='vital_observations')
+    recorded_by = models.ForeignKey('accounts.Personnel', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'vital_type', 'observed_at'], name='vital_patient_type_time_idx'),
+            models.Index(fields=['patient', 'observed_at'], name='vital_patient_time_idx'),
+        ]
+        constraints = [
+            # Monitors resend on reconnect; a repeat of the same reading is a no-op
+            models.UniqueConstraint(
+                fields=['patient', 'vital_type', 'observed_at', 'device_id'],
+                name='vital_unique_reading'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient_id} {self.vital_type}={self.value} at {self.observed_at}"
@@ -0,0 +1,82 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Allergy, MedicalRecord
+from .summary import forget_patient_summary, schedule_summary_refresh
+from .vitals import record_encounter_vitals
+from accounts.models import Patient
+from lab.models import LabOrder, LabResult
+from pharmacy.models import Prescription, PrescriptionItem
+
+
+# Patient columns shown in the summary's demographics section
+DEMOGRAPHIC_FIELDS = {
+    'patient_id', 'user', 'user_id', 'date_of_birth', 'gender', 'blood_type', 'phone_primary',
+    'emergency_contact_name', 'emergency_contact_phone', 'emergency_contact_relationship',
+}
+
+
+@receiver(post_save, sender=Patient)
+def patient_summary_demographics_handler(sender, instance, created, update_fields=None, **kwargs):
+    """Demographics changed (user name changes re-save the patient too)"""
+    if created:
+        return
+    
+    if update_fields is not None:
+        fields = set(update_fields)
+        # Patient.save adds the derived fields to every partial save; on their
+        # own they come from a user name change
+        if not fields & DEMOGRAPHIC_FIELDS and not fields <= set(Patient.DERIVED_FIELDS):
+            return
+    schedule_summary_refresh(instance.pk, 'demographics')
+
+
+@receiver(post_delete, sender=Patient)
+def patient_summary_deleted_handler(sender, instance, **kwargs):
+    """Drop the cached summary of a deleted patient"""
+    forget_patient_summary(instance.pk)
+
+
+@receiver(post_save, sender=Allergy)
+@receiver(post_delete, sender=Allergy)
+def patient_summary_allergies_handler(sender, instance, **kwargs):
+    """Rebuild the allergy section"""
+    schedule_summary_refresh(instance.patient_id, 'allergies')
+
+
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+def patient_summary_prescription_handler(sender, instance, **kwargs):
+    """Rebuild the active prescription section"""
+    schedule_summary_refresh(instance.patient_id, 'active_prescriptions')
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def patient_summary_prescription_item_handler(sender, instance, **kwargs):
+    """Rebuild the active prescription section"""
+    patient_id = Prescription.objects.filter(pk=instance.prescription_id).values_list('patient_id', flat=True).first()
+    schedule_summary_refresh(patient_id, 'active_prescriptions')
+
+
+@receiver(post_save, sender=LabResult)
+@receiver(post_delete, sender=LabResult)
+def patient_summary_lab_result_handler(sender, instance, **kwargs):
+    """Rebuild the critical lab result section"""
+    patient_id = LabOrder.objects.filter(
+        test_items__id=instance.lab_order_item_id
+    ).values_list('patient_id', flat=True).first()
+    schedule_summary_refresh(patient_id, 'critical_lab_results')
+
+
+@receiver(post_save, sender=MedicalRecord)
+@receiver(post_delete, sender=MedicalRecord)
+def patient_summary_vitals_handler(sender, instance, **kwargs):
+    """Rebuild the last vitals section"""
+    schedule_summary_refresh(instance.patient_id, 'last_vitals')
+
+
+@receiver(post_save, sender=MedicalRecord)
+def medical_record_vitals_series_handler(sender, instance, **kwargs):
+    """Keep the vitals time series in step with encounter vitals"""
+    record_encounter_vitals(instance)
@@ -0,0 +1,210 @@
+import json
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Allergy, MedicalRecord, PatientSummary
+from accounts.models import Patient
+from lab.models import LabResult
+from pharmacy.models import PrescriptionItem
+
+MAX_CRITICAL_LAB_RESULTS = 10
+
+
+def _cache_key(patient_id):
+    return f"patient_summary_{patient_id}"
+
+
+def _cache_timeout():
+    return settings.HOSPITAL_SETTINGS.get('PATIENT_SUMMARY_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _critical_lab_cutoff():
+    days = settings.HOSPITAL_SETTINGS.get('PATIENT_SUMMARY_CRITICAL_LAB_DAYS', 30)
+    return timezone.now() - timedelta(days=days)
+
+
+def _demographics(patient_id):
+    patient = Patient.objects.select_related('user').filter(pk=patient_id).first()
+    if patient is None:
+        return None
+    return {
+        'patient_id': patient.patient_id,
+        'first_name': patient.user.first_name,
+        'last_name': patient.user.last_name,
+        'date_of_birth': patient.date_of_birth,
+        'gender': patient.gender,
+        'blood_type': patient.blood_type,
+        'phone_primary': patient.phone_primary,
+        'emergency_contact': {
+            'name': patient.emergency_contact_name,
+            'phone': patient.emergency_contact_phone,
+            'relationship': patient.emergency_contact_relationship,
+        },
+    }
+
+
+def _allergies(patient_id):
+    return list(
+        Allergy.objects.filter(patient_id=patient_id, is_active=True).order_by('-created_at').values(
+            'allergen', 'allergy_type', 'severity', 'reaction_description'
+        )
+    )
+
+
+def _active_prescriptions(patient_id):
+    items = PrescriptionItem.objects.filter(
+        prescription__patient_id=patient_id,
+        prescription__status='active'
+    ).order_by('-prescription__date_prescribed', 'id').values(
+        'prescription__prescription_number', 'prescription__date_prescribed',
+        'medication__name', 'medication__strength', 'dosage', 'frequency', 'duration_days'
+    )
+    return [
+        {
+            'prescription_number': item['prescription__prescription_number'],
+            'date_prescribed': item['prescription__date_prescribed'],
+            'medication': f"{item['medication__name']} {item['medication__strength']}".strip(),
+            'dosage': item['dosage'],
+            'frequency': item['frequency'],
+            'duration_days': item['duration_days'],
+        }
+        for item in items
+    ]
+
+
+def _critical_lab_results(patient_id):
+    results = LabResult.objects.filter(
+        lab_order_item__lab_order__patient_id=patient_id,
+        result_status='critical',
+        result_date__gte=_critical_lab_cutoff()
+    ).order_by('-result_date').values(
+        'lab_order_item__lab_order__order_number', 'lab_order_item__test_type__name',
+        'result_value', 'result_unit', 'reference_range', 'result_date'
+    )[:MAX_CRITICAL_LAB_RESULTS]
+    return [
+        {
+            'order_number': result['lab_order_item__lab_order__order_number'],
+            'test': result['lab_order_item__test_type__name'],
+            'value': result['result_value'],
+            'unit': result['result_unit'],
+            'reference_range': result['reference_range'],
+            'result_date': result['result_date'],
+        }
+        for result in results
+    ]
+
+
+def _last_vitals(patient_id):
+    return MedicalRecord.objects.filter(patient_id=patient_id).filter(
+        Q(temperature__isnull=False) |
+        Q(blood_pressure_systolic__isnull=False) |
+        Q(heart_rate__isnull=False) |
+        Q(respiratory_rate__isnull=False) |
+        Q(oxygen_saturation__isnull=False)
+    ).order_by('-created_at').values(
+        'created_at', 'temperature', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+        'heart_rate', 'respiratory_rate', 'oxygen_saturation', 'weight', 'height'
+    ).first()
+
+
+# One query per section; signals rebuild only the sections a change touches
+SECTION_BUILDERS = {
+    'demographics': _demographics,
+    'allergies': _allergies,
+    'active_prescriptions': _active_prescriptions,
+    'critical_lab_results': _critical_lab_results,
+    'last_vitals': _last_vitals,
+}
+
+
+def _to_json(data):
+    # Round-trip so cached and stored copies hold the same plain types
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def _drop_aged_results(data):
+    """Critical results age out between rebuilds; hide them at read time"""
+    cutoff = _critical_lab_cutoff()
+    results = data.get('critical_lab_results') or []
+    kept = [result for result in results if (parse_datetime(result['result_date'] or '') or cutoff) >= cutoff]
+    if len(kept) != len(results):
+        data = dict(data, critical_lab_results=kept)
+    return data
+
+
+def refresh_patient_summary(patient_id, sections=None):
+    """Rebuild some or all sections of a patient's summary
+    
+    The summary row is locked while it is rewritten so concurrent refreshes
+    of different sections do not overwrite each other. The cache is updated
+    once the transaction commits. Returns the summary data, or None if the
+    patient no longer exists.
+    """
+    sections = list(sections or SECTION_BUILDERS)
+    
+    with transaction.atomic():
+        if not Patient.objects.filter(pk=patient_id).exists():
+            cache.delete(_cache_key(patient_id))
+            return None
+        
+        summary, created = PatientSummary.objects.select_for_update().get_or_create(patient_id=patient_id)
+        if created or not set(SECTION_BUILDERS) <= set(summary.data):
+            sections = list(SECTION_BUILDERS)
+        data = dict(summary.data)
+        for section in sections:
+            data[section] = SECTION_BUILDERS[section](patient_id)
+        data['built_at'] = timezone.now()
+        
+        summary.data = _to_json(data)
+        summary.save(update_fields=['data', 'updated_at'])
+        transaction.on_commit(
+            lambda: cache.set(_cache_key(patient_id), summary.data, timeout=_cache_timeout())
+        )
+    
+    return summary.data
+
+
+def schedule_summary_refresh(patient_id, *sections):
+    """Refresh sections of a summary after the current transaction commits"""
+    if patient_id is None:
+        return
+    transaction.on_commit(lambda: refresh_patient_summary(patient_id, sections or None))
+
+
+def get_patient_summary(patient):
+    """Summary of a patient from the cache, then the summary table, then built fresh
+    
+    A cache hit costs no queries at all.
+    """
+    data = cache.get(_cache_key(patient.pk))
+    if data is None:
+        summary = PatientSummary.objects.filter(patient_id=patient.pk).values_list('data', flat=True).first()
+        if summary is not None and set(SECTION_BUILDERS) <= set(summary):
+            data = summary
+            cache.set(_cache_key(patient.pk), data, timeout=_cache_timeout())
+        else:
+            data = refresh_patient_summary(patient.pk)
+    
+    if data is None:
+        return None
+    return _drop_aged_results(data)
+
+
+async def aget_patient_summary(patient):
+    """Async get_patient_summary; a cache hit never leaves the event loop"""
+    data = await cache.aget(_cache_key(patient.pk))
+    if data is None:
+        return await sync_to_async(get_patient_summary)(patient)
+    return _drop_aged_results(data)
+
+
+def forget_patient_summary(patient_id):
+    """Drop a summary from the cache; the table row goes with the patient"""
+    cache.delete(_cache_key(patient_id))
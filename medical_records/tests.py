@@ -1,3 +1,137 @@
+import datetime
+from django.core import signing
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from .models import Diagnosis, MedicalRecord
+from .timeline import CURSOR_SALT, InvalidCursor, iter_timeline, timeline_page
+from accounts.models import Patient, Personnel
+from appointments.models import Appointment
+from authentication.models import User
+from lab.models import LabOrder
+from pharmacy.models import Prescription
+
+
+class TimelinePagingTests(TestCase):
+    """timeline_page walks every source newest first without gaps or repeats"""
+    
+    def setUp(self):
+        doctor_user = User.objects.create_user('doctor@example.com', 'Doc', 'Tor', 'Passw0rd!', is_active=True, is_verified=True)
+        self.doctor = Personnel.objects.create_personnel_profile(user=doctor_user, is_verified=True)
+        other_user = User.objects.create_user('other@example.com', 'Oth', 'Er', 'Passw0rd!', is_active=True, is_verified=True)
+        self.other_doctor = Personnel.objects.create_personnel_profile(user=other_user, is_verified=True)
+        patient_user = User.objects.create_user('patient@example.com', 'Pat', 'Ient', 'Passw0rd!', is_active=True)
+        self.patient = Patient.objects.create_patient_profile(user=patient_user)
+        
+        # 09:00 in the hospital's time zone, which is where appointments live
+        self.instant = timezone.make_aware(datetime.datetime(2025, 3, 10, 9, 0))
+        self.earlier = self.instant - datetime.timedelta(hours=1)
+    
+    def encounter(self, at):
+        record = MedicalRecord.objects.create(patient=self.patient, created_by=self.doctor, visit_type='consultation')
+        MedicalRecord.objects.filter(pk=record.pk).update(created_at=at)
+        return record
+    
+    def diagnosis(self, record, at):
+        diagnosis = Diagnosis.objects.create(
+            medical_record=record,
+            diagnosis_description='Hypertension',
+            diagnosis_type=Diagnosis._meta.get_field('diagnosis_type').choices[0][0],
+            severity=Diagnosis._meta.get_field('severity').choices[0][0]
+        )
+        Diagnosis.objects.filter(pk=diagnosis.pk).update(created_at=at)
+        return diagnosis
+    
+    def prescription(self, record, at, number):
+        prescription = Prescription.objects.create(
+            patient=self.patient,
+            prescribed_by=self.doctor,
+            medical_record=record,
+            prescription_number=number
+        )
+        Prescription.objects.filter(pk=prescription.pk).update(date_prescribed=at)
+        return prescription
+    
+    def lab_order(self, record, at, number):
+        order = LabOrder.objects.create(patient=self.patient, ordered_by=self.doctor, medical_record=record, order_number=number)
+        LabOrder.objects.filter(pk=order.pk).update(order_date=at)
+        return order
+    
+    def appointment(self, at, doctor=None):
+        local = timezone.localtime(at)
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=doctor or self.doctor,
+            appointment_type='consultation',
+            scheduled_date=local.date(),
+            scheduled_time=local.time()
+        )
+    
+    def create_events(self):
+        """Two of every kind at the same instant, and one of every kind an hour before"""
+        for at in (self.instant, self.instant, self.earlier):
+            record = self.encounter(at)
+            self.diagnosis(record, at)
+            self.prescription(record, at, f'RX-{record.pk}')
+            self.lab_order(record, at, f'LO-{record.pk}')
+        self.appointment(self.instant)
+        self.appointment(self.instant, self.other_doctor)
+        self.appointment(self.earlier)
+    
+    def walk(self, page_size, max_pages=50):
+        seen = []
+        cursor = None
+        for _ in range(max_pages):
+            events, cursor = timeline_page(self.patient, cursor, page_size)
+            self.assertLessEqual(len(events), page_size)
+            seen.extend((event.occurred_at, event.kind, event.id) for event in events)
+            if cursor is None:
+                return seen
+        self.fail(f'Still paging after {max_pages} pages of {page_size}')
+    
+    def test_small_pages_match_one_large_page(self):
+        self.create_events()
+        everything = [(event.occurred_at, event.kind, event.id) for event in timeline_page(self.patient, page_size=100)[0]]
+        self.assertEqual(len(everything), 15)
+        for page_size in (1, 2, 3, 4, 7):
+            self.assertEqual(self.walk(page_size), everything, page_size)
+    
+    def test_ties_are_broken_by_source_then_newest_id(self):
+        self.create_events()
+        events, _ = timeline_page(self.patient, page_size=10)
+        tied = [(event.kind, event.id) for event in events if event.occurred_at == self.instant]
+        kinds = [kind for kind, _ in tied]
+        self.assertEqual(kinds, ['appointment'] * 2 + ['lab_order'] * 2 + ['prescription'] * 2 + ['diagnosis'] * 2 + ['encounter'] * 2)
+        for kind in set(kinds):
+            ids = [event_id for event_kind, event_id in tied if event_kind == kind]
+            self.assertEqual(ids, sorted(ids, reverse=True))
+    
+    def test_appointment_cursor_uses_local_time(self):
+        # An appointment and an encounter at the same instant, split across pages
+        record = self.encounter(self.instant)
+        appointment = self.appointment(self.instant)
+        self.appointment(self.earlier)
+        
+        first, cursor = timeline_page(self.patient, page_size=1)
+        self.assertEqual([(event.kind, event.id) for event in first], [('appointment', appointment.pk)])
+        self.assertEqual(first[0].occurred_at, self.instant)
+        
+        second, cursor = timeline_page(self.patient, cursor, page_size=1)
+        self.assertEqual([(event.kind, event.id) for event in second], [('encounter', record.pk)])
+        third, cursor = timeline_page(self.patient, cursor, page_size=1)
+        self.assertEqual([(event.kind, event.occurred_at) for event in third], [('appointment', self.earlier)])
+        self.assertIsNone(cursor)
+    
+    def test_kinds_filter(self):
+        self.create_events()
+        events = list(iter_timeline(self.patient, batch_size=2, kinds={'prescription'}))
+        self.assertEqual([event.kind for event in events], ['prescription'] * 3)
+    
+    def test_tampered_cursor_is_refused(self):
+        self.create_events()
+        _, cursor = timeline_page(self.patient, page_size=2)
+        with self.assertRaises(InvalidCursor):
+            timeline_page(self.patient, cursor[:-2] + ('AA' if not cursor.endswith('AA') else 'BB'))
+        forged = signing.dumps([self.instant.isoformat(), 'billing', 1], salt=CURSOR_SALT, compress=True)
+        with self.assertRaises(InvalidCursor):
+            timeline_page(self.patient, forged)
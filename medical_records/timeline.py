@@ -0,0 +1,288 @@
+from collections import namedtuple
+from datetime import datetime
+from django.core import signing
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Diagnosis, MedicalRecord
+from appointments.models import Appointment
+from lab.models import LabOrder, LabOrderItem
+from pharmacy.models import Prescription, PrescriptionItem
+
+TimelineEvent = namedtuple('TimelineEvent', ['occurred_at', 'kind', 'id', 'data'])
+
+CURSOR_SALT = 'krankenhaus.medical_records.timeline'
+
+
+class InvalidCursor(Exception):
+    """Raised when a timeline cursor is malformed or has been tampered with"""
+    pass
+
+
+class TimelineSource:
+    """One kind of clinical event and how to page through it newest first
+    
+    Subclasses name the timestamp column and turn rows into event data;
+    ``prefetch`` is only applied to the rows that make it onto a page.
+    """
+    kind = None
+    timestamp_field = None
+    prefetch = []
+    
+    def queryset(self, patient):
+        raise NotImplementedError
+    
+    def ordering(self):
+        return [f'-{self.timestamp_field}', '-id']
+    
+    def occurred_at(self, obj):
+        return getattr(obj, self.timestamp_field)
+    
+    def before(self, occurred_at):
+        """Rows strictly older than a point in time"""
+        return Q(**{f'{self.timestamp_field}__lt': occurred_at})
+    
+    def at(self, occurred_at):
+        """Rows at exactly a point in time"""
+        return Q(**{self.timestamp_field: occurred_at})
+    
+    def serialize(self, obj):
+        raise NotImplementedError
+
+
+class EncounterSource(TimelineSource):
+    kind = 'encounter'
+    timestamp_field = 'created_at'
+    
+    def queryset(self, patient):
+        return MedicalRecord.objects.filter(patient=patient).select_related('created_by__user')
+    
+    def serialize(self, record):
+        return {
+            'visit_type': record.visit_type,
+            'chief_complaint': record.chief_complaint,
+            'assessment': record.assessment,
+            'plan': record.plan,
+            'recorded_by': _personnel_name(record.created_by),
+            'vitals': {
+                'temperature': record.temperature,
+                'blood_pressure': (
+                    f"{record.blood_pressure_systolic}/{record.blood_pressure_diastolic}"
+                    if record.blood_pressure_systolic and record.blood_pressure_diastolic else None
+                ),
+                'heart_rate': record.heart_rate,
+                'respiratory_rate': record.respiratory_rate,
+                'oxygen_saturation': record.oxygen_saturation,
+            },
+        }
+
+
+class DiagnosisSource(TimelineSource):
+    kind = 'diagnosis'
+    timestamp_field = 'created_at'
+    
+    def queryset(self, patient):
+        return Diagnosis.objects.filter(medical_record__patient=patient)
+    
+    def serialize(self, diagnosis):
+        return {
+            'medical_record_id': diagnosis.medical_record_id,
+            'icd_10_code': diagnosis.icd_10_code,
+            'description': diagnosis.diagnosis_description,
+            'diagnosis_type': diagnosis.diagnosis_type,
+            'severity': diagnosis.severity,
+        }
+
+
+class PrescriptionSource(TimelineSource):
+    kind = 'prescription'
+    timestamp_field = 'date_prescribed'
+    prefetch = [
+        Prefetch('items', queryset=PrescriptionItem.objects.select_related('medication').order_by('id')),
+    ]
+    
+    def queryset(self, patient):
+        return Prescription.objects.filter(patient=patient).select_related('prescribed_by__user')
+    
+    def serialize(self, prescription):
+        return {
+            'prescription_number': prescription.prescription_number,
+            'status': prescription.status,
+            'prescribed_by': _personnel_name(prescription.prescribed_by),
+            'medical_record_id': prescription.medical_record_id,
+            'items': [
+                {
+                    'medication': f"{item.medication.name} {item.medication.strength}".strip(),
+                    'dosage': item.dosage,
+                    'frequency': item.frequency,
+                    'duration_days': item.duration_days,
+                    'quantity': item.quantity,
+                }
+                for item in prescription.items.all()
+            ],
+        }
+
+
+class LabOrderSource(TimelineSource):
+    kind = 'lab_order'
+    timestamp_field = 'order_date'
+    prefetch = [
+        Prefetch('test_items', queryset=LabOrderItem.objects.select_related('test_type', 'result').order_by('id')),
+    ]
+    
+    def queryset(self, patient):
+        return LabOrder.objects.filter(patient=patient).select_related('ordered_by__user')
+    
+    def serialize(self, order):
+        tests = []
+        for item in order.test_items.all():
+            result = getattr(item, 'result', None)
+            tests.append({
+                'test': item.test_type.name,
+                'status': item.status,
+                'result': {
+                    'value': result.result_value,
+                    'unit': result.result_unit,
+                    'reference_range': result.reference_range,
+                    'status': result.result_status,
+                    'result_date': result.result_date,
+                } if result else None,
+            })
+        return {
+            'order_number': order.order_number,
+            'priority': order.priority,
+            'status': order.status,
+            'ordered_by': _personnel_name(order.ordered_by),
+            'medical_record_id': order.medical_record_id,
+            'tests': tests,
+        }
+
+
+class AppointmentSource(TimelineSource):
+    """Appointments sit on the timeline at their scheduled date and time"""
+    kind = 'appointment'
+    
+    def queryset(self, patient):
+        return Appointment.objects.filter(patient=patient).select_related('doctor__user')
+    
+    def ordering(self):
+        return ['-scheduled_date', '-scheduled_time', '-id']
+    
+    def occurred_at(self, appointment):
+        return timezone.make_aware(datetime.combine(appointment.scheduled_date, appointment.scheduled_time))
+    
+    def _local(self, occurred_at):
+        local = timezone.localtime(occurred_at)
+        return local.date(), local.time()
+    
+    def before(self, occurred_at):
+        day, at_time = self._local(occurred_at)
+        return Q(scheduled_date__lt=day) | Q(scheduled_date=day, scheduled_time__lt=at_time)
+    
+    def at(self, occurred_at):
+        day, at_time = self._local(occurred_at)
+        return Q(scheduled_date=day, scheduled_time=at_time)
+    
+    def serialize(self, appointment):
+        return {
+            'appointment_type': appointment.appointment_type,
+            'status': appointment.status,
+            'doctor': _personnel_name(appointment.doctor),
+            'duration_minutes': appointment.duration_minutes,
+            'reason': appointment.reason,
+        }
+
+
+# Order also breaks ties between events at the same instant
+SOURCES = [
+    EncounterSource(),
+    DiagnosisSource(),
+    PrescriptionSource(),
+    LabOrderSource(),
+    AppointmentSource(),
+]
+SOURCE_RANKS = {source.kind: rank for rank, source in enumerate(SOURCES)}
+
+
+def _personnel_name(personnel):
+    if personnel is None:
+        return None
+    return f"{personnel.user.first_name} {personnel.user.last_name}".strip()
+
+
+def _sort_key(event):
+    return event.occurred_at, SOURCE_RANKS[event.kind], event.id
+
+
+def encode_cursor(event):
+    return signing.dumps([event.occurred_at.isoformat(), event.kind, event.id], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    try:
+        occurred_at, kind, event_id = signing.loads(cursor, salt=CURSOR_SALT)
+        occurred_at = parse_datetime(occurred_at)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    
+    if occurred_at is None or kind not in SOURCE_RANKS:
+        raise InvalidCursor("Invalid cursor")
+    return occurred_at, kind, event_id
+
+
+def _older_than_cursor(source, occurred_at, kind, event_id):
+    """Rows of a source that come after the cursor in newest-first order"""
+    rank = SOURCE_RANKS[source.kind]
+    cursor_rank = SOURCE_RANKS[kind]
+    if rank < cursor_rank:
+        return source.before(occurred_at) | source.at(occurred_at)
+    if rank == cursor_rank:
+        return source.before(occurred_at) | (source.at(occurred_at) & Q(id__lt=event_id))
+    return source.before(occurred_at)
+
+
+def timeline_page(patient, cursor=None, page_size=50, kinds=None):
+    """One page of a patient's merged clinical timeline, newest first
+    
+    Each source is read once for its newest ``page_size + 1`` rows past the
+    cursor, the rows are merged in memory, and related rows (prescription
+    items, lab tests and results) are prefetched only for the events that
+    made the page. A page therefore costs the same fixed number of queries
+    however long the patient's history is. Returns (events, next_cursor);
+    next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    sources = [source for source in SOURCES if kinds is None or source.kind in kinds]
+    
+    candidates = []
+    for source in sources:
+        rows = source.queryset(patient)
+        if position is not None:
+            rows = rows.filter(_older_than_cursor(source, *position))
+        for obj in rows.order_by(*source.ordering())[:page_size + 1]:
+            candidates.append(TimelineEvent(source.occurred_at(obj), source.kind, obj.pk, obj))
+    
+    candidates.sort(key=_sort_key, reverse=True)
+    page = candidates[:page_size]
+    has_more = len(candidates) > page_size
+    
+    for source in sources:
+        objs = [event.data for event in page if event.kind == source.kind]
+        if objs and source.prefetch:
+            prefetch_related_objects(objs, *source.prefetch)
+    
+    source_by_kind = {source.kind: source for source in sources}
+    events = [event._replace(data=source_by_kind[event.kind].serialize(event.data)) for event in page]
+    
+    next_cursor = encode_cursor(page[-1]) if has_more and page else None
+    return events, next_cursor
+
+
+def iter_timeline(patient, cursor=None, batch_size=200, kinds=None):
+    """Yield a patient's whole timeline from the cursor back, one batch of queries at a time"""
+    while True:
+        events, cursor = timeline_page(patient, cursor, batch_size, kinds)
+        yield from events
+        if cursor is None:
+            return
@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import PatientTimelineView, PatientVitalTrendView, PatientVitalsView
+
+app_name = 'medical_records'
+
+urlpatterns = [
+    path('patients/<str:patient_id>/timeline/', PatientTimelineView.as_view(), name='patient-timeline'),
+    path('patients/<str:patient_id>/vitals/', PatientVitalsView.as_view(), name='patient-vitals'),
+    path('patients/<str:patient_id>/vitals/trend/', PatientVitalTrendView.as_view(), name='patient-vital-trend'),
+]
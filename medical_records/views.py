@@ -0,0 +1,215 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Allergy, VitalSignObservation
+from .timeline import SOURCE_RANKS, InvalidCursor, decode_cursor, iter_timeline, timeline_page
+from .vitals import TREND_WINDOWS, VitalsIngestError, ingest_observations, vital_trend
+from accounts.models import Patient, Personnel
+from authentication.audit import log_phi_access
+from authentication.permissions import get_token_payload
+
+
+class PatientTimelineView(APIView):
+    """Merged clinical timeline for a patient, newest first
+    
+    Encounters, diagnoses, prescriptions, lab orders and appointments in one
+    stream. Page back with ?cursor=<next>; ?page_size (max 100) and
+    ?kinds=encounter,lab_order narrow the page. ?stream=1 streams the whole
+    history as newline-delimited JSON instead. Patients may read their own
+    timeline; personnel need the view_patient_medical_records permission.
+    """
+    permission_classes = [IsAuthenticated]
+    default_page_size = 50
+    max_page_size = 100
+    
+    def get(self, request, patient_id):
+        patient = get_object_or_404(Patient, patient_id=patient_id)
+        token_payload = get_token_payload(request)
+        
+        if token_payload.get('user_type') == 'patient':
+            if patient.user_id != request.user.pk:
+                return Response(
+                    {'error': 'Permission denied'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        elif 'view_patient_medical_records' not in token_payload.get('permissions', []):
+            return Response(
+                {'error': 'Insufficient permissions'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        kinds = None
+        if request.GET.get('kinds'):
+            kinds = [kind for kind in request.GET['kinds'].split(',') if kind in SOURCE_RANKS]
+        cursor = request.GET.get('cursor')
+        
+        log_phi_access(request, 'patient_timeline_viewed', patient, stream=bool(request.GET.get('stream')))
+        if request.GET.get('stream'):
+            return self._stream(patient, cursor, kinds)
+        
+        try:
+            page_size = int(request.GET.get('page_size', self.default_page_size))
+        except ValueError:
+            page_size = self.default_page_size
+        page_size = max(1, min(page_size, self.max_page_size))
+        
+        try:
+            events, next_cursor = timeline_page(patient, cursor, page_size, kinds)
+        except InvalidCursor as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        response = {
+            'patient_id': patient.patient_id,
+            'next_cursor': next_cursor,
+            'events': [self._event_dict(event) for event in events],
+        }
+        if not cursor:
+            # Allergies lead the chart; later pages leave them out
+            response['allergies'] = list(
+                Allergy.objects.for_patient(patient).values(
+                    'allergen', 'allergy_type', 'severity', 'reaction_description'
+                )
+            )
+        return Response(response)
+    
+    def _event_dict(self, event):
+        return {
+            'occurred_at': event.occurred_at,
+            'kind': event.kind,
+            'id': event.id,
+            **event.data,
+        }
+    
+    def _stream(self, patient, cursor, kinds):
+        def lines():
+            for event in iter_timeline(patient, cursor, kinds=kinds):
+                yield json.dumps(self._event_dict(event), cls=DjangoJSONEncoder) + '\n'
+        
+        try:
+            if cursor:
+                decode_cursor(cursor)  # Reject a bad cursor before streaming
+        except InvalidCursor as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+class PatientVitalsView(APIView):
+    """Bulk ingest of vital sign readings, e.g. from bedside monitors
+    
+    POST {"device_id": "...", "source": "monitor", "observations": [
+    {"vital_type": "heart_rate", "value": 72, "observed_at": "..."}, ...]}.
+    Needs the create_medical_records permission.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, patient_id):
+        token_payload = get_token_payload(request)
+        if 'create_medical_records' not in token_payload.get('permissions', []):
+            return Response(
+                {'error': 'Insufficient permissions'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        patient = get_object_or_404(Patient, patient_id=patient_id)
+        source = request.data.get('source', 'monitor')
+        if source not in ('monitor', 'manual'):
+            return Response(
+                {'error': 'source must be monitor or manual'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            count = ingest_observations(
+                patient,
+                request.data.get('observations'),
+                source=source,
+                device_id=str(request.data.get('device_id', ''))[:100],
+                recorded_by=Personnel.objects.filter(user_id=request.user.pk).first()
+            )
+        except VitalsIngestError as e:
+            return Response(
+                {'error': str(e), 'details': e.errors}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(
+            {'message': 'Observations recorded', 'count': count},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class PatientVitalTrendView(APIView):
+    """Min/max/mean per hour or day for one vital sign
+    
+    ?vital_type=heart_rate (required), ?bucket=hour|day, ?start and ?end as
+    ISO 8601 datetimes. Patients may read their own trends; personnel need
+    the view_patient_medical_records permission.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, patient_id):
+        patient = get_object_or_404(Patient, patient_id=patient_id)
+        token_payload = get_token_payload(request)
+        
+        if token_payload.get('user_type') == 'patient':
+            if patient.user_id != request.user.pk:
+                return Response(
+                    {'error': 'Permission denied'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        elif 'view_patient_medical_records' not in token_payload.get('permissions', []):
+            return Response(
+                {'error': 'Insufficient permissions'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        vital_type = request.GET.get('vital_type')
+        if vital_type not in dict(VitalSignObservation.VITAL_TYPE_CHOICES):
+            return Response(
+                {'error': 'vital_type is required and must be a known vital sign'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        bucket = request.GET.get('bucket', 'hour')
+        if bucket not in TREND_WINDOWS:
+            return Response(
+                {'error': 'bucket must be hour or day'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        bounds = {}
+        for name in ('start', 'end'):
+            value = request.GET.get(name)
+            if not value:
+                continue
+            parsed = parse_datetime(value)
+            if parsed is None:
+                return Response(
+                    {'error': f'{name} must be an ISO 8601 datetime'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            bounds[name] = timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+        
+        log_phi_access(request, 'patient_vital_trend_viewed', patient, vital_type=vital_type)
+        buckets, start, end = vital_trend(patient, vital_type, bucket, **bounds)
+        return Response({
+            'patient_id': patient.patient_id,
+            'vital_type': vital_type,
+            'bucket': bucket,
+            'start': start,
+            'end': end,
+            'buckets': buckets,
+        })
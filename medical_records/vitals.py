@@ -0,0 +1,164 @@
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import VitalSignObservation
+
+MAX_BATCH_SIZE = 5000
+
+# Readings outside these bounds are rejected as sensor or entry errors
+PLAUSIBLE_RANGES = {
+    'temperature': (25.0, 45.0),
+    'bp_systolic': (30.0, 300.0),
+    'bp_diastolic': (10.0, 200.0),
+    'heart_rate': (10.0, 300.0),
+    'respiratory_rate': (1.0, 80.0),
+    'oxygen_saturation': (30.0, 100.0),
+    'weight': (0.2, 500.0),
+    'height': (20.0, 275.0),
+}
+
+# MedicalRecord column -> observation vital_type
+ENCOUNTER_FIELDS = {
+    'temperature': 'temperature',
+    'blood_pressure_systolic': 'bp_systolic',
+    'blood_pressure_diastolic': 'bp_diastolic',
+    'heart_rate': 'heart_rate',
+    'respiratory_rate': 'respiratory_rate',
+    'oxygen_saturation': 'oxygen_saturation',
+    'weight': 'weight',
+    'height': 'height',
+}
+
+# Bucket -> (default look-back window, longest window allowed)
+TREND_WINDOWS = {
+    'hour': (timedelta(days=1), timedelta(days=31)),
+    'day': (timedelta(days=30), timedelta(days=3 * 365)),
+}
+
+
+class VitalsIngestError(Exception):
+    """Raised when a batch of vital sign readings cannot be accepted"""
+    
+    def __init__(self, message, errors=None):
+        self.errors = errors or []
+        super().__init__(message)
+
+
+def _parse_reading(reading, now):
+    if not isinstance(reading, dict):
+        return None, 'must be an object'
+    
+    vital_type = reading.get('vital_type')
+    if vital_type not in PLAUSIBLE_RANGES:
+        return None, f'unknown vital_type {vital_type!r}'
+    
+    try:
+        value = float(reading.get('value'))
+    except (TypeError, ValueError):
+        return None, 'value must be a number'
+    low, high = PLAUSIBLE_RANGES[vital_type]
+    if not low <= value <= high:
+        return None, f'{vital_type} {value} is outside {low}-{high}'
+    
+    observed_at = reading.get('observed_at')
+    observed_at = parse_datetime(observed_at) if isinstance(observed_at, str) else None
+    if observed_at is None:
+        return None, 'observed_at must be an ISO 8601 datetime'
+    if timezone.is_naive(observed_at):
+        observed_at = timezone.make_aware(observed_at)
+    if observed_at > now + timedelta(minutes=5):
+        return None, 'observed_at is in the future'
+    
+    return (vital_type, value, observed_at), None
+
+
+def ingest_observations(patient, readings, source='monitor', device_id='', recorded_by=None):
+    """Validate and store a batch of readings in bulk
+    
+    The whole batch is rejected if any reading is invalid, with one error
+    per bad reading. Readings already stored for the same patient, type,
+    time and device are skipped, so monitors can safely resend. Returns the
+    number of readings in the batch.
+    """
+    if not isinstance(readings, list) or not readings:
+        raise VitalsIngestError('observations must be a non-empty list')
+    if len(readings) > MAX_BATCH_SIZE:
+        raise VitalsIngestError(f'At most {MAX_BATCH_SIZE} observations per request')
+    
+    now = timezone.now()
+    observations = []
+    errors = []
+    for index, reading in enumerate(readings):
+        parsed, error = _parse_reading(reading, now)
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+        vital_type, value, observed_at = parsed
+        observations.append(VitalSignObservation(
+            patient=patient,
+            vital_type=vital_type,
+            value=value,
+            observed_at=observed_at,
+            source=source,
+            device_id=device_id,
+            recorded_by=recorded_by
+        ))
+    
+    if errors:
+        raise VitalsIngestError('Some observations are invalid', errors)
+    
+    VitalSignObservation.objects.bulk_create(observations, batch_size=1000, ignore_conflicts=True)
+    return len(observations)
+
+
+def record_encounter_vitals(record):
+    """Mirror the vitals columns of a MedicalRecord into observations"""
+    observations = [
+        VitalSignObservation(
+            patient_id=record.patient_id,
+            vital_type=vital_type,
+            value=float(getattr(record, field)),
+            observed_at=record.created_at,
+            source='encounter',
+            medical_record=record,
+            recorded_by_id=record.created_by_id
+        )
+        for field, vital_type in ENCOUNTER_FIELDS.items()
+        if getattr(record, field) is not None
+    ]
+    # Values cleared on the record are dropped from the series too
+    VitalSignObservation.objects.filter(medical_record=record).exclude(
+        vital_type__in=[observation.vital_type for observation in observations]
+    ).delete()
+    if observations:
+        VitalSignObservation.objects.bulk_create(
+            observations,
+            update_conflicts=True,
+            unique_fields=['patient', 'vital_type', 'observed_at', 'device_id'],
+            update_fields=['value']
+        )
+
+
+def vital_trend(patient, vital_type, bucket='hour', start=None, end=None):
+    """Min/max/mean/count per bucket for one vital over a bounded window
+    
+    The window defaults to the last day (hourly) or month (daily) and is
+    capped so a single request cannot aggregate years of hourly buckets.
+    Returns (buckets, start, end).
+    """
+    default_window, max_window = TREND_WINDOWS[bucket]
+    end = end or timezone.now()
+    start = start or end - default_window
+    start = max(start, end - max_window)
+    
+    return [
+        {
+            'bucket': row['bucket'],
+            'min': row['minimum'],
+            'max': row['maximum'],
+            'mean': round(row['mean'], 2),
+            'count': row['count'],
+        }
+        for row in VitalSignObservation.objects.trend(patient, vital_type, start, end, bucket)
+    ], start, end
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import PharmacyDispensing, PrescriptionItem
+from inventory.stock import allocate_fefo, InsufficientStock
+
+
+class DispensingError(Exception):
+    """Raised when a prescription item cannot be dispensed"""
+    pass
+
+
+def _current_fill_remaining(prescription_item, dispensed):
+    """What is left of the fill in progress; the first fill needs no refill"""
+    per_fill = prescription_item.quantity
+    fills_started = max(1, -(-dispensed // per_fill))
+    return fills_started * per_fill - dispensed
+
+
+def _remaining_allowance(prescription_item, dispensed):
+    return _current_fill_remaining(prescription_item, dispensed) + (
+        prescription_item.refills_remaining * prescription_item.quantity
+    )
+
+
+def _refills_needed(prescription_item, dispensed, quantity):
+    """Refills a dispense of ``quantity`` would use up"""
+    beyond_fill = quantity - _current_fill_remaining(prescription_item, dispensed)
+    if beyond_fill <= 0:
+        return 0
+    return -(-beyond_fill // prescription_item.quantity)
+
+
+def dispense_prescription_item(prescription_item_id, quantity, dispensed_by):
+    """Dispense a prescription item from inventory, first expiry first out
+    
+    The stock allocation and the dispensing records commit together. One
+    PharmacyDispensing row is written per lot used, each linked to the
+    ledger movement that took the stock.
+    
+    Each fill is up to PrescriptionItem.quantity; going past what is left
+    of the current fill uses up refills, which are decremented in the
+    same transaction. Anything beyond the remaining fill and refills is
+    refused.
+    """
+    if quantity <= 0:
+        raise DispensingError("Quantity must be positive")
+    
+    with transaction.atomic():
+        prescription_item = PrescriptionItem.objects.select_related(
+            'prescription', 'medication__inventory_item'
+        ).select_for_update(of=('self',)).get(pk=prescription_item_id)
+        
+        if prescription_item.prescription.status != 'active':
+            raise DispensingError(f"Prescription is {prescription_item.prescription.status}")
+        
+        if prescription_item.quantity <= 0:
+            raise DispensingError("Prescription item has no quantity to dispense")
+        
+        # Under the item's row lock, so concurrent dispenses see each other's totals
+        dispensed = prescription_item.dispensing_records.aggregate(total=Sum('quantity_dispensed'))['total'] or 0
+        refills_used = _refills_needed(prescription_item, dispensed, quantity)
+        if refills_used > prescription_item.refills_remaining:
+            raise DispensingError(
+                f"Only {_remaining_allowance(prescription_item, dispensed)} more may be dispensed "
+                f"on this prescription item"
+            )
+        
+        inventory_item = prescription_item.medication.inventory_item
+        if inventory_item is None:
+            raise DispensingError(f"{prescription_item.medication} is not linked to an inventory item")
+        
+        try:
+            allocations = allocate_fefo(
+                inventory_item,
+                quantity,
+                reference=f"prescription_item:{prescription_item.pk}",
+                performed_by=dispensed_by
+            )
+        except InsufficientStock as e:
+            raise DispensingError(str(e))
+        
+        if refills_used:
+            prescription_item.refills_remaining -= refills_used
+            prescription_item.save(update_fields=['refills_remaining'])
+        
+        return PharmacyDispensing.objects.bulk_create([
+            PharmacyDispensing(
+                prescription_item=prescription_item,
+                dispensed_by=dispensed_by,
+                quantity_dispensed=allocation.quantity,
+                lot_number=allocation.lot_number,
+                expiry_date=allocation.expiry_date,
+                stock_movement=allocation.movement
+            )
+            for allocation in allocations
+        ])
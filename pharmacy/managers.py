@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.db.models import Q  # Added for search_medications
+from krankenhaus.db_router import prefer_replica
 
 class PrescriptionManager(models.Manager):
     def active_prescriptions(self):
@@ -39,9 +40,9 @@ class MedicationManager(models.Manager):
     
     def search_medications(self, query):
         """Search medications by name"""
-        return self.filter(
+        return prefer_replica(self.filter(
             Q(name__icontains=query) |
             Q(generic_name__icontains=query) |
             Q(brand_name__icontains=query),
             is_active=True
-        )
+        ))
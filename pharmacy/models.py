@@ -12,6 +12,8 @@ class Medication(models.Model):
     strength = models.CharField(max_length=100)
     manufacturer = models.CharField(max_length=200, blank=True)
     ndc_number = models.CharField(max_length=20, blank=True)
+    # Stock for this medication, drawn down lot by lot when dispensing
+    inventory_item = models.OneToOneField('inventory.InventoryItem', on_delete=models.SET_NULL, null=True, blank=True, related_name='medication')
     is_controlled_substance = models.BooleanField(default=False)
     controlled_substance_schedule = models.CharField(max_length=10, blank=True)
     is_active = models.BooleanField(default=True)
@@ -38,6 +40,12 @@ class Prescription(models.Model):
     
     notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_prescribed', 'id'], name='prescription_keyset_idx'),
+            models.Index(fields=['patient', 'date_prescribed', 'id'], name='prescription_timeline_idx'),
+        ]
+    
     def __str__(self):
         return f"Prescription {self.prescription_number} for {self.patient.patient_id}"
 
@@ -64,6 +72,8 @@ class PharmacyDispensing(models.Model):
     date_dispensed = models.DateTimeField(auto_now_add=True)
     lot_number = models.CharField(max_length=100, blank=True)
     expiry_date = models.DateField(null=True, blank=True)
+    # Ledger entry that took this quantity out of inventory
+    stock_movement = models.OneToOneField('inventory.StockMovement', on_delete=models.PROTECT, null=True, blank=True, related_name='dispensing')
     
     def __str__(self):
         return f"Dispensed {self.quantity_dispensed} of {self.prescription_item.medication.name}"
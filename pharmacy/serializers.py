@@ -0,0 +1,41 @@
+from rest_framework import serializers
+from .models import Prescription, PrescriptionItem, PharmacyDispensing
+
+
+class PrescriptionItemSerializer(serializers.ModelSerializer):
+    """Prescription line item"""
+    medication = serializers.StringRelatedField()
+    
+    class Meta:
+        model = PrescriptionItem
+        fields = [
+            'id', 'medication', 'dosage', 'frequency', 'duration_days',
+            'quantity', 'refills_remaining', 'instructions'
+        ]
+
+
+class PrescriptionSerializer(serializers.ModelSerializer):
+    """Prescription with its items for listings"""
+    patient_id = serializers.CharField(source='patient.patient_id', read_only=True)
+    prescribed_by = serializers.CharField(source='prescribed_by.employee_id', read_only=True)
+    items = PrescriptionItemSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Prescription
+        fields = [
+            'id', 'prescription_number', 'patient_id', 'prescribed_by',
+            'date_prescribed', 'status', 'notes', 'items'
+        ]
+
+
+class DispenseRequestSerializer(serializers.Serializer):
+    """Quantity to dispense for a prescription item"""
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class PharmacyDispensingSerializer(serializers.ModelSerializer):
+    """Dispensing record, one per lot used"""
+    
+    class Meta:
+        model = PharmacyDispensing
+        fields = ['id', 'quantity_dispensed', 'lot_number', 'expiry_date', 'date_dispensed', 'stock_movement']
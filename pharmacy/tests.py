@@ -1,3 +1,148 @@
-from django.test import TestCase
+import threading
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
 
-# Create your tests here.
+from .dispensing import dispense_prescription_item, DispensingError
+from .models import Medication, PharmacyDispensing, Prescription, PrescriptionItem
+from accounts.models import Patient, Personnel
+from authentication.jwt_handler import CustomJWTHandler
+from authentication.models import AuditLog, User
+from inventory.models import InventoryItem, StockLevel
+from medical_records.models import MedicalRecord
+
+
+class DispensingFixtureMixin:
+    """A pharmacist, a stocked medication and an active prescription for it"""
+    
+    def create_prescription_item(self, quantity=10, refills=0, stock=100):
+        pharmacist_user = User.objects.create_user('pharmacist@example.com', 'Pharma', 'Cist', 'Passw0rd!', is_active=True, is_verified=True)
+        self.pharmacist = Personnel.objects.create_personnel_profile(user=pharmacist_user, is_verified=True)
+        patient_user = User.objects.create_user('patient@example.com', 'Pat', 'Ient', 'Passw0rd!', is_active=True)
+        patient = Patient.objects.create_patient_profile(user=patient_user)
+        
+        self.inventory_item = InventoryItem.objects.create(name='Amoxicillin 500mg', sku='AMX500', unit_of_measure='capsule', unit_cost=1)
+        StockLevel.objects.create(item=self.inventory_item, quantity=stock, lot_number='LOT-1')
+        medication = Medication.objects.create(name='Amoxicillin', dosage_form='capsule', strength='500mg', inventory_item=self.inventory_item)
+        
+        medical_record = MedicalRecord.objects.create(
+            patient=patient,
+            created_by=self.pharmacist,
+            visit_type=MedicalRecord._meta.get_field('visit_type').choices[0][0]
+        )
+        prescription = Prescription.objects.create(
+            patient=patient,
+            prescribed_by=self.pharmacist,
+            medical_record=medical_record,
+            prescription_number='RX-TEST-1'
+        )
+        return PrescriptionItem.objects.create(
+            prescription=prescription,
+            medication=medication,
+            dosage='1 capsule',
+            frequency='tid',
+            duration_days=5,
+            quantity=quantity,
+            refills_remaining=refills
+        )
+    
+    def on_hand(self):
+        self.inventory_item.refresh_from_db()
+        return self.inventory_item.quantity_on_hand
+
+
+class DispensingLimitTests(DispensingFixtureMixin, TestCase):
+    """dispense_prescription_item never gives out more than the fills allow"""
+    
+    def test_first_fill_does_not_use_a_refill(self):
+        item = self.create_prescription_item(quantity=10, refills=1)
+        dispense_prescription_item(item.pk, 10, self.pharmacist)
+        item.refresh_from_db()
+        self.assertEqual(item.refills_remaining, 1)
+        self.assertEqual(self.on_hand(), 90)
+    
+    def test_going_past_the_fill_uses_refills(self):
+        item = self.create_prescription_item(quantity=10, refills=2)
+        dispense_prescription_item(item.pk, 4, self.pharmacist)
+        dispense_prescription_item(item.pk, 12, self.pharmacist)
+        item.refresh_from_db()
+        self.assertEqual(item.refills_remaining, 1)
+    
+    def test_over_dispensing_is_refused_and_takes_no_stock(self):
+        item = self.create_prescription_item(quantity=10, refills=1)
+        dispense_prescription_item(item.pk, 15, self.pharmacist)
+        
+        with self.assertRaisesMessage(DispensingError, 'Only 5 more may be dispensed'):
+            dispense_prescription_item(item.pk, 6, self.pharmacist)
+        
+        item.refresh_from_db()
+        self.assertEqual(item.refills_remaining, 0)
+        self.assertEqual(self.on_hand(), 85)
+        self.assertEqual(sum(item.dispensing_records.values_list('quantity_dispensed', flat=True)), 15)
+    
+    def test_single_oversized_dispense_is_refused(self):
+        item = self.create_prescription_item(quantity=10, refills=0)
+        with self.assertRaises(DispensingError):
+            dispense_prescription_item(item.pk, 11, self.pharmacist)
+        self.assertFalse(PharmacyDispensing.objects.exists())
+        self.assertEqual(self.on_hand(), 100)
+    
+    def test_non_positive_quantity_is_refused(self):
+        item = self.create_prescription_item()
+        for quantity in (0, -5):
+            with self.assertRaises(DispensingError):
+                dispense_prescription_item(item.pk, quantity, self.pharmacist)
+        self.assertEqual(self.on_hand(), 100)
+    
+    def test_inactive_prescription_is_refused(self):
+        item = self.create_prescription_item()
+        Prescription.objects.filter(pk=item.prescription_id).update(status='cancelled')
+        with self.assertRaises(DispensingError):
+            dispense_prescription_item(item.pk, 1, self.pharmacist)
+
+
+@override_settings(AUDIT_LOG={**settings.AUDIT_LOG, 'BUFFERED': False})
+class PrescriptionListTests(DispensingFixtureMixin, TestCase):
+    """GET /api/pharmacy/prescriptions/"""
+    
+    def test_page_is_audited(self):
+        item = self.create_prescription_item()
+        patient = item.prescription.patient
+        token = CustomJWTHandler.generate_tokens(User.objects.get(pk=patient.user_id))['access_token']
+        
+        response = self.client.get('/api/pharmacy/prescriptions/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        audit = AuditLog.objects.get(action='prescriptions_viewed')
+        self.assertEqual(audit.details['patient_ids'], [patient.patient_id])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentDispensingTests(DispensingFixtureMixin, TransactionTestCase):
+    """Concurrent dispenses of one item are serialised by its row lock"""
+    
+    def test_concurrent_dispenses_stop_at_the_allowance(self):
+        item = self.create_prescription_item(quantity=10, refills=1)
+        barrier = threading.Barrier(6)
+        outcomes = []
+        
+        def dispense():
+            try:
+                barrier.wait()
+                dispense_prescription_item(item.pk, 10, self.pharmacist)
+                outcomes.append('dispensed')
+            except DispensingError:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=dispense) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(outcomes.count('dispensed'), 2)
+        self.assertEqual(outcomes.count('refused'), 4)
+        item.refresh_from_db()
+        self.assertEqual(item.refills_remaining, 0)
+        self.assertEqual(self.on_hand(), 80)
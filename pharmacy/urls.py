@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import PrescriptionListView, DispensePrescriptionItemView
+
+app_name = 'pharmacy'
+
+urlpatterns = [
+    path('prescriptions/', PrescriptionListView.as_view(), name='prescription-list'),
+    path('prescription-items/<int:item_id>/dispense/', DispensePrescriptionItemView.as_view(), name='dispense-prescription-item'),
+]
@@ -0,0 +1,93 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .dispensing import dispense_prescription_item, DispensingError
+from .models import Prescription, PrescriptionItem
+from .serializers import PrescriptionSerializer, DispenseRequestSerializer, PharmacyDispensingSerializer
+from accounts.models import Personnel
+from authentication.audit import PHIListAuditMixin
+from authentication.permissions import get_token_payload, IsVerifiedPersonnel
+from krankenhaus.pagination import KeysetPagination
+
+
+class PrescriptionListView(PHIListAuditMixin, generics.ListAPIView):
+    """List prescriptions, newest first
+    
+    Patients see their own prescriptions; personnel need the
+    view_prescriptions permission.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = PrescriptionSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering_field = 'date_prescribed'
+    audit_action = 'prescriptions_viewed'
+    
+    def audit_patient_ids(self, prescriptions):
+        return [prescription.patient.patient_id for prescription in prescriptions]
+    
+    def get_queryset(self):
+        prescriptions = Prescription.objects.select_related(
+            'patient', 'prescribed_by'
+        ).prefetch_related('items__medication')
+        token_payload = get_token_payload(self.request)
+        
+        if token_payload.get('user_type') == 'patient':
+            return prescriptions.filter(patient__user_id=self.request.user.pk)
+        
+        if 'view_prescriptions' not in token_payload.get('permissions', []):
+            raise PermissionDenied('Insufficient permissions')
+        
+        params = self.request.GET
+        if params.get('patient'):
+            prescriptions = prescriptions.filter(patient__patient_id=params['patient'])
+        if params.get('status'):
+            prescriptions = prescriptions.filter(status=params['status'])
+        
+        return prescriptions
+
+
+class DispensePrescriptionItemView(APIView):
+    """Dispense a prescription item from stock (Pharmacists only)"""
+    permission_classes = [IsAuthenticated, IsVerifiedPersonnel]
+    
+    def post(self, request, item_id):
+        token_payload = get_token_payload(request)
+        if 'Pharmacist' not in token_payload.get('roles', []):
+            return Response(
+                {'error': 'Permission denied'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = DispenseRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        pharmacist = get_object_or_404(Personnel, user_id=request.user.pk)
+        
+        try:
+            records = dispense_prescription_item(
+                item_id,
+                serializer.validated_data['quantity'],
+                dispensed_by=pharmacist
+            )
+        except PrescriptionItem.DoesNotExist:
+            return Response(
+                {'error': 'Prescription item not found'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except DispensingError as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(
+            {
+                'message': 'Medication dispensed',
+                'dispensed': PharmacyDispensingSerializer(records, many=True).data
+            },
+            status=status.HTTP_201_CREATED
+        )